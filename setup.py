@@ -6,7 +6,7 @@ setup(
     packages=find_packages(),
     python_requires=">=3.9",
     install_requires=[
-        "fastapi>=0.68.0",
+        "fastapi>=0.115.3",
         "uvicorn>=0.15.0",
         "python-multipart",
         "transformers>=4.30.0",
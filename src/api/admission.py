@@ -0,0 +1,300 @@
+import asyncio
+import collections
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.config import settings
+from src.services.metrics import metrics
+
+# Header clients use to tell us how long they will wait, in seconds
+CLIENT_TIMEOUT_HEADER = "x-request-timeout"
+
+queue_wait_seconds = metrics.histogram(
+    "admission_queue_wait_seconds", "Time requests spent queued before admission", ["priority_class"]
+)
+rejected_total = metrics.counter(
+    "admission_rejected_total", "Requests shed by admission control", ["priority_class", "reason"]
+)
+in_flight_gauge = metrics.gauge(
+    "admission_in_flight", "Requests currently being served", ["priority_class"]
+)
+queue_depth_gauge = metrics.gauge(
+    "admission_queue_depth", "Requests currently waiting for admission", ["priority_class"]
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class PriorityClass:
+    """
+    Admission policy for a group of routes.
+
+    Attributes:
+        name: Label used in metrics
+        priority: Lower values are admitted first when capacity frees up
+        max_concurrent: Maximum requests of this class served at once
+        max_queue: Maximum requests of this class waiting for admission
+        timeout: Client timeout assumed when the request does not send one
+        service_time: Initial estimate of the time to serve one request
+        bypass: Serve immediately without counting against capacity
+    """
+
+    name: str
+    priority: int
+    max_concurrent: int
+    max_queue: int
+    timeout: float
+    service_time: float
+    bypass: bool = False
+    running: int = 0
+    waiters: collections.deque = field(default_factory=collections.deque)
+
+    def observe_service_time(self, seconds: float, alpha: float = 0.2) -> None:
+        """Update the moving average of the time it takes to serve a request."""
+        self.service_time = (1 - alpha) * self.service_time + alpha * seconds
+
+    def expected_wait(self, position: int) -> float:
+        """Estimate the queueing delay of a request at a queue position (0-based)."""
+        if self.running < self.max_concurrent and position == 0:
+            return 0.0
+        rounds = math.floor(position / max(self.max_concurrent, 1)) + 1
+        return rounds * self.service_time
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    deadline: float
+
+
+def default_priority_classes() -> list[tuple[tuple[str, ...], PriorityClass]]:
+    """Route prefixes and their priority classes, most specific prefixes first."""
+    capacity = settings.ADMISSION_CAPACITY
+    return [
+        (("/health", "/metrics"), PriorityClass(
+            "critical", priority=0, max_concurrent=capacity, max_queue=0,
+            timeout=5.0, service_time=0.001, bypass=True
+        )),
+        (("/process",), PriorityClass(
+            "processing", priority=3,
+            max_concurrent=settings.ADMISSION_PROCESSING_CONCURRENCY,
+            max_queue=settings.ADMISSION_PROCESSING_QUEUE,
+            timeout=settings.ADMISSION_PROCESSING_TIMEOUT, service_time=3.0
+        )),
+        (("/upload",), PriorityClass(
+            "upload", priority=2, max_concurrent=max(1, capacity // 2), max_queue=capacity,
+            timeout=30.0, service_time=0.1
+        )),
+        (("/",), PriorityClass(
+            "interactive", priority=1, max_concurrent=capacity, max_queue=capacity * 4,
+            timeout=10.0, service_time=0.01
+        )),
+    ]
+
+
+class AdmissionController:
+    """
+    Priority-aware admission with bounded queues and deadline-aware shedding.
+
+    All non-bypass classes share `capacity` concurrent slots and each class is also
+    capped at its own `max_concurrent`. When a slot frees up, waiting requests of
+    the most important class are admitted first. A request is shed (HTTP 503) when
+    its class queue is full, or when the expected queueing delay plus the class's
+    moving-average service time would exceed the client's timeout - serving it
+    would only waste CPU on a response nobody receives.
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        routes: Optional[list[tuple[tuple[str, ...], PriorityClass]]] = None
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            capacity: Total concurrent requests across non-bypass classes
+            routes: Route prefixes mapped to priority classes (first match wins)
+        """
+        self.capacity = capacity or settings.ADMISSION_CAPACITY
+        self.routes = routes or default_priority_classes()
+        self.classes = {cls.name: cls for _, cls in self.routes}
+        self.running = 0
+
+    def classify(self, path: str) -> PriorityClass:
+        """Return the priority class serving a request path."""
+        for prefixes, cls in self.routes:
+            if any(path == prefix or path.startswith(prefix) for prefix in prefixes):
+                return cls
+        return self.routes[-1][1]
+
+    def queue_depth(self, name: str) -> int:
+        """Requests of a priority class being served or waiting for admission."""
+        cls = self.classes[name]
+        return cls.running + len(cls.waiters)
+
+    def _can_start(self, cls: PriorityClass) -> bool:
+        return self.running < self.capacity and cls.running < cls.max_concurrent
+
+    def _start(self, cls: PriorityClass) -> None:
+        self.running += 1
+        cls.running += 1
+        in_flight_gauge.set(cls.running, priority_class=cls.name)
+
+    def _reject(self, cls: PriorityClass, reason: str) -> AdmissionRejected:
+        rejected_total.inc(priority_class=cls.name, reason=reason)
+        retry_after = max(1.0, cls.expected_wait(len(cls.waiters)))
+        return AdmissionRejected(reason, retry_after)
+
+    async def acquire(self, cls: PriorityClass, timeout: Optional[float] = None) -> float:
+        """
+        Wait for admission.
+
+        Args:
+            cls: Priority class of the request
+            timeout: Seconds the client is willing to wait for the full response
+
+        Returns:
+            float: Seconds spent queued
+
+        Raises:
+            AdmissionRejected: If the request is shed
+        """
+        if cls.bypass:
+            return 0.0
+
+        now = time.monotonic()
+        deadline = now + (timeout or cls.timeout)
+        higher_waiting = any(
+            other.waiters for other in self.classes.values() if other.priority <= cls.priority
+        )
+        if self._can_start(cls) and not higher_waiting:
+            self._start(cls)
+            queue_wait_seconds.observe(0.0, priority_class=cls.name)
+            return 0.0
+
+        if len(cls.waiters) >= cls.max_queue:
+            raise self._reject(cls, "queue_full")
+        if now + cls.expected_wait(len(cls.waiters)) + cls.service_time > deadline:
+            raise self._reject(cls, "deadline")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), deadline)
+        cls.waiters.append(waiter)
+        queue_depth_gauge.set(len(cls.waiters), priority_class=cls.name)
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(waiter.future), timeout=max(0.0, deadline - cls.service_time - now)
+            )
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.exception():
+                # Admitted just as the timer fired; hand the slot back
+                self.release(cls)
+            raise self._reject(cls, "deadline")
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and not waiter.future.exception():
+                self.release(cls)
+            raise
+        finally:
+            if waiter in cls.waiters:
+                cls.waiters.remove(waiter)
+            queue_depth_gauge.set(len(cls.waiters), priority_class=cls.name)
+
+        waited = time.monotonic() - now
+        queue_wait_seconds.observe(waited, priority_class=cls.name)
+        return waited
+
+    def release(self, cls: PriorityClass, service_time: Optional[float] = None) -> None:
+        """Free a slot and admit waiting requests, most important class first."""
+        if cls.bypass:
+            return
+        self.running -= 1
+        cls.running -= 1
+        in_flight_gauge.set(cls.running, priority_class=cls.name)
+        if service_time is not None:
+            cls.observe_service_time(service_time)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        for cls in sorted(self.classes.values(), key=lambda c: c.priority):
+            while cls.waiters and self._can_start(cls):
+                waiter = cls.waiters.popleft()
+                if waiter.future.done():
+                    continue
+                if now + cls.service_time > waiter.deadline:
+                    # Can no longer finish in time: shed instead of starting it late
+                    waiter.future.set_exception(self._reject(cls, "deadline"))
+                    continue
+                self._start(cls)
+                waiter.future.set_result(None)
+            queue_depth_gauge.set(len(cls.waiters), priority_class=cls.name)
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying an AdmissionController to HTTP requests."""
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cls = self.controller.classify(scope["path"])
+        try:
+            waited = await self.controller.acquire(cls, self._client_timeout(scope))
+        except AdmissionRejected as e:
+            await self._send_rejection(send, e)
+            return
+
+        started = time.monotonic()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and not cls.bypass:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"queue;dur={waited * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.controller.release(cls, time.monotonic() - started)
+
+    @staticmethod
+    def _client_timeout(scope: Scope) -> Optional[float]:
+        value = Headers(scope=scope).get(CLIENT_TIMEOUT_HEADER)
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    async def _send_rejection(send: Send, rejection: AdmissionRejected) -> None:
+        body = json.dumps({
+            "detail": {"error": "Server is overloaded, please retry later", "reason": rejection.reason}
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(rejection.retry_after)).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
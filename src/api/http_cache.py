@@ -0,0 +1,92 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Generated audio is named after a SHA-256 digest (see TTSService), so the bytes
+# behind such a name never change and can be cached by clients indefinitely.
+CONTENT_ADDRESSED_NAME = re.compile(r"^[a-z]+_[0-9a-f]{64}\.[a-z0-9]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ETagCache:
+    """
+    Bounded cache of strong ETags computed from file contents.
+
+    Entries are keyed by path, size and modification time, so a file is only hashed
+    again when it changes on disk.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of ETags to keep before evicting the oldest
+        """
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, stat_result: os.stat_result) -> str:
+        """
+        Return the strong ETag for a file, hashing its contents on a cache miss.
+
+        Args:
+            path: Path of the file
+            stat_result: Result of a prior `os.stat` call for the file
+
+        Returns:
+            str: Quoted ETag derived from the SHA-256 of the file contents
+        """
+        key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+        with self._lock:
+            etag = self._entries.get(key)
+            if etag is not None:
+                self._entries.move_to_end(key)
+                return etag
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()}"'
+
+        with self._lock:
+            self._entries[key] = etag
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison, RFC 9110 13.1.2).
+
+    Args:
+        if_none_match: Raw If-None-Match header value, if any
+        etag: Current quoted ETag of the resource
+
+    Returns:
+        bool: True if the client's cached copy is still current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cache_control_for(filename: str) -> str:
+    """Return the Cache-Control policy for a served file name."""
+    if CONTENT_ADDRESSED_NAME.match(filename):
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
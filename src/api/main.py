@@ -1,35 +1,259 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, Depends, FastAPI, UploadFile, File, HTTPException, Form, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response
 from pathlib import Path
+import math
 import os
-from src.services.file_service import FileService, InvalidFileTypeError
-from src.services.captioning_service import CaptioningService
-from src.services.narrative_service import NarrativeService, NarrativeGenerationError
+import stat
+import time
+from src.api.admission import AdmissionControlMiddleware, AdmissionController
+from src.api.http_cache import ETagCache, cache_control_for, etag_matches
+from src.api.static_assets import StaticAssetApp, StaticAssetPipeline
+from src.services.audio_transcoder import (
+    AudioFormat, AudioTranscoder, TranscodingError, audio_formats, format_for_extension, negotiate
+)
+from src.services.file_service import FileService, ImageUpload, InvalidFileTypeError, is_content_hash
+from src.services.caption_tiers import TierController, parse_tiers
+from src.services.captioning_service import CaptioningService, CaptionResult
+from src.services.image_index import ImageIndex
+from src.services.model_registry import ModelChecksumError, ModelNotFoundError, ModelRegistry
+from src.services.object_storage import create_storage_backend
+from src.services.pipeline import Pipeline, Stage, StageCache
+from src.services.narrative_service import (
+    NarrativeCompletion, NarrativeService, NarrativeGenerationError, NarrativeTimeoutError
+)
 from src.config import settings
 from typing import Optional
 from src.services.tts_service import TTSService
+from src.services.vision_feature_cache import VisionFeatureCache
+from src.services.janitor_service import StorageJanitor
+from src.services.metrics import metrics
+from src.services.rate_limiter import RateLimiter, RateLimitExceeded, client_id, parse_api_keys
 
-app = FastAPI(title="Visual Storyteller")
-
-# Mount static files
 static_dir = Path(__file__).parent.parent / "static"
-app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+static_assets = StaticAssetPipeline(static_dir)
+storage_janitor = StorageJanitor()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare static assets and start background storage cleanup."""
+    await run_in_threadpool(static_assets.build)
+    if settings.JANITOR_ENABLED:
+        await storage_janitor.start()
+    try:
+        yield
+    finally:
+        await storage_janitor.stop()
+        await narrative_service.upstream.aclose()
+        await file_service.backend.close()
+        if tts_service.backend is not None:
+            await tts_service.backend.close()
+        if image_index is not None:
+            await run_in_threadpool(image_index.save)
+
+app = FastAPI(title="Visual Storyteller", lifespan=lifespan)
+
+# Compress JSON API responses (audio and precompressed assets are left alone)
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+
+# Queue by priority and shed load before any work is done
+admission_controller = AdmissionController() if settings.ADMISSION_ENABLED else None
+if admission_controller is not None:
+    app.add_middleware(AdmissionControlMiddleware, controller=admission_controller)
+
+# Behind a load balancer the connecting address is the balancer's: take the client's
+# from X-Forwarded-For, skipping trusted proxies, so clients are not limited as one
+app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=settings.FORWARDED_ALLOW_IPS)
+
+# Mount static files: precompressed text assets, everything else from disk
+app.mount(
+    "/static",
+    StaticAssetApp(static_assets, fallback=StaticFiles(directory=str(static_dir))),
+    name="static"
+)
 
 # Initialize services with config
-file_service = FileService(upload_dir=settings.UPLOAD_DIR)
-captioning_service = CaptioningService()
+file_service = FileService(
+    upload_dir=settings.UPLOAD_DIR,
+    backend=create_storage_backend(settings.UPLOAD_DIR, settings.S3_UPLOAD_PREFIX)
+)
+image_index = ImageIndex(
+    path=settings.IMAGE_INDEX_PATH,
+    threshold=settings.NEAR_DUPLICATE_THRESHOLD,
+    max_entries=settings.IMAGE_INDEX_MAX_ENTRIES,
+    persist_interval=settings.IMAGE_INDEX_PERSIST_INTERVAL
+) if settings.NEAR_DUPLICATE_ENABLED else None
+vision_features = VisionFeatureCache(
+    max_bytes=settings.VISION_CACHE_MAX_MB * 1024 * 1024,
+    disk_dir=settings.VISION_CACHE_DIR,
+    fp16_on_disk=settings.VISION_CACHE_FP16,
+    max_disk_bytes=settings.VISION_CACHE_DISK_MAX_MB * 1024 * 1024
+) if settings.VISION_CACHE_ENABLED else None
+model_registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
+captioning_service = CaptioningService(
+    index=image_index, feature_cache=vision_features, registry=model_registry,
+    tier_controller=TierController(
+        parse_tiers(settings.CAPTION_TIERS),
+        # Processing requests queued by admission control have not reached captioning yet
+        load=(lambda: admission_controller.queue_depth("processing")) if admission_controller else None
+    ) if settings.CAPTION_TIERING_ENABLED else None
+)
 narrative_service = NarrativeService()
+# Audio is always synthesized to AUDIO_DIR; remote storage makes it visible to all instances
+tts_service = TTSService(
+    backend=create_storage_backend(settings.AUDIO_DIR, settings.S3_AUDIO_PREFIX)
+    if settings.STORAGE_BACKEND != "local" else None
+)
+audio_transcoder = AudioTranscoder(tts_service.storage)
+audio_etags = ETagCache()
+rate_limiter = RateLimiter()
+api_keys = parse_api_keys(settings.RATE_LIMIT_API_KEYS)
+
+async def current_client(request: Request, x_api_key: str | None = Header(None)) -> str:
+    """Identify the caller by an accepted API key, falling back to the remote address."""
+    return client_id(x_api_key, request.client.host if request.client else None, api_keys)
+
+async def rate_limited_client(client: str = Depends(current_client)) -> str:
+    """Charge the request to the caller's rate limit, rejecting it with 429 when exhausted."""
+    if settings.RATE_LIMIT_ENABLED:
+        try:
+            await rate_limiter.check(client)
+        except RateLimitExceeded as e:
+            raise HTTPException(
+                status_code=429,
+                detail={"error": str(e)},
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+    return client
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for App Runner."""
     return {"status": "healthy", "service": "Visual Storyteller"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose service metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+async def caption_prompts(prompts: list[str] | None = Form(None)) -> list[str]:
+    """Conditional caption prompts of a request (repeat the `prompts` field), validated."""
+    prompts = [prompt.strip() for prompt in prompts or [] if prompt.strip()]
+    if len(prompts) > settings.MAX_CAPTION_PROMPTS:
+        raise HTTPException(
+            status_code=422,
+            detail={"error": f"At most {settings.MAX_CAPTION_PROMPTS} caption prompts are allowed"}
+        )
+    return prompts
+
+async def persist_upload(file_path: str, content: bytes) -> None:
+    """Write a processed upload to disk and hand it to storage cleanup."""
+    await file_service.write(file_path, content)
+    await run_in_threadpool(storage_janitor.track, file_path)
+
+async def uploaded_image(
+    background_tasks: BackgroundTasks,
+    file: UploadFile | None = File(None),
+    image_hash: str | None = Form(None)
+) -> ImageUpload:
+    """
+    The image of a request: a new `file` upload, or a stored one named by the SHA-256
+    `image_hash` of its content (see GET /images/{image_hash}).
+    
+    Uploads are processed from memory. Depending on UPLOAD_PERSISTENCE they are
+    written to disk by the request's pipeline, alongside processing ("sync"), after
+    the response is sent ("background"), or not at all ("ephemeral").
+    """
+    if file is not None:
+        try:
+            file_path = file_service.upload_path(file.filename)
+        except InvalidFileTypeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        content = await file.read()
+        if settings.UPLOAD_PERSISTENCE == "sync":
+            return ImageUpload(content, file_path, pending_write=True)
+        elif settings.UPLOAD_PERSISTENCE == "background":
+            background_tasks.add_task(persist_upload, file_path, content)
+        else:
+            file_path = None
+        return ImageUpload(content, file_path)
+    
+    if not image_hash:
+        raise HTTPException(status_code=422, detail={"error": "Either file or image_hash is required"})
+    file_path = await file_service.find_by_hash(image_hash.lower())
+    if file_path is None:
+        # Expired or never seen: the client falls back to uploading the file
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "Unknown image hash, upload the file instead"}
+        )
+    await run_in_threadpool(storage_janitor.track, file_path)
+    return ImageUpload(await file_service.read(file_path), file_path)
+
+@app.get("/usage")
+async def get_usage(client: str = Depends(current_client)):
+    """Report the caller's accumulated usage (requests, images, tokens, audio seconds)."""
+    return (await rate_limiter.usage(client)).to_dict()
+
+@app.get("/images/{image_hash}")
+async def lookup_image(image_hash: str):
+    """
+    Check whether an image is already stored, by the SHA-256 of its content.
+    
+    Clients ask before uploading: on a hit the processing endpoints accept the hash
+    (`image_hash` form field) in place of the file.
+    """
+    image_hash = image_hash.lower()
+    if not is_content_hash(image_hash) or await file_service.find_by_hash(image_hash) is None:
+        raise HTTPException(status_code=404, detail={"error": "Image not found"})
+    record = image_index.lookup(image_hash) if image_index is not None else None
+    return {
+        "image_hash": image_hash,
+        "captioned": bool(record and record.get("model") == captioning_service.model_name)
+    }
+
+@app.get("/models")
+async def list_models():
+    """List registered captioning model variants and the active one."""
+    return {
+        "active": captioning_service.model_name,
+        "variants": await run_in_threadpool(model_registry.names)
+    }
+
+@app.post("/models/{name}/activate")
+async def activate_model(name: str, x_admin_key: str | None = Header(None)):
+    """Switch captioning to another registered model variant without a restart."""
+    if not settings.ADMIN_API_KEY or x_admin_key != settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail={"error": "Admin key required"})
+    try:
+        await captioning_service.switch_model(name)
+    except (ModelNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail={"error": str(e)})
+    except ModelChecksumError as e:
+        raise HTTPException(status_code=409, detail={"error": str(e)})
+    return {"active": captioning_service.model_name}
+
+@app.get("/config")
+async def client_config():
+    """Client settings, such as the image size and encoding to use for uploads."""
+    return {
+        "image": {
+            "target_size": settings.UPLOAD_TARGET_SIZE,
+            "format": settings.UPLOAD_IMAGE_FORMAT,
+            "quality": settings.UPLOAD_IMAGE_QUALITY,
+            "worker_url": static_assets.url_for("js/image-worker.js")
+        },
+        "allowed_extensions": sorted(settings.ALLOWED_EXTENSIONS)
+    }
+
 @app.get("/")
-async def root():
-    """Serve the main HTML page."""
-    return FileResponse(str(static_dir / "index.html"))
+async def root(request: Request):
+    """Serve the main HTML page, with asset references pointing at fingerprinted URLs."""
+    return static_assets.response("index.html", request.headers)
 
 @app.post("/upload/")
 async def upload_file(file: UploadFile = File(...)):
@@ -41,91 +265,327 @@ async def upload_file(file: UploadFile = File(...)):
     """
     try:
         file_path = await file_service.save_upload(file)
+        await run_in_threadpool(storage_janitor.track, file_path)
         return {"file_path": file_path}
     except InvalidFileTypeError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def audio_variant(filename: str, audio_format: AudioFormat) -> str:
+    """
+    Get the variant of a generated MP3 in a format, encoding and publishing it on first use.
+
+    Returns:
+        str: Path of the variant in the audio directory
+
+    Raises:
+        FileNotFoundError: If the MP3 does not exist
+        TranscodingError: If the variant cannot be encoded
+    """
+    name = AudioTranscoder.variant_name(filename, audio_format)
+    located = await tts_service.storage.locate(name)
+    if located is not None:
+        return located[0]
+    file_path = await audio_transcoder.transcode(filename, audio_format)
+    await run_in_threadpool(storage_janitor.track, file_path)
+    if tts_service.backend is not None:
+        await tts_service.backend.put_file(name, file_path, audio_format.media_type)
+    return file_path
+
+def narrative_deadline(started: float, client_timeout: str | None) -> Optional[float]:
+    """
+    Seconds a narrative may take: NARRATIVE_DEADLINE, shortened to what remains of the
+    client's own timeout (X-Request-Timeout, counted from `started`). None for no limit.
+    """
+    deadlines = [settings.NARRATIVE_DEADLINE] if settings.NARRATIVE_DEADLINE > 0 else []
+    try:
+        if client_timeout:
+            deadlines.append(float(client_timeout) - (time.monotonic() - started))
+    except ValueError:
+        pass
+    return max(min(deadlines), 0.0) if deadlines else None
+
+# Processing pipelines. Stage functions look services up when they run, so replaced
+# services (model switches, test doubles) are picked up.
+
+async def persist_stage(image: ImageUpload) -> None:
+    """Write an upload whose persistence was left to the pipeline (UPLOAD_PERSISTENCE=sync)."""
+    await persist_upload(image.file_path, image.content)
+
+async def caption_stage(image: ImageUpload, num_captions: int) -> CaptionResult:
+    """Ranked captions of the image."""
+    return await captioning_service.caption(image.content, num_captions=num_captions)
+
+async def scene_details_stage(image: ImageUpload, prompts: list[str]) -> list[str]:
+    """Conditional captions completing the prompts."""
+    return await captioning_service.generate_conditional_captions(image.content, prompts)
+
+async def scene_stage(caption_result: CaptionResult, scene_details: list[str] | None) -> str:
+    """Scene description the narrative is written for: the top caption and its details."""
+    return ". ".join(caption_result.captions[:1] + (scene_details or []))
+
+def narrative_reuse_stage(image: ImageUpload) -> tuple[str, dict | None]:
+    """Index key of the image and the record of it or a near-duplicate. Blocking."""
+    key = image_index.key_for(image.content)
+    return key, image_index.get(key)
+
+class NarrativeReuseCache(StageCache):
+    """Reuses the narrative of a (near-)duplicate image described by the same scene."""
+    
+    async def get(self, values):
+        record = values["reuse_record"]
+        if record and record.get("narrative_caption") == values["scene"]:
+            return NarrativeCompletion([record["narrative"]], source="cache")
+        return None
+    
+    async def put(self, values, result: NarrativeCompletion) -> None:
+        # Fallback narratives are not worth reusing
+        if values["reuse_key"] and result.source == "upstream":
+            await run_in_threadpool(
+                image_index.put, values["reuse_key"],
+                narrative=result.narratives[0], narrative_caption=values["scene"]
+            )
+
+async def narrative_stage(
+    scene: str,
+    reuse_record: dict | None,
+    narrative_options: dict,
+    started: float,
+    client_timeout: str | None
+) -> NarrativeCompletion:
+    """Ranked narratives of the scene, within the request's narrative deadline."""
+    return await narrative_service.complete(
+        scene,
+        **narrative_options,
+        deadline=narrative_deadline(started, client_timeout),
+        cached_narrative=reuse_record.get("narrative") if reuse_record else None
+    )
+
+async def tts_stage(completion: NarrativeCompletion, language: str | None) -> str:
+    """Speech of the top narrative, handed to storage cleanup."""
+    audio_file = await tts_service.text_to_speech(completion.narratives[0], language=language)
+    await run_in_threadpool(storage_janitor.track, audio_file)
+    return audio_file
+
+def audio_seconds_stage(audio_file: str) -> float:
+    """Duration of the speech, for usage accounting. Blocking."""
+    return tts_service.estimate_duration(audio_file)
+
+async def transcode_stage(audio_file: str, audio_format: AudioFormat) -> str:
+    """The speech in the requested format."""
+    return await audio_variant(os.path.basename(audio_file), audio_format)
+
+caption_stages = [
+    Stage("persist", persist_stage, inputs=("image",), when=lambda values: values["image"].pending_write),
+    Stage("caption", caption_stage, inputs=("image", "num_captions"), outputs=("caption_result",)),
+    # After captioning, so the vision features it cached are reused
+    Stage(
+        "scene_details", scene_details_stage, inputs=("image", "prompts"), outputs=("scene_details",),
+        after=("caption",), when=lambda values: bool(values["prompts"])
+    )
+]
+caption_pipeline = Pipeline("process", caption_stages, inputs=("image", "num_captions", "prompts"))
+narrative_pipeline = Pipeline(
+    "process_with_narrative",
+    caption_stages + [
+        Stage("scene", scene_stage, inputs=("caption_result", "scene_details"), outputs=("scene",)),
+        Stage(
+            "narrative_reuse", narrative_reuse_stage, inputs=("image",),
+            outputs=("reuse_key", "reuse_record"), executor="thread",
+            when=lambda values: values["reuse_narrative"]
+        ),
+        Stage(
+            "narrative", narrative_stage,
+            inputs=("scene", "reuse_record", "narrative_options", "started", "client_timeout"),
+            outputs=("completion",), cache=NarrativeReuseCache()
+        ),
+        Stage(
+            "tts", tts_stage, inputs=("completion", "language"), outputs=("audio_file",),
+            when=lambda values: values["tts"]
+        ),
+        Stage(
+            "audio_seconds", audio_seconds_stage, inputs=("audio_file",), outputs=("audio_seconds",),
+            executor="thread", when=lambda values: values["audio_file"] is not None
+        ),
+        Stage(
+            "transcode", transcode_stage, inputs=("audio_file", "audio_format"), outputs=("audio_variant",),
+            max_concurrency=settings.AUDIO_TRANSCODE_CONCURRENCY,
+            when=lambda values: values["audio_file"] is not None and values["audio_format"] is not None
+        )
+    ],
+    inputs=(
+        "image", "num_captions", "prompts", "narrative_options", "reuse_narrative",
+        "started", "client_timeout", "tts", "language", "audio_format"
+    )
+)
+
 @app.post("/process/")
-async def process_image(file: UploadFile = File(...)):
+async def process_image(
+    http_response: Response,
+    prompts: list[str] = Depends(caption_prompts),
+    client: str = Depends(rate_limited_client),
+    # Resolved after the rate limit check, so rejected requests store nothing
+    image: ImageUpload = Depends(uploaded_image)
+):
     """
     Process an image file to generate a caption.
     
+    The image is uploaded as `file`, or named by the `image_hash` of a stored upload.
+    Optional `prompts` (e.g. "a photograph of") are completed as conditional captions,
+    sharing one vision encoder pass. Under load the caption comes from a cheaper
+    tier (fewer beams, shorter output or a smaller model), named in `caption_tier`.
+    
+    Stage durations are reported in the `Server-Timing` header.
+    
     Returns:
-        dict: Contains the file path and generated caption
+        dict: Contains the file path, generated caption, its tier and any conditional captions
     """
     try:
-        # First save the file
-        file_path = await file_service.save_upload(file)
-        
-        # Then generate a caption
-        caption = await captioning_service.generate_caption(file_path)
-        
-        return {
-            "file_path": file_path,
-            "caption": caption
+        run = await caption_pipeline.run(image=image, num_captions=1, prompts=prompts)
+        result = run["caption_result"]
+        response = {
+            "file_path": image.file_path,
+            "caption": result.captions[0],
+            "caption_tier": result.tier
         }
-    except InvalidFileTypeError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        if prompts:
+            response["conditional_captions"] = run["scene_details"]
+        http_response.headers["Server-Timing"] = run.server_timing()
+        await rate_limiter.record_usage(client, images=1)
+        
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/process_with_narrative/")
 async def process_with_narrative(
-    file: UploadFile = File(...),
+    http_response: Response,
     prompt_template: str | None = Form(None),
     max_tokens: int | None = Form(None),
     temperature: float | None = Form(None),
+    narrative_words: int | None = Form(None, ge=10, le=1000),
+    narrative_seconds: float | None = Form(None, gt=0, le=600),
     tts: bool = Form(False),
-    language: str | None = Form(None)
+    language: str | None = Form(None),
+    audio_format: str | None = Form(None),
+    num_captions: int = Form(1, ge=1, le=settings.MAX_ALTERNATIVES),
+    num_narratives: int = Form(1, ge=1, le=settings.MAX_ALTERNATIVES),
+    prompts: list[str] = Depends(caption_prompts),
+    client: str = Depends(rate_limited_client),
+    image: ImageUpload = Depends(uploaded_image),
+    x_request_timeout: str | None = Header(None)
 ) -> dict:
-    """Process an image with captioning, narrative generation, and optional TTS."""
+    """
+    Process an image with captioning, narrative generation, and optional TTS.
+    
+    Alternatives cost one model pass each: `num_captions` beams come from a single
+    BLIP generate call and `num_narratives` choices from a single upstream request.
+    The narrative is written for the top caption, and TTS reads the top narrative.
+    Conditional caption `prompts` add scene details to the narrative's input; the
+    image is encoded once for all of them. The image is uploaded as `file`, or named
+    by the `image_hash` of a stored upload. A target length in `narrative_words`, or
+    narration time in `narrative_seconds`, sizes the narrative's token budget unless
+    `max_tokens` is given. `audio_format` (mp3, opus or aac) selects
+    the encoding of the TTS audio.
+    
+    The narrative must arrive within NARRATIVE_DEADLINE, and within the time left of
+    the client's `X-Request-Timeout`; otherwise the image's cached narrative or a
+    locally generated one is served (`narrative_source` tells which).
+    
+    The stages run as `narrative_pipeline`: storing the upload, captioning and the
+    duplicate lookup run concurrently, as do the audio duration estimate and
+    transcoding. Stage durations are reported in the `Server-Timing` header.
+    """
+    started = time.monotonic()
+    formats = audio_formats()
+    if audio_format is not None and audio_format not in formats:
+        raise HTTPException(
+            status_code=422,
+            detail={"error": f"Unknown audio format: choose one of {', '.join(formats)}"}
+        )
     try:
-        # Save uploaded file
-        file_path = await file_service.save_upload(file)
-        
-        # Generate caption
-        caption = await captioning_service.generate_caption(file_path)
-        
-        # Generate narrative
-        narrative = await narrative_service.generate_narrative(
-            caption,
-            prompt_template=prompt_template,
-            max_tokens=max_tokens,
-            temperature=temperature
+        run = await narrative_pipeline.run(
+            image=image,
+            num_captions=num_captions,
+            prompts=prompts,
+            narrative_options={
+                "num_narratives": num_narratives,
+                "prompt_template": prompt_template,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "target_words": narrative_words,
+                "target_seconds": narrative_seconds
+            },
+            # A (near-)duplicate image with the same scene description can reuse its narrative
+            reuse_narrative=(
+                image_index is not None and settings.NEAR_DUPLICATE_REUSE_NARRATIVE
+                and num_narratives == 1
+                and not (prompt_template or max_tokens or temperature or narrative_words or narrative_seconds)
+            ),
+            started=started,
+            client_timeout=x_request_timeout,
+            tts=tts,
+            language=language,
+            # MP3 is what TTS produces; other formats are transcoded
+            audio_format=formats[audio_format]
+            if audio_format is not None and formats[audio_format].ffmpeg_args is not None else None
         )
+        result = run["caption_result"]
+        completion = run["completion"]
         
         response = {
-            "file_path": file_path,
-            "caption": caption,
-            "narrative": narrative
+            "file_path": image.file_path,
+            "caption": result.captions[0],
+            "narrative": completion.narratives[0],
+            "captions": result.captions,
+            "caption_tier": result.tier,
+            "narratives": completion.narratives,
+            "narrative_source": completion.source
         }
+        if run["scene_details"]:
+            response["scene_details"] = run["scene_details"]
+        if run["audio_file"] is not None:
+            response["audio_file"] = os.path.basename(run["audio_variant"] or run["audio_file"])
+        http_response.headers["Server-Timing"] = run.server_timing()
         
-        # Generate TTS if requested
-        if tts:
-            tts_service = TTSService()
-            audio_file = await tts_service.text_to_speech(narrative, language=language)
-            # Extract just the filename from the full path
-            audio_filename = os.path.basename(audio_file)
-            response["audio_file"] = audio_filename
-        
+        await rate_limiter.record_usage(
+            client, images=1, tokens=completion.total_tokens, audio_seconds=run["audio_seconds"] or 0.0
+        )
         return response
         
+    except NarrativeTimeoutError as e:
+        raise HTTPException(status_code=504, detail={"error": str(e)})
     except Exception as e:
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
 @app.get("/audio/{filename}")
-async def get_audio(filename: str):
+async def get_audio(
+    filename: str,
+    if_none_match: str | None = Header(None),
+    accept: str | None = Header(None)
+):
     """
     Retrieve a generated audio file.
     
+    MP3 names are served in the best format the client explicitly accepts (Opus, then
+    AAC, then MP3; `Vary: Accept`); `.opus` and `.m4a` names select a format directly.
+    Variants are transcoded from the MP3 on first request and kept like the MP3.
+    
+    Supports Range requests (206 Partial Content), strong content-hash ETags with
+    If-None-Match revalidation (304), and immutable caching for content-addressed names.
+    With S3 storage, files there are served by a 307 redirect to a presigned URL.
+    
     Args:
         filename: Name of the audio file to retrieve
+        if_none_match: ETags of copies the client already holds
+        accept: Media types the client can play
         
     Returns:
-        FileResponse: The audio file with appropriate content type
+        FileResponse: The audio file (or requested byte range) with appropriate content type,
+            or a redirect to it
         
     Raises:
-        HTTPException: 404 if file not found, 400 if invalid filename, 500 for other errors
+        HTTPException: 404 if file not found, 400 if invalid filename,
+            503 if a requested format cannot be encoded, 500 for other errors
     """
     try:
         # Validate filename to prevent directory traversal
@@ -135,33 +595,73 @@ async def get_audio(filename: str):
                 detail={"error": "Invalid filename: directory traversal not allowed"}
             )
             
-        # Ensure file has .mp3 extension
-        if not filename.endswith(".mp3"):
+        # Ensure file is MP3 or one of its transcoded variants
+        audio_format = format_for_extension(filename)
+        if audio_format is None:
             raise HTTPException(
                 status_code=400,
-                detail={"error": "Invalid file format: only MP3 files are allowed"}
+                detail={"error": "Invalid file format: only MP3, Opus (.opus) and AAC (.m4a) files are allowed"}
             )
+        source = os.path.splitext(filename)[0] + ".mp3"
+        
+        # Content negotiation for MP3 names
+        headers = {}
+        if audio_format.ffmpeg_args is None and settings.AUDIO_NEGOTIATION_ENABLED and audio_transcoder.available:
+            headers["Vary"] = "Accept"
+            audio_format = negotiate(accept) or audio_format
+        name = AudioTranscoder.variant_name(source, audio_format)
             
-        # Construct file path
-        file_path = os.path.join(settings.AUDIO_DIR, filename)
+        # With shared object storage, clients download the file directly from it
+        if tts_service.backend is not None and await tts_service.backend.exists(name):
+            return RedirectResponse(
+                await tts_service.backend.presigned_url(name),
+                status_code=307,
+                headers={**headers, "Cache-Control": f"private, max-age={settings.S3_PRESIGN_EXPIRES // 2}"}
+            )
         
-        # Check if path exists and is a file
-        if not os.path.exists(file_path):
+        # Resolve the file in its shard directory; the stat result is reused by the response
+        located = await tts_service.storage.locate(name)
+        if located is None and audio_format.ffmpeg_args is not None:
+            try:
+                await audio_variant(source, audio_format)
+            except FileNotFoundError:
+                pass
+            except TranscodingError as e:
+                if name == filename:
+                    raise HTTPException(
+                        status_code=503,
+                        detail={"error": f"Audio format unavailable: {str(e)}"}
+                    )
+                # Negotiated: fall back to the MP3 the client asked for
+                audio_format, name = format_for_extension(source), source
+            located = await tts_service.storage.locate(name)
+        if located is None:
             raise HTTPException(
                 status_code=404,
                 detail={"error": "Audio file not found"}
             )
+        file_path, stat_result = located
             
-        if not os.path.isfile(file_path):
+        if not stat.S_ISREG(stat_result.st_mode):
             raise HTTPException(
                 status_code=400,
                 detail={"error": "Invalid audio file"}
             )
+        
+        etag = await run_in_threadpool(audio_etags.get, file_path, stat_result)
+        headers.update({"ETag": etag, "Cache-Control": cache_control_for(name)})
+        
+        # The client's copy is current: skip the body entirely
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
             
+        # FileResponse serves Range requests as 206 Partial Content
         return FileResponse(
             file_path,
-            media_type="audio/mpeg",
-            filename=filename
+            media_type=audio_format.media_type,
+            filename=name,
+            stat_result=stat_result,
+            headers=headers
         )
             
     except HTTPException:
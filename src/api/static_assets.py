@@ -0,0 +1,241 @@
+import gzip
+import hashlib
+import mimetypes
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+from src.api.http_cache import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, etag_matches
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip is always available
+    brotli = None
+
+# Text assets worth compressing; images and audio are already compressed
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".html", ".svg", ".json", ".txt", ".map"}
+
+# Assets referenced from HTML that get content-hashed names
+FINGERPRINTED_SUFFIXES = {".css", ".js"}
+
+# Skip compression when it cannot pay for the extra header bytes
+MIN_COMPRESS_SIZE = 256
+
+_STATIC_REFERENCE = re.compile(r'(?P<attr>src|href)="/static/(?P<path>[^"?#]+)"')
+
+
+@dataclass
+class StaticAsset:
+    """A static file held in memory with its precompressed variants."""
+
+    path: str
+    media_type: str
+    digest: str
+    fingerprinted_path: Optional[str] = None
+    variants: dict[str, bytes] = field(default_factory=dict)
+
+    def etag(self, encoding: str) -> str:
+        """Strong ETag for one encoding of the asset."""
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+def _fingerprint(path: str, digest: str) -> str:
+    """Insert a short content hash before the suffix: css/app.css -> css/app.<hash>.css."""
+    stem, dot, suffix = path.rpartition(".")
+    return f"{stem}.{digest[:12]}.{suffix}" if dot else f"{path}.{digest[:12]}"
+
+
+def _accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q-value}."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class StaticAssetPipeline:
+    """
+    Precomputes fingerprinted, compressed variants of the frontend assets.
+
+    Every compressible file under the static directory is read once, hashed, and
+    compressed with gzip and (when the `brotli` package is installed) brotli. CSS and
+    JS files also get a content-hashed URL that is safe to cache forever; references
+    to them in HTML are rewritten to that URL.
+    """
+
+    def __init__(self, static_dir: Path):
+        """
+        Initialize the pipeline.
+
+        Args:
+            static_dir: Directory holding the frontend assets
+        """
+        self.static_dir = Path(static_dir)
+        self._assets: dict[str, StaticAsset] = {}
+        self._fingerprinted: dict[str, StaticAsset] = {}
+        self._built = False
+        self._lock = threading.Lock()
+
+    @property
+    def encodings(self) -> tuple[str, ...]:
+        """Content codings produced for each asset, in order of preference."""
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def build(self) -> None:
+        """Read, fingerprint and compress all assets. Safe to call more than once."""
+        with self._lock:
+            if self._built:
+                return
+
+            assets: dict[str, StaticAsset] = {}
+            for file_path in sorted(self.static_dir.rglob("*")):
+                suffix = file_path.suffix.lower()
+                if not file_path.is_file() or suffix not in COMPRESSIBLE_SUFFIXES:
+                    continue
+                relative_path = file_path.relative_to(self.static_dir).as_posix()
+                assets[relative_path] = self._build_asset(relative_path, file_path.read_bytes())
+
+            # HTML is rewritten after all fingerprints are known
+            for asset in assets.values():
+                if asset.media_type == "text/html":
+                    html = self._rewrite_references(
+                        asset.variants["identity"].decode("utf-8"), assets
+                    )
+                    assets[asset.path] = self._build_asset(asset.path, html.encode("utf-8"))
+
+            self._assets = assets
+            self._fingerprinted = {
+                asset.fingerprinted_path: asset
+                for asset in assets.values()
+                if asset.fingerprinted_path
+            }
+            self._built = True
+
+    def _build_asset(self, path: str, content: bytes) -> StaticAsset:
+        """Hash and compress a single asset."""
+        suffix = Path(path).suffix.lower()
+        digest = hashlib.sha256(content).hexdigest()
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        asset = StaticAsset(
+            path=path,
+            media_type=media_type,
+            digest=digest,
+            fingerprinted_path=_fingerprint(path, digest) if suffix in FINGERPRINTED_SUFFIXES else None,
+            variants={"identity": content}
+        )
+        if len(content) >= MIN_COMPRESS_SIZE:
+            asset.variants["gzip"] = gzip.compress(content, compresslevel=9, mtime=0)
+            if brotli is not None:
+                asset.variants["br"] = brotli.compress(content, quality=11)
+        return asset
+
+    def _rewrite_references(self, html: str, assets: dict[str, StaticAsset]) -> str:
+        """Point /static/ references in HTML at fingerprinted URLs."""
+        def replace(match: re.Match) -> str:
+            asset = assets.get(match.group("path"))
+            if asset is None or asset.fingerprinted_path is None:
+                return match.group(0)
+            return f'{match.group("attr")}="/static/{asset.fingerprinted_path}"'
+
+        return _STATIC_REFERENCE.sub(replace, html)
+
+    def url_for(self, path: str) -> str:
+        """Return the cacheable URL for an asset path relative to the static directory."""
+        self.build()
+        asset = self._assets.get(path)
+        return f"/static/{asset.fingerprinted_path or path}" if asset else f"/static/{path}"
+
+    def lookup(self, path: str) -> tuple[Optional[StaticAsset], bool]:
+        """
+        Find an asset by original or fingerprinted path.
+
+        Returns:
+            tuple: The asset (or None) and whether the path was fingerprinted
+        """
+        self.build()
+        asset = self._fingerprinted.get(path)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(path), False
+
+    def response(self, path: str, headers: Headers) -> Optional[Response]:
+        """
+        Build the response for an asset, negotiating the content coding.
+
+        Args:
+            path: Asset path relative to the static directory
+            headers: Request headers (Accept-Encoding, If-None-Match)
+
+        Returns:
+            Response: The asset response, or None if the path is not a known asset
+        """
+        asset, fingerprinted = self.lookup(path)
+        if asset is None:
+            return None
+
+        accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = next(
+            (
+                coding for coding in self.encodings
+                if coding in asset.variants and accepted.get(coding, accepted.get("*", 0)) > 0
+            ),
+            "identity"
+        )
+
+        response_headers = {
+            "ETag": asset.etag(encoding),
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+
+        if etag_matches(headers.get("if-none-match"), response_headers["ETag"]):
+            return Response(status_code=304, headers=response_headers)
+        return Response(
+            asset.variants[encoding],
+            media_type=asset.media_type,
+            headers=response_headers
+        )
+
+
+class StaticAssetApp:
+    """ASGI app serving pipeline assets, deferring anything else to a fallback app."""
+
+    def __init__(self, pipeline: StaticAssetPipeline, fallback: ASGIApp):
+        """
+        Initialize the app.
+
+        Args:
+            pipeline: Pipeline holding the precomputed assets
+            fallback: App serving files the pipeline does not handle (e.g. images)
+        """
+        self.pipeline = pipeline
+        self.fallback = fallback
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path = scope["path"]
+            root_path = scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            path = path.lstrip("/")
+            response = self.pipeline.response(path, Headers(scope=scope))
+            if response is not None:
+                await response(scope, receive, send)
+                return
+        await self.fallback(scope, receive, send)
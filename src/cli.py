@@ -0,0 +1,345 @@
+"""
+Command line entry points for offline processing.
+
+Usage:
+    python -m src.cli batch <directory|manifest> --output results.jsonl [--tts]
+    python -m src.cli models register <name> --source Salesforce/blip-image-captioning-base
+    python -m src.cli models list|verify [<name>]
+    python -m src.cli storage migrate [<directory> ...]
+
+Images are streamed from a directory tree or a manifest (a .txt file with one path
+per line, or a .jsonl file of objects with a "path" key), captioned in batches and
+narrated (and optionally voiced) with bounded concurrency. Each finished item is
+appended to the JSONL output and then recorded in a checkpoint file, so an
+interrupted run resumes where it stopped without recomputing finished items.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchOptions:
+    """Settings of one batch run."""
+    batch_size: int = 8
+    concurrency: int = 4
+    narrative: bool = True
+    tts: bool = False
+    language: Optional[str] = None
+    prompt_template: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    """Outcome of a batch run."""
+    processed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: dict[str, str] = field(default_factory=dict)
+
+
+def iter_images(source: str) -> Iterator[str]:
+    """
+    Stream image paths from a directory tree or a manifest file.
+
+    Relative manifest entries are resolved against the manifest's directory.
+    """
+    path = Path(source)
+    if path.is_dir():
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in settings.ALLOWED_EXTENSIONS:
+                    yield os.path.join(root, name)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)["path"] if path.suffix == ".jsonl" else line
+            yield entry if os.path.isabs(entry) else str(path.parent / entry)
+
+
+class Checkpoint:
+    """
+    Record of finished items, appended to after each result is written.
+
+    The checkpoint is the source of truth: result lines without a matching
+    checkpoint entry (a crash between the two writes) are dropped on resume.
+    """
+
+    def __init__(self, path: str, output_path: str):
+        self.path = path
+        self.output_path = output_path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.endswith("\n")}
+        self._discard_uncommitted_results()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _discard_uncommitted_results(self) -> None:
+        if not os.path.exists(self.output_path):
+            return
+        kept, dropped = [], 0
+        with open(self.output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    dropped += 1
+                    continue
+                if record.get("path") in self.done:
+                    kept.append(line if line.endswith("\n") else line + "\n")
+                else:
+                    dropped += 1
+        if dropped:
+            tmp_path = self.output_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.output_path)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def add(self, key: str) -> None:
+        self.done.add(key)
+        self._file.write(key + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def run_batch(
+    source: str,
+    output_path: str,
+    options: Optional[BatchOptions] = None,
+    checkpoint_path: Optional[str] = None,
+    captioning_service=None,
+    narrative_service=None,
+    tts_service=None
+) -> BatchReport:
+    """
+    Caption, narrate and optionally voice every image of a source.
+
+    Captioning runs in batches of `batch_size` images, one model pass each. While the
+    next batch is captioned, narratives and speech for finished captions run
+    concurrently, at most `concurrency` items at a time.
+
+    Args:
+        source: Directory or manifest file
+        output_path: JSONL file results are appended to
+        options: Batch settings
+        checkpoint_path: Checkpoint file (defaults to `<output>.checkpoint`)
+        captioning_service, narrative_service, tts_service: Services to use
+            (created from settings when omitted)
+
+    Returns:
+        BatchReport: Counts of processed, skipped (already done) and failed items
+    """
+    options = options or BatchOptions()
+    if captioning_service is None:
+        from src.services.captioning_service import CaptioningService
+        from src.services.model_registry import ModelRegistry
+        captioning_service = CaptioningService(registry=ModelRegistry(settings.MODEL_REGISTRY_DIR))
+    if narrative_service is None and options.narrative:
+        from src.services.narrative_service import NarrativeService
+        narrative_service = NarrativeService()
+    if tts_service is None and options.tts:
+        from src.services.tts_service import TTSService
+        tts_service = TTSService()
+
+    report = BatchReport()
+    checkpoint = Checkpoint(checkpoint_path or output_path + ".checkpoint", output_path)
+    slots = asyncio.Semaphore(options.concurrency)
+    pending: set[asyncio.Task] = set()
+    write_lock = asyncio.Lock()
+
+    async def caption_batch(paths: list[str]) -> list[tuple[str, Optional[str], Optional[str]]]:
+        try:
+            captions = await captioning_service.generate_captions_batch(paths)
+            return [(path, caption, None) for path, caption in zip(paths, captions)]
+        except Exception:
+            # Isolate the bad image(s) instead of failing the whole batch
+            results = []
+            for path in paths:
+                try:
+                    results.append((path, await captioning_service.generate_caption(path), None))
+                except Exception as e:
+                    results.append((path, None, str(e)))
+            return results
+
+    async def finish_item(path: str, caption: str) -> None:
+        try:
+            record = {"path": path, "caption": caption}
+            if options.narrative:
+                narrative = await narrative_service.generate_narrative(
+                    caption, prompt_template=options.prompt_template
+                )
+                record["narrative"] = narrative
+                if options.tts:
+                    record["audio_file"] = await tts_service.text_to_speech(
+                        narrative, language=options.language
+                    )
+            async with write_lock:
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                checkpoint.add(path)
+            report.processed += 1
+        except Exception as e:
+            fail(path, str(e))
+        finally:
+            slots.release()
+
+    def fail(path: str, error: str) -> None:
+        report.failed += 1
+        report.errors[path] = error
+        logger.warning("Failed to process %s: %s", path, error)
+
+    async def process(paths: list[str]) -> None:
+        for path, caption, error in await caption_batch(paths):
+            if error is not None:
+                fail(path, error)
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(finish_item(path, caption))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+    output = open(output_path, "a", encoding="utf-8")
+    try:
+        batch: list[str] = []
+        for path in iter_images(source):
+            if path in checkpoint:
+                report.skipped += 1
+                continue
+            batch.append(path)
+            if len(batch) >= options.batch_size:
+                await process(batch)
+                batch = []
+        if batch:
+            await process(batch)
+        if pending:
+            await asyncio.gather(*pending)
+    finally:
+        output.close()
+        checkpoint.close()
+    return report
+
+
+def export_parquet(jsonl_path: str, parquet_path: str) -> None:
+    """Convert a results JSONL file to Parquet (requires pyarrow)."""
+    try:
+        import pyarrow.json as pa_json
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+    pq.write_table(pa_json.read_json(jsonl_path), parquet_path)
+
+
+def _batch_command(args: argparse.Namespace) -> int:
+    options = BatchOptions(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        narrative=not args.no_narrative,
+        tts=args.tts,
+        language=args.language,
+        prompt_template=args.prompt_template
+    )
+    started = time.monotonic()
+    report = asyncio.run(run_batch(args.source, args.output, options, args.checkpoint))
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
+    print(
+        f"Processed {report.processed}, skipped {report.skipped} already done, "
+        f"failed {report.failed} in {time.monotonic() - started:.1f}s"
+    )
+    return 1 if report.failed else 0
+
+
+def _models_command(args: argparse.Namespace) -> int:
+    from src.services.model_registry import ModelChecksumError, ModelRegistry
+    registry = ModelRegistry(args.registry or settings.MODEL_REGISTRY_DIR)
+    if args.action == "register":
+        manifest = registry.register(
+            args.name, source=args.source or settings.BLIP_MODEL,
+            cache_dir=os.getenv("TRANSFORMERS_CACHE")
+        )
+        print(f"Registered {args.name} ({len(manifest['files'])} files)")
+    elif args.action == "verify":
+        failed = False
+        for name in [args.name] if args.name else registry.names():
+            try:
+                registry.verify(name, full=True)
+                print(f"{name}: ok")
+            except ModelChecksumError as e:
+                print(f"{name}: {e}")
+                failed = True
+        return 1 if failed else 0
+    else:
+        for name in registry.names():
+            manifest = registry.manifest(name)
+            print(f"{name}\t{manifest['source']}")
+    return 0
+
+
+def _storage_command(args: argparse.Namespace) -> int:
+    from src.services.sharded_storage import ShardedDirectory
+    for directory in args.directories or [settings.UPLOAD_DIR, settings.AUDIO_DIR]:
+        started = time.monotonic()
+        moved = ShardedDirectory(directory, levels=settings.STORAGE_SHARD_LEVELS).migrate()
+        print(f"{directory}: moved {moved} files into shards in {time.monotonic() - started:.1f}s")
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Visual Storyteller tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    batch = subcommands.add_parser("batch", help="Caption and narrate a directory or manifest of images")
+    batch.add_argument("source", help="Image directory, or manifest (.txt paths or .jsonl with 'path')")
+    batch.add_argument("-o", "--output", default="results.jsonl", help="JSONL results file (appended to)")
+    batch.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    batch.add_argument("--parquet", help="Also export the results to this Parquet file")
+    batch.add_argument("--batch-size", type=int, default=8, help="Images per captioning pass")
+    batch.add_argument("--concurrency", type=int, default=4, help="Concurrent narrative/TTS items")
+    batch.add_argument("--no-narrative", action="store_true", help="Only generate captions")
+    batch.add_argument("--tts", action="store_true", help="Also synthesize speech for narratives")
+    batch.add_argument("--language", help="TTS language (default: TTS_LANGUAGE)")
+    batch.add_argument("--prompt-template", help="Narrative prompt template with {caption}")
+    batch.set_defaults(handler=_batch_command)
+
+    models = subcommands.add_parser("models", help="Manage the local safetensors model registry")
+    models.add_argument("action", choices=["register", "list", "verify"])
+    models.add_argument("name", nargs="?", help="Model variant name")
+    models.add_argument("--source", help="Hugging Face model id or directory (default: BLIP_MODEL)")
+    models.add_argument("--registry", help="Registry directory (default: MODEL_REGISTRY_DIR)")
+    models.set_defaults(handler=_models_command)
+
+    storage = subcommands.add_parser("storage", help="Maintain the upload and audio directories")
+    storage.add_argument("action", choices=["migrate"], help="Move flat-layout files into shard directories")
+    storage.add_argument("directories", nargs="*", help="Directories (default: UPLOAD_DIR and AUDIO_DIR)")
+    storage.set_defaults(handler=_storage_command)
+
+    args = parser.parse_args(argv)
+    if args.command == "models" and args.action == "register" and not args.name:
+        parser.error("models register requires a name")
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
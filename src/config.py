@@ -7,25 +7,175 @@ class Settings(BaseSettings):
     # File Service Settings
     UPLOAD_DIR: str = Field("data/sample_images", description="Directory for uploaded images")
     AUDIO_DIR: str = Field("data/audio", description="Directory for audio files")
-    ALLOWED_EXTENSIONS: set[str] = {".jpg", ".jpeg", ".png"}
+    ALLOWED_EXTENSIONS: set[str] = {".jpg", ".jpeg", ".png", ".webp"}
+    STORAGE_SHARD_LEVELS: int = Field(
+        2, description="Hashed subdirectory levels for uploads and audio (0 keeps them flat)"
+    )
+    STORAGE_BACKEND: str = Field("local", description="Upload and audio storage: local or s3")
+    S3_BUCKET: Optional[str] = Field(None, description="Bucket for STORAGE_BACKEND=s3")
+    S3_ENDPOINT_URL: Optional[str] = Field(None, description="S3-compatible endpoint, e.g. MinIO (default: AWS)")
+    S3_REGION: Optional[str] = Field(None, description="Bucket region")
+    S3_ACCESS_KEY_ID: Optional[str] = Field(None, description="Access key (default: the AWS credential chain)")
+    S3_SECRET_ACCESS_KEY: Optional[str] = Field(None, description="Secret key (default: the AWS credential chain)")
+    S3_UPLOAD_PREFIX: str = Field("uploads/", description="Key prefix of uploaded images")
+    S3_AUDIO_PREFIX: str = Field("audio/", description="Key prefix of generated audio")
+    S3_PRESIGN_EXPIRES: int = Field(3600, description="Lifetime of presigned audio URLs in seconds")
+    S3_MULTIPART_THRESHOLD_MB: int = Field(8, description="Objects from this size on are uploaded in parts")
+    S3_MAX_POOL_CONNECTIONS: int = Field(32, description="HTTP connections kept open to the S3 endpoint")
+    UPLOAD_PERSISTENCE: str = Field(
+        "background",
+        description='When processed uploads are stored: "sync", "background" (after the response) or "ephemeral" (never)'
+    )
+    UPLOAD_HASH_INDEX_MAX_ENTRIES: int = Field(
+        10000, description="Stored uploads findable by content hash (GET /images/{hash})"
+    )
+    
+    # Client Upload Settings (advertised to the frontend through GET /config)
+    UPLOAD_TARGET_SIZE: int = Field(
+        384, description="Shorter image side in pixels clients downscale to before upload"
+    )
+    UPLOAD_IMAGE_FORMAT: str = Field("image/webp", description="Preferred upload encoding")
+    UPLOAD_IMAGE_QUALITY: float = Field(0.85, description="Encoder quality (0.0 to 1.0)")
     
     # OpenAI Settings
     OPENAI_API_KEY: Optional[str] = Field(None, description="OpenAI API key")
     OPENAI_MODEL: str = Field("gpt-4o-mini", description="OpenAI model to use")
     OPENAI_MAX_TOKENS: int = Field(200, description="Maximum tokens for narrative generation")
     OPENAI_TEMPERATURE: float = Field(0.7, description="Temperature for narrative generation")
+    NARRATIVE_DEADLINE: float = Field(
+        20.0, description="Seconds to wait for a narrative before falling back (0 waits indefinitely)"
+    )
+    NARRATIVE_FALLBACK: str = Field(
+        "local", description="Narrative after a missed deadline: local (template generator) or none"
+    )
+    NARRATIVE_PROMPT_MAX_TOKENS: int = Field(
+        512, description="Token budget of the narrative prompt (template plus caption)"
+    )
+    NARRATIVE_MIN_TOKENS: int = Field(32, description="Smallest completion budget for a length target")
+    NARRATIVE_MAX_TOKENS_LIMIT: int = Field(1024, description="Largest completion budget for a length target")
+    OPENAI_BASE_URL: Optional[str] = Field(None, description="OpenAI-compatible API base URL")
+    OPENAI_TIMEOUT: float = Field(30.0, description="Timeout in seconds per OpenAI request")
+    OPENAI_MAX_RETRIES: int = Field(2, description="Retries for transient OpenAI errors")
+    OPENAI_MAX_CONCURRENCY: int = Field(8, description="Maximum concurrent OpenAI requests")
+    OPENAI_RPM_LIMIT: Optional[int] = Field(None, description="Requests per minute (default: per model)")
+    OPENAI_TPM_LIMIT: Optional[int] = Field(None, description="Tokens per minute (default: per model)")
+    OPENAI_HEDGING_ENABLED: bool = Field(True, description="Send a second request when the first is slow")
+    OPENAI_HEDGE_PERCENTILE: float = Field(95.0, description="Latency percentile after which to hedge")
+    OPENAI_HEDGE_INITIAL_DELAY: float = Field(
+        5.0, description="Hedge threshold in seconds until enough latencies are recorded"
+    )
+    OPENAI_HEDGE_MIN_DELAY: float = Field(0.5, description="Smallest hedge threshold in seconds")
+    OPENAI_HEDGE_MAX_FRACTION: float = Field(0.1, description="Largest share of requests that may be hedged")
+    OPENAI_CIRCUIT_FAILURE_THRESHOLD: int = Field(
+        5, description="Consecutive failures before the OpenAI circuit opens"
+    )
+    OPENAI_CIRCUIT_RESET_TIMEOUT: float = Field(
+        30.0, description="Seconds before an open OpenAI circuit allows a trial request"
+    )
     
     # BLIP Settings
     BLIP_MODEL: str = Field("Salesforce/blip-image-captioning-base", description="BLIP model to use")
     DEVICE: str = Field("cuda", description="Device to use for ML models")
+    MODEL_REGISTRY_DIR: str = Field("models", description="Local registry of safetensors model variants")
+    CAPTION_MODEL_VARIANT: Optional[str] = Field(
+        None, description="Registered model variant to caption with (default: BLIP_MODEL from the HF cache)"
+    )
+    MODEL_VERIFY_CHECKSUMS: bool = Field(True, description="Verify model checksums before loading")
+    CAPTION_TIERING_ENABLED: bool = Field(True, description="Caption with cheaper tiers under load")
+    CAPTION_TIERS: str = Field(
+        '[{"name": "greedy"}, {"name": "short", "max_new_tokens": 12}]',
+        description="Captioning tiers, best first, as a JSON list (name, model, num_beams, max_new_tokens)"
+    )
+    CAPTION_TIER_QUEUE_THRESHOLDS: str = Field(
+        "8", description="Processing requests in flight or queued at which to step down a tier"
+    )
+    CAPTION_TIER_LATENCY_TARGET: float = Field(
+        2.0, description="Caption latency in seconds above which to step down a tier (0 disables)"
+    )
+    CAPTION_TIER_COOLDOWN: float = Field(10.0, description="Seconds between latency-driven tier changes")
+    VISION_CACHE_ENABLED: bool = Field(True, description="Cache BLIP vision encoder outputs per image")
+    VISION_CACHE_MAX_MB: int = Field(256, description="Memory budget for cached vision features in MB")
+    VISION_CACHE_DIR: Optional[str] = Field(None, description="Optional on-disk vision feature cache")
+    VISION_CACHE_FP16: bool = Field(True, description="Store on-disk vision features as float16")
+    VISION_CACHE_DISK_MAX_MB: int = Field(1024, description="Disk budget for VISION_CACHE_DIR in MB")
     
     # TTS Settings
     TTS_LANGUAGE: str = Field("en", description="Default language for TTS")
+    TTS_PARALLEL_CHUNKS: bool = Field(True, description="Synthesize long texts as concurrent chunks")
+    TTS_CHUNK_MAX_CHARS: int = Field(100, description="Maximum characters per synthesized chunk")
+    TTS_MAX_CONCURRENCY: int = Field(8, description="Maximum concurrent chunk requests to the TTS API")
     TTS_CLEANUP_AGE: int = Field(24, description="Age in hours after which to clean up audio files")
+    AUDIO_NEGOTIATION_ENABLED: bool = Field(
+        True, description="Serve /audio MP3 requests as Opus or AAC when the client's Accept header asks"
+    )
+    AUDIO_OPUS_BITRATE: str = Field("24k", description="Bitrate of Opus audio variants")
+    AUDIO_AAC_BITRATE: str = Field("32k", description="Bitrate of AAC audio variants")
+    FFMPEG_PATH: str = Field("ffmpeg", description="ffmpeg executable used to transcode audio")
+    AUDIO_TRANSCODE_CONCURRENCY: int = Field(
+        2, description="Maximum audio transcodes run at once by processing requests"
+    )
+    
+    # Storage Cleanup Settings
+    UPLOAD_CLEANUP_AGE: int = Field(24, description="Age in hours after which to clean up uploads")
+    STORAGE_DISK_BUDGET_MB: int = Field(
+        1024, description="Total disk budget for uploads and audio in MB (0 disables)"
+    )
+    JANITOR_ENABLED: bool = Field(True, description="Run the background storage janitor")
+    JANITOR_INTERVAL: int = Field(60, description="Seconds between storage cleanup sweeps")
+    JANITOR_BATCH_SIZE: int = Field(100, description="Maximum files removed per cleanup batch")
+    
+    # Alternatives Settings
+    MAX_ALTERNATIVES: int = Field(5, description="Maximum captions/narratives returned per request")
+    MAX_CAPTION_PROMPTS: int = Field(5, description="Maximum conditional caption prompts per request")
+    
+    # Admission Control Settings
+    ADMISSION_ENABLED: bool = Field(True, description="Queue and shed requests under overload")
+    ADMISSION_CAPACITY: int = Field(32, description="Maximum concurrently served requests")
+    ADMISSION_PROCESSING_CONCURRENCY: int = Field(
+        4, description="Maximum concurrent image processing requests"
+    )
+    ADMISSION_PROCESSING_QUEUE: int = Field(
+        32, description="Maximum processing requests waiting for admission"
+    )
+    ADMISSION_PROCESSING_TIMEOUT: float = Field(
+        60.0, description="Assumed client timeout in seconds for processing requests"
+    )
+    
+    # Near-Duplicate Cache Settings
+    NEAR_DUPLICATE_ENABLED: bool = Field(True, description="Reuse captions of identical/similar images")
+    NEAR_DUPLICATE_THRESHOLD: int = Field(
+        5, description="Maximum differing perceptual hash bits (of 64) for a near-duplicate"
+    )
+    NEAR_DUPLICATE_REUSE_NARRATIVE: bool = Field(
+        False, description="Also reuse the narrative when default generation settings are used"
+    )
+    IMAGE_INDEX_PATH: str = Field("data/image_index.npz", description="Persisted near-duplicate index")
+    IMAGE_INDEX_MAX_ENTRIES: int = Field(100_000, description="Maximum images in the index")
+    IMAGE_INDEX_PERSIST_INTERVAL: int = Field(60, description="Seconds between index saves")
+    
+    # Rate Limiting Settings
+    RATE_LIMIT_ENABLED: bool = Field(True, description="Limit processing requests per client")
+    RATE_LIMIT_PER_MINUTE: float = Field(30, description="Sustained processing requests per minute")
+    RATE_LIMIT_BURST: float = Field(10, description="Processing requests a client may make at once")
+    RATE_LIMIT_BACKEND: str = Field(
+        "memory", description="Rate limit and usage store: 'memory' or 'sqlite' (shared by workers)"
+    )
+    RATE_LIMIT_DB_PATH: str = Field("data/rate_limits.db", description="SQLite rate limit database")
+    RATE_LIMIT_API_KEYS: str = Field(
+        "", description="Comma-separated API keys with their own allowance; other callers are limited by address"
+    )
+    RATE_LIMIT_MAX_CLIENTS: int = Field(
+        100_000, description="Clients the memory backend tracks before forgetting the least recent"
+    )
     
     # API Settings
+    FORWARDED_ALLOW_IPS: str = Field(
+        "127.0.0.1",
+        description="Comma-separated proxy addresses or networks whose X-Forwarded-For is trusted, or '*'"
+    )
     API_HOST: str = Field("0.0.0.0", description="API host")
     API_PORT: int = Field(8000, description="API port")
+    ADMIN_API_KEY: Optional[str] = Field(None, description="Key for admin endpoints (X-Admin-Key header)")
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
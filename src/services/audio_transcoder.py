@@ -0,0 +1,189 @@
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Optional
+from src.config import settings
+from src.services.sharded_storage import ShardedDirectory
+from src.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class TranscodingError(Exception):
+    """Raised when an audio variant cannot be produced."""
+    pass
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """An audio encoding offered to clients."""
+    name: str
+    extension: str
+    media_type: str
+    # Extra media types clients may list in Accept for this format
+    aliases: tuple[str, ...] = ()
+    # ffmpeg output options; None for the original gTTS MP3
+    ffmpeg_args: Optional[tuple[str, ...]] = None
+
+
+def audio_formats() -> dict[str, AudioFormat]:
+    """
+    The bitrate ladder, in order of preference when a client accepts several.
+
+    Speech stays intelligible at far lower bitrates than music: 24 kbps Opus is
+    about half the size of gTTS's 32 kbps MP3 and sounds better.
+    """
+    return {
+        "opus": AudioFormat(
+            "opus", ".opus", "audio/ogg",
+            aliases=("audio/opus", "audio/ogg; codecs=opus", "application/ogg"),
+            ffmpeg_args=(
+                "-c:a", "libopus", "-b:a", settings.AUDIO_OPUS_BITRATE,
+                "-application", "voip", "-f", "ogg"
+            )
+        ),
+        "aac": AudioFormat(
+            "aac", ".m4a", "audio/mp4",
+            aliases=("audio/aac", "audio/x-m4a"),
+            ffmpeg_args=(
+                "-c:a", "aac", "-b:a", settings.AUDIO_AAC_BITRATE,
+                "-movflags", "+faststart", "-f", "mp4"
+            )
+        ),
+        "mp3": AudioFormat("mp3", ".mp3", "audio/mpeg", aliases=("audio/mp3",))
+    }
+
+
+def format_for_extension(filename: str) -> Optional[AudioFormat]:
+    """The format of an audio file name, or None if it is not one we serve."""
+    extension = os.path.splitext(filename)[1].lower()
+    for audio_format in audio_formats().values():
+        if audio_format.extension == extension:
+            return audio_format
+    return None
+
+
+def negotiate(accept: Optional[str]) -> Optional[AudioFormat]:
+    """
+    Pick the best transcoded format a client explicitly accepts.
+
+    Wildcards (`*/*`, `audio/*`) do not count: browsers send them without being
+    able to play every format, so such clients get the original MP3 (None).
+    Ties in quality are broken by the ladder order.
+    """
+    if not accept:
+        return None
+    accepted: dict[str, float] = {}
+    for item in accept.split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        extensions = []
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+            else:
+                extensions.append(param.replace(" ", "").replace('"', ""))
+        media_type = media_type.lower()
+        if extensions:
+            # e.g. "audio/ogg; codecs=opus" does not imply every Ogg codec plays
+            media_type = f"{media_type}; {'; '.join(extensions)}".lower()
+        accepted[media_type] = max(quality, accepted.get(media_type, 0.0))
+
+    best, best_quality = None, 0.0
+    for audio_format in audio_formats().values():
+        quality = max(
+            (accepted.get(media_type, 0.0) for media_type in (audio_format.media_type,) + audio_format.aliases),
+            default=0.0
+        )
+        if quality > best_quality:
+            best, best_quality = audio_format, quality
+    return best if best is not None and best.ffmpeg_args else None
+
+
+class AudioTranscoder:
+    """
+    Produces compact encodings of generated speech with ffmpeg.
+
+    A variant is named after its source (`audio_<digest>.mp3` becomes
+    `audio_<digest>.opus`), and source names are content hashes, so each variant is
+    encoded once and then served from the audio directory like any other file.
+    """
+
+    def __init__(self, storage: ShardedDirectory, ffmpeg: Optional[str] = None):
+        """
+        Initialize the transcoder.
+
+        Args:
+            storage: Audio directory holding sources and variants
+            ffmpeg: ffmpeg executable (default: FFMPEG_PATH)
+        """
+        self.storage = storage
+        self.ffmpeg = shutil.which(ffmpeg or settings.FFMPEG_PATH)
+        self._in_flight = SingleFlight()
+
+    @property
+    def available(self) -> bool:
+        """Whether ffmpeg was found."""
+        return self.ffmpeg is not None
+
+    @staticmethod
+    def variant_name(filename: str, audio_format: AudioFormat) -> str:
+        """File name of a source's variant in a format."""
+        return os.path.splitext(filename)[0] + audio_format.extension
+
+    async def transcode(self, filename: str, audio_format: AudioFormat) -> str:
+        """
+        Get the variant of an MP3 source in a format, encoding it on first use.
+
+        Args:
+            filename: Name of the source MP3 in the audio directory
+            audio_format: Target format
+
+        Returns:
+            str: Path of the variant (the source itself for MP3)
+
+        Raises:
+            FileNotFoundError: If the source does not exist
+            TranscodingError: If ffmpeg is unavailable or fails
+        """
+        name = self.variant_name(filename, audio_format)
+        if name != filename:
+            located = await self.storage.locate(name)
+            if located is not None:
+                return located[0]
+        source = await self.storage.locate(filename)
+        if source is None:
+            raise FileNotFoundError(filename)
+        if audio_format.ffmpeg_args is None:
+            return source[0]
+        return await self._in_flight.do(name, lambda: self._encode(source[0], name, audio_format))
+
+    async def _encode(self, source: str, name: str, audio_format: AudioFormat) -> str:
+        """Run ffmpeg into a temporary file, then move it into place atomically."""
+        if not self.available:
+            raise TranscodingError("ffmpeg is not available")
+        target = await self.storage.prepare(name)
+        tmp_path = target + ".part"
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", source, "-vn", "-ac", "1", *audio_format.ffmpeg_args, tmp_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise TranscodingError(
+                f"ffmpeg failed to encode {name}: {stderr.decode(errors='replace').strip()}"
+            )
+        os.replace(tmp_path, target)
+        logger.info("Encoded %s", name)
+        return target
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from src.config import settings
+from src.services.metrics import metrics
+
+tier_requests_total = metrics.counter(
+    "caption_tier_requests_total", "Captioning requests by the tier that served them", ["tier"]
+)
+tier_level_gauge = metrics.gauge(
+    "caption_tier_latency_level", "Tiers stepped down because of observed captioning latency"
+)
+
+
+@dataclass(frozen=True)
+class CaptionTier:
+    """A captioning configuration, from best quality to cheapest."""
+    name: str
+    # Registered model variant; None uses the service's active model
+    model: Optional[str] = None
+    num_beams: int = 1
+    max_new_tokens: Optional[int] = None
+
+    def generate_kwargs(self, num_captions: int = 1) -> dict:
+        """Decoding arguments for `generate`; alternatives always need a beam each."""
+        kwargs = {}
+        num_beams = max(self.num_beams, num_captions)
+        if num_beams > 1:
+            kwargs["num_beams"] = num_beams
+        if num_captions > 1:
+            kwargs["num_return_sequences"] = num_captions
+        if self.max_new_tokens:
+            kwargs["max_new_tokens"] = self.max_new_tokens
+        return kwargs
+
+
+def parse_tiers(spec: str) -> list[CaptionTier]:
+    """
+    Parse CAPTION_TIERS: a JSON list of tiers, best first, e.g.
+    `[{"name": "beam", "num_beams": 3}, {"name": "fast", "model": "blip-small"}]`.
+
+    Raises:
+        ValueError: If the spec is malformed or empty
+    """
+    try:
+        tiers = [CaptionTier(**tier) for tier in json.loads(spec)]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid CAPTION_TIERS: {e}")
+    if not tiers:
+        raise ValueError("CAPTION_TIERS must list at least one tier")
+    return tiers
+
+
+class TierController:
+    """
+    Routes captioning requests to cheaper tiers as load grows.
+
+    Two signals pick the tier. Queue depth (captioning requests in flight, this one
+    included, or the processing requests admitted and queued by admission control
+    when `load` reports them) steps down one tier per threshold crossed, reacting at
+    once to spikes.
+    The moving average of caption latency steps down one more tier while it exceeds
+    the latency target, and back up once it falls below half of it, at most once per
+    `cooldown` seconds so that tiers do not flap. The cheaper of the two wins.
+    """
+
+    def __init__(
+        self,
+        tiers: list[CaptionTier],
+        queue_thresholds: Optional[list[int]] = None,
+        latency_target: Optional[float] = None,
+        cooldown: Optional[float] = None,
+        smoothing: float = 0.2,
+        load: Optional[Callable[[], int]] = None
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            tiers: Tiers from best quality to cheapest
+            queue_thresholds: Queue depths at which to step down a tier, ascending
+                (default: CAPTION_TIER_QUEUE_THRESHOLDS)
+            latency_target: Caption latency in seconds to stay under
+                (default: CAPTION_TIER_LATENCY_TARGET; 0 ignores latency)
+            cooldown: Minimum seconds between latency-driven tier changes
+            smoothing: Weight of each new latency in the moving average
+            load: Reports requests upstream of captioning, served or queued (e.g. by
+                admission control); the larger of it and the caller's depth is used
+        """
+        self.tiers = tiers
+        self.queue_thresholds = sorted(
+            queue_thresholds if queue_thresholds is not None else [
+                int(value) for value in settings.CAPTION_TIER_QUEUE_THRESHOLDS.split(",") if value.strip()
+            ]
+        )
+        self.latency_target = (
+            settings.CAPTION_TIER_LATENCY_TARGET if latency_target is None else latency_target
+        )
+        self.cooldown = settings.CAPTION_TIER_COOLDOWN if cooldown is None else cooldown
+        self.smoothing = smoothing
+        self.load = load
+        self.latency_level = 0
+        self.average_latency: Optional[float] = None
+        self._changed_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def select(self, queue_depth: int) -> tuple[int, CaptionTier]:
+        """The tier (and its rank, 0 being the best) for a request at the given queue depth."""
+        if self.load is not None:
+            queue_depth = max(queue_depth, self.load())
+        queue_level = sum(queue_depth >= threshold for threshold in self.queue_thresholds)
+        rank = min(max(queue_level, self.latency_level), len(self.tiers) - 1)
+        tier = self.tiers[rank]
+        tier_requests_total.inc(tier=tier.name)
+        return rank, tier
+
+    def observe(self, latency: float) -> None:
+        """Record the latency of a captioning request."""
+        with self._lock:
+            if self.average_latency is None:
+                self.average_latency = latency
+            else:
+                self.average_latency += self.smoothing * (latency - self.average_latency)
+            if not self.latency_target:
+                return
+            now = time.monotonic()
+            if now - self._changed_at < self.cooldown:
+                return
+            if self.average_latency > self.latency_target and self.latency_level < len(self.tiers) - 1:
+                self.latency_level += 1
+            elif self.average_latency < self.latency_target / 2 and self.latency_level > 0:
+                self.latency_level -= 1
+            else:
+                return
+            self._changed_at = now
+            tier_level_gauge.set(self.latency_level)
@@ -1,84 +1,478 @@
 from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
-import torch
-from typing import Optional
+from dataclasses import dataclass
+from typing import Optional, Union
 from src.config import settings
+from src.services.caption_tiers import CaptionTier, TierController
+from src.services.image_index import ImageIndex
+from src.services.lazy_import import lazy_import
+from src.services.model_registry import ModelNotFoundError, ModelRegistry
+from src.services.single_flight import SingleFlight, content_key
+from src.services.vision_feature_cache import VisionFeatureCache
+import asyncio
+import hashlib
+import io
+import logging
 import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Heavy ML dependencies are imported on first use so the API boots without them
+torch = lazy_import("torch")
+BlipProcessor = lazy_import("transformers", "BlipProcessor")
+BlipForConditionalGeneration = lazy_import("transformers", "BlipForConditionalGeneration")
+
+# An image file path, or the encoded image itself (e.g. a request body held in memory)
+ImageSource = Union[str, bytes]
+
+# Decoding of untiered requests: greedy, or one beam per alternative
+DEFAULT_TIER = CaptionTier("default")
+
+@dataclass
+class CaptionResult:
+    """Ranked captions of an image, with the tier that produced them."""
+    captions: list[str]
+    tier: Optional[str] = None
 
 class CaptioningService:
     """Service for generating captions from images using the BLIP model."""
     
-    def __init__(self, processor: Optional[BlipProcessor] = None, model: Optional[BlipForConditionalGeneration] = None):
+    def __init__(
+        self,
+        processor: Optional["BlipProcessor"] = None,
+        model: Optional["BlipForConditionalGeneration"] = None,
+        index: Optional[ImageIndex] = None,
+        feature_cache: Optional[VisionFeatureCache] = None,
+        registry: Optional[ModelRegistry] = None,
+        model_name: Optional[str] = None,
+        tier_controller: Optional[TierController] = None
+    ):
         """
         Initialize the captioning service.
         
         Args:
             processor: Optional pre-initialized BLIP processor
             model: Optional pre-initialized BLIP model
+            index: Optional caption cache reused for identical and near-duplicate images
+            feature_cache: Optional cache of vision encoder outputs, so repeated
+                captioning of an image only runs the text decoder
+            registry: Optional local registry of safetensors model variants
+            model_name: Registered variant to use (default: CAPTION_MODEL_VARIANT);
+                without a registered variant BLIP_MODEL is loaded from the HF cache
+            tier_controller: Optional router of requests to cheaper captioning tiers
+                under load; without one every request uses default decoding
         """
-        self._processor = processor
-        self._model = model
-        self.device = settings.DEVICE if torch.cuda.is_available() else "cpu"
+        # Components passed in; the rest are loaded on first use
+        self._given = (processor, model)
+        # The processor and model in use, as one pair replaced in a single assignment,
+        # so a call running during switch_model never mixes two variants
+        self._loaded: Optional[tuple] = None
+        self.index = index
+        self.feature_cache = feature_cache
+        self.registry = registry
+        self.model_name = model_name or settings.CAPTION_MODEL_VARIANT or settings.BLIP_MODEL
+        self._load_lock = threading.Lock()
+        self._device: Optional[str] = None
+        self._in_flight = SingleFlight()
+        self.tier_controller = tier_controller
+        # Models of tiers that use another registered variant, by variant name
+        self._tier_models: dict[str, tuple] = {}
+        # Captioning requests waiting for or running on a model
+        self.queue_depth = 0
     
     @property
-    def processor(self):
-        """Lazy initialization of the processor."""
-        if self._processor is None:
+    def device(self) -> str:
+        """Lazy resolution of the device, which requires importing torch."""
+        if self._device is None:
+            self._device = settings.DEVICE if torch.cuda.is_available() else "cpu"
+        return self._device
+    
+    def _uses_registry(self) -> bool:
+        return self.registry is not None and self.model_name in self.registry.names()
+    
+    def _models(self) -> tuple:
+        """The active processor and model. Read once per call and used together."""
+        loaded = self._loaded
+        if loaded is None:
+            with self._load_lock:
+                if self._loaded is None:
+                    self._loaded = self._load()
+                loaded = self._loaded
+        return loaded
+    
+    def _load(self) -> tuple:
+        """Load the processor and model not passed in: the registered variant, or BLIP_MODEL."""
+        processor, model = self._given
+        if processor is not None and model is not None:
+            return processor, model
+        if self._uses_registry():
+            return self.registry.load(self.model_name, self.device, verify=settings.MODEL_VERIFY_CHECKSUMS)
+        if processor is None:
             try:
-                self._processor = BlipProcessor.from_pretrained(
+                processor = BlipProcessor.from_pretrained(
                     settings.BLIP_MODEL,
                     local_files_only=True,  # Use cached files only
                     cache_dir=os.getenv('TRANSFORMERS_CACHE', None)
                 )
             except Exception as e:
                 raise Exception(f"Failed to load BLIP processor: {str(e)}. Please ensure enough disk space and model cache exists.")
-        return self._processor
-    
-    @property
-    def model(self):
-        """Lazy initialization of the model."""
-        if self._model is None:
+        if model is None:
             try:
-                self._model = BlipForConditionalGeneration.from_pretrained(
+                model = BlipForConditionalGeneration.from_pretrained(
                     settings.BLIP_MODEL,
                     local_files_only=True,  # Use cached files only
                     cache_dir=os.getenv('TRANSFORMERS_CACHE', None)
                 )
-                self._model.to(self.device)
+                model.to(self.device)
             except Exception as e:
                 raise Exception(f"Failed to load BLIP model: {str(e)}. Please ensure enough disk space and model cache exists.")
-        return self._model
+        return processor, model
+    
+    async def switch_model(self, name: str) -> None:
+        """
+        Switch to another registered model variant without a restart.
+        
+        The variant is loaded (and verified) in a worker thread while requests keep
+        using the current model, then swapped in. Cached vision features and captions
+        belong to the previous model and are not reused.
+        
+        Raises:
+            ModelNotFoundError: If the variant is not registered
+            ModelChecksumError: If the variant's files are corrupt
+        """
+        if self.registry is None:
+            raise ModelNotFoundError("No model registry is configured")
+        processor, model = await asyncio.to_thread(
+            self.registry.load, name, self.device, settings.MODEL_VERIFY_CHECKSUMS
+        )
+        with self._load_lock:
+            self._loaded = (processor, model)
+            self.model_name = name
+            if self.feature_cache is not None:
+                self.feature_cache.clear()
+    
+    @property
+    def processor(self):
+        """Lazy initialization of the processor."""
+        return self._models()[0]
+    
+    @property
+    def model(self):
+        """Lazy initialization of the model."""
+        return self._models()[1]
+    
+    @staticmethod
+    def _read_image(image: ImageSource) -> bytes:
+        """Encoded bytes of an image, read from disk only when given a path."""
+        if isinstance(image, bytes):
+            return image
+        with open(image, "rb") as f:
+            return f.read()
     
-    async def generate_caption(self, image_path: str) -> str:
+    async def generate_caption(self, image: ImageSource) -> str:
         """
         Generate a caption for the given image.
         
         Args:
-            image_path: Path to the image file
+            image: Path to the image file, or its encoded bytes
             
         Returns:
             str: Generated caption for the image
             
+        Raises:
+            FileNotFoundError: If the image file doesn't exist
+            Exception: If the image is invalid or processing fails
+        """
+        captions = await self.generate_captions(image, num_captions=1)
+        return captions[0]
+    
+    async def generate_captions(self, image: ImageSource, num_captions: int = 1) -> list[str]:
+        """
+        Generate alternative captions for the given image in a single model pass.
+        
+        Args:
+            image: Path to the image file, or its encoded bytes
+            num_captions: Number of alternatives to return (top beams, best first)
+            
+        Returns:
+            list[str]: Up to `num_captions` distinct captions, ranked by beam score
+            
+        Raises:
+            FileNotFoundError: If the image file doesn't exist
+            Exception: If the image is invalid or processing fails
+        """
+        result = await self.caption(image, num_captions=num_captions)
+        return result.captions
+    
+    async def caption(self, image: ImageSource, num_captions: int = 1) -> CaptionResult:
+        """
+        Generate captions like `generate_captions`, on the tier the current load allows.
+        
+        Returns:
+            CaptionResult: Ranked captions and the name of the tier used (None untiered)
+            
         Raises:
             FileNotFoundError: If the image file doesn't exist
             Exception: If the image is invalid or processing fails
         """
         try:
-            # Load and preprocess the image
-            image = Image.open(image_path).convert('RGB')
-            inputs = self.processor(image, return_tensors="pt")
+            image_bytes = self._read_image(image)
+            self.queue_depth += 1
+            started = time.monotonic()
+            try:
+                rank, tier = 0, None
+                if self.tier_controller is not None:
+                    rank, tier = self.tier_controller.select(self.queue_depth)
+                # Identical images captioned concurrently share one model pass
+                captions = await self._in_flight.do(
+                    content_key("caption", image_bytes, num_captions, rank),
+                    lambda: asyncio.to_thread(self._caption_image, image_bytes, num_captions, rank, tier)
+                )
+            finally:
+                self.queue_depth -= 1
+            if self.tier_controller is not None:
+                self.tier_controller.observe(time.monotonic() - started)
+            return CaptionResult(captions, tier.name if tier else None)
             
-            # Move inputs to device if they're tensors
-            if isinstance(inputs, dict):
-                inputs = {k: v.to(self.device) if hasattr(v, 'to') else v for k, v in inputs.items()}
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Image file not found: {image}")
+        except Exception as e:
+            raise Exception(f"Failed to process image: {str(e)}")
+    
+    async def generate_conditional_captions(self, image: ImageSource, prompts: list[str]) -> list[str]:
+        """
+        Generate captions that continue text prompts, such as "a photograph of".
+        
+        The vision encoder runs once for all prompts (or not at all if its output is
+        cached), so N prompts cost about one encoder pass plus the decoder passes.
+        
+        Args:
+            image: Path to the image file, or its encoded bytes
+            prompts: Caption beginnings to complete
             
-            # Generate caption
-            output = self.model.generate(**inputs)
-            caption = self.processor.decode(output[0], skip_special_tokens=True)
+        Returns:
+            list[str]: One caption per prompt (including the prompt text), in input order
             
-            return caption
+        Raises:
+            FileNotFoundError: If the image file doesn't exist
+            Exception: If the image is invalid or processing fails
+        """
+        if not prompts:
+            return []
+        try:
+            image_bytes = self._read_image(image)
             
+            return await self._in_flight.do(
+                content_key("conditional", image_bytes, prompts),
+                lambda: asyncio.to_thread(self._conditional_captions, image_bytes, prompts)
+            )
+        
         except FileNotFoundError:
-            raise FileNotFoundError(f"Image file not found: {image_path}")
+            raise FileNotFoundError(f"Image file not found: {image}")
+        except Exception as e:
+            raise Exception(f"Failed to process image: {str(e)}")
+    
+    async def generate_captions_batch(self, image_paths: list[str]) -> list[str]:
+        """
+        Caption several images with one batched model pass.
+        
+        Batching amortizes per-call overhead and keeps the accelerator busy, which
+        matters for offline processing of large collections.
+        
+        Args:
+            image_paths: Paths to the image files
+            
+        Returns:
+            list[str]: One caption per image, in input order
+            
+        Raises:
+            FileNotFoundError: If an image file doesn't exist
+            Exception: If an image is invalid or processing fails
+        """
+        try:
+            images = await asyncio.to_thread(
+                lambda: [Path(image_path).read_bytes() for image_path in image_paths]
+            )
+            results = await asyncio.to_thread(self._caption_images_cached, images)
+            return [captions[0] for captions in results]
+        
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Image file not found: {e.filename}")
         except Exception as e:
-            raise Exception(f"Failed to process image: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Failed to process images: {str(e)}")
+    
+    def _caption_image(
+        self,
+        image_bytes: bytes,
+        num_captions: int = 1,
+        rank: int = 0,
+        tier: Optional[CaptionTier] = None
+    ) -> list[str]:
+        """Caption encoded image bytes. Blocking; called from a worker thread."""
+        return self._caption_images_cached([image_bytes], num_captions, rank, tier)[0]
+    
+    def _caption_images_cached(
+        self,
+        images: list[bytes],
+        num_captions: int = 1,
+        rank: int = 0,
+        tier: Optional[CaptionTier] = None
+    ) -> list[list[str]]:
+        """
+        Caption images, running the model only for those not (nearly) seen before.
+        
+        Cached captions are reused when they come from the requested tier (`rank`) or a
+        better one, so captions degraded under load are replaced once load drops.
+        """
+        if self.index is None:
+            return self._caption_images(images, num_captions, tier)
+        
+        keys = [self.index.key_for(image_bytes) for image_bytes in images]
+        results: list[Optional[list[str]]] = []
+        for key in keys:
+            record = self.index.get(key)
+            cached = (
+                record is not None and record.get("model") == self.model_name
+                and record.get("num_captions", 0) >= num_captions
+                and record.get("tier", 0) <= rank
+            )
+            results.append(record["captions"][:num_captions] if cached else None)
+        
+        misses = [i for i, captions in enumerate(results) if captions is None]
+        if misses:
+            generated = self._caption_images([images[i] for i in misses], num_captions, tier)
+            for i, captions in zip(misses, generated):
+                self.index.put(
+                    keys[i], captions=captions, num_captions=num_captions, model=self.model_name, tier=rank
+                )
+                results[i] = captions
+        return results
+    
+    def _tier_model(self, tier: Optional[CaptionTier]) -> tuple:
+        """Processor and model of a tier; the active ones unless it names another variant."""
+        if tier is None or tier.model is None or tier.model == self.model_name:
+            return self._models()
+        if tier.model not in self._tier_models:
+            if self.registry is None or tier.model not in self.registry.names():
+                logger.warning("Caption tier %s: model %s is not registered", tier.name, tier.model)
+                return self._models()
+            with self._load_lock:
+                if tier.model not in self._tier_models:
+                    self._tier_models[tier.model] = self.registry.load(
+                        tier.model, self.device, verify=settings.MODEL_VERIFY_CHECKSUMS
+                    )
+        return self._tier_models[tier.model]
+    
+    def _caption_images(
+        self,
+        images: list[bytes],
+        num_captions: int = 1,
+        tier: Optional[CaptionTier] = None
+    ) -> list[list[str]]:
+        """Run BLIP on a batch of encoded images. Blocking; called from a worker thread."""
+        # Generate captions; beam search returns the top-k beams best first
+        generate_kwargs = (tier or DEFAULT_TIER).generate_kwargs(num_captions)
+        processor, model = self._tier_model(tier)
+        
+        # Cached vision features belong to the active model
+        if self.feature_cache is not None and model is self._models()[1]:
+            output = self._decode(model, self._image_embeds(processor, model, images), **generate_kwargs)
+        else:
+            # Load and preprocess the images
+            pil_images = [Image.open(io.BytesIO(image_bytes)).convert('RGB') for image_bytes in images]
+            inputs = processor(pil_images, return_tensors="pt")
+            
+            # Move inputs to device if they're tensors
+            if isinstance(inputs, dict):
+                inputs = {k: v.to(self.device) if hasattr(v, 'to') else v for k, v in inputs.items()}
+            output = model.generate(**inputs, **generate_kwargs)
+        
+        # Sequences come back grouped per image, `num_captions` each
+        results = []
+        for start in range(0, len(images) * num_captions, num_captions):
+            captions = []
+            for sequence in output[start:start + num_captions]:
+                caption = processor.decode(sequence, skip_special_tokens=True)
+                if caption not in captions:
+                    captions.append(caption)
+            results.append(captions)
+        return results
+    
+    def _image_embeds(self, processor, model, images: list[bytes]):
+        """Vision encoder outputs for a batch of images, encoding only uncached ones."""
+        digests = [hashlib.sha256(image_bytes).hexdigest() for image_bytes in images]
+        embeds = [
+            self.feature_cache.get(digest, device=self.device, dtype=model.dtype)
+            if self.feature_cache is not None else None
+            for digest in digests
+        ]
+        misses = [i for i, image_embeds in enumerate(embeds) if image_embeds is None]
+        if misses:
+            pil_images = [Image.open(io.BytesIO(images[i])).convert('RGB') for i in misses]
+            pixel_values = processor(images=pil_images, return_tensors="pt")["pixel_values"]
+            with torch.no_grad():
+                encoded = model.vision_model(pixel_values=pixel_values.to(self.device))[0]
+            for i, image_embeds in zip(misses, encoded):
+                if self.feature_cache is not None:
+                    self.feature_cache.put(digests[i], image_embeds)
+                embeds[i] = image_embeds
+        return torch.stack(embeds)
+    
+    def _conditional_captions(self, image_bytes: bytes, prompts: list[str]) -> list[str]:
+        """
+        Complete several text prompts for one image. Blocking; called from a worker thread.
+        
+        The image is encoded once and its embeddings shared by every prompt. BLIP's text
+        decoder uses absolute positions, so prompts are not padded: prompts with the same
+        token length are decoded together as one batch.
+        """
+        processor, model = self._models()
+        image_embeds = self._image_embeds(processor, model, [image_bytes])
+        tokenized = [processor.tokenizer(prompt)["input_ids"] for prompt in prompts]
+        groups: dict[int, list[int]] = {}
+        for i, input_ids in enumerate(tokenized):
+            groups.setdefault(len(input_ids), []).append(i)
+        
+        captions: list[str] = [""] * len(prompts)
+        for indices in groups.values():
+            output = self._decode(
+                model,
+                image_embeds.expand(len(indices), -1, -1),
+                input_ids=torch.LongTensor([tokenized[i] for i in indices])
+            )
+            for i, sequence in zip(indices, output):
+                captions[i] = processor.decode(sequence, skip_special_tokens=True)
+        return captions
+    
+    def _decode(self, model, image_embeds, input_ids=None, attention_mask=None, **generate_kwargs):
+        """
+        Run only BLIP's text decoder on precomputed image embeddings.
+        
+        Mirrors BlipForConditionalGeneration.generate after its vision encoder call:
+        the prompt (or the default decoder start) begins with BOS and drops its
+        trailing SEP, and the image embeddings are cross-attended in full.
+        """
+        text_config = model.config.text_config
+        if input_ids is None:
+            input_ids = torch.LongTensor(
+                [[model.decoder_input_ids, text_config.eos_token_id]]
+            ).repeat(image_embeds.shape[0], 1)
+        input_ids = input_ids.clone().to(image_embeds.device)
+        input_ids[:, 0] = text_config.bos_token_id
+        if attention_mask is not None:
+            attention_mask = attention_mask[:, :-1].to(image_embeds.device)
+        image_attention_mask = torch.ones(
+            image_embeds.size()[:-1], dtype=torch.long, device=image_embeds.device
+        )
+        with torch.no_grad():
+            return model.text_decoder.generate(
+                input_ids=input_ids[:, :-1],
+                eos_token_id=text_config.sep_token_id,
+                pad_token_id=text_config.pad_token_id,
+                attention_mask=attention_mask,
+                encoder_hidden_states=image_embeds,
+                encoder_attention_mask=image_attention_mask,
+                **generate_kwargs
+            )
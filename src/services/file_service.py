@@ -1,21 +1,52 @@
+import hashlib
 import os
+import re
+import threading
 import uuid
-import aiofiles
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
 from fastapi import UploadFile
 from pathlib import Path
 from src.config import settings
+from src.services.object_storage import LocalStorageBackend
 
 class InvalidFileTypeError(Exception):
     """Raised when an invalid file type is uploaded."""
     pass
 
+_SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+def is_content_hash(value: str) -> bool:
+    """Whether a value is a lowercase hex SHA-256 digest."""
+    return bool(_SHA256_HEX.fullmatch(value))
+
+@dataclass
+class ImageUpload:
+    """An image received with a request: its encoded bytes and where it is stored."""
+    content: bytes
+    file_path: Optional[str] = None  # None when the image is not persisted
+    # Whether the request's pipeline writes the image to `file_path` before responding
+    pending_write: bool = False
+
 class FileService:
     """Service for handling file uploads and storage."""
     
-    def __init__(self, upload_dir: str = None):
-        """Initialize the file service with a upload directory."""
+    def __init__(self, upload_dir: str = None, max_hashes: int = None, backend=None):
+        """
+        Initialize the file service with a upload directory.
+        
+        Args:
+            upload_dir: Directory uploads are saved to
+            max_hashes: Number of content hashes remembered for `find_by_hash`
+            backend: Storage backend for uploads (default: `upload_dir` on local disk)
+        """
         self.upload_dir = upload_dir or settings.UPLOAD_DIR
-        os.makedirs(self.upload_dir, exist_ok=True)
+        self.max_hashes = max_hashes or settings.UPLOAD_HASH_INDEX_MAX_ENTRIES
+        self.backend = backend or LocalStorageBackend(self.upload_dir)
+        # SHA-256 of stored uploads -> path, most recently used last
+        self._hashes: OrderedDict[str, str] = OrderedDict()
+        self._hashes_lock = threading.Lock()
     
     def _get_file_extension(self, filename: str) -> str:
         """Extract and validate file extension."""
@@ -26,6 +57,19 @@ class FileService:
             )
         return extension
     
+    def upload_path(self, filename: str) -> str:
+        """
+        Unique location (a path, or a URI for remote storage) for a new upload.
+        
+        Args:
+            filename: Client-side name of the uploaded file
+            
+        Raises:
+            InvalidFileTypeError: If the file type is not allowed
+        """
+        extension = self._get_file_extension(filename)
+        return self.backend.location(f"{uuid.uuid4()}{extension}")
+    
     async def save_upload(self, upload_file: UploadFile) -> str:
         """
         Save an uploaded file with a unique filename.
@@ -39,15 +83,60 @@ class FileService:
         Raises:
             InvalidFileTypeError: If the file type is not allowed
         """
-        extension = self._get_file_extension(upload_file.filename)
+        file_path = self.upload_path(upload_file.filename)
+        content = await upload_file.read()
+        await self.write(file_path, content)
+        return file_path
+    
+    async def write(self, file_path: str, content: bytes) -> None:
+        """
+        Write an upload's content and make it findable by its content hash.
+        
+        Args:
+            file_path: Destination, as returned by `upload_path`
+            content: The encoded image
+        """
+        await self.backend.put(os.path.basename(file_path), content)
+        self._remember_hash(hashlib.sha256(content).hexdigest(), file_path)
+    
+    def _remember_hash(self, digest: str, file_path: str) -> None:
+        with self._hashes_lock:
+            self._hashes[digest] = file_path
+            self._hashes.move_to_end(digest)
+            while len(self._hashes) > self.max_hashes:
+                self._hashes.popitem(last=False)
+    
+    async def find_by_hash(self, digest: str) -> Optional[str]:
+        """
+        Find a stored upload by the SHA-256 of its content.
         
-        # Generate unique filename
-        filename = f"{uuid.uuid4()}{extension}"
-        file_path = os.path.join(self.upload_dir, filename)
+        A found local file's modification time is refreshed, so its retention
+        period restarts with the reuse.
         
-        # Save the file
-        content = await upload_file.read()
-        async with aiofiles.open(file_path, "wb") as buffer:
-            await buffer.write(content)
+        Args:
+            digest: Lowercase hex SHA-256 of the file content
+            
+        Returns:
+            Optional[str]: Location of the stored file, or None if it is unknown or gone
+        """
+        with self._hashes_lock:
+            file_path = self._hashes.get(digest)
+            if file_path is None:
+                return None
+            self._hashes.move_to_end(digest)
+        if not await self.backend.touch(os.path.basename(file_path)):
+            # Removed by storage cleanup since it was stored
+            with self._hashes_lock:
+                if self._hashes.get(digest) == file_path:
+                    del self._hashes[digest]
+            return None
+        return file_path
+    
+    async def read(self, file_path: str) -> bytes:
+        """
+        Read a stored upload.
         
-        return file_path 
\ No newline at end of file
+        Args:
+            file_path: Location returned by `upload_path` or `find_by_hash`
+        """
+        return await self.backend.get(os.path.basename(file_path))
@@ -0,0 +1,214 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Set bits per byte value, for vectorized popcount on NumPy < 2.0
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+# Hashes with fewer set (or unset) bits describe flat images or plain gradients, which
+# look alike whatever their colour; such images are only matched by exact digest
+MIN_HASH_BITS = 8
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash of an image.
+
+    The image is reduced to a 9x8 grayscale thumbnail and each bit records whether a
+    pixel is brighter than its right neighbour. Resizing, re-encoding and mild colour
+    changes flip few bits, so near-duplicates have a small Hamming distance.
+    """
+    thumbnail = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Hamming distance between every 64-bit hash in `hashes` and `value`."""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    return _POPCOUNT8[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def is_distinctive(phash: int) -> bool:
+    """Whether a hash has enough structure to identify near-duplicates by."""
+    return MIN_HASH_BITS <= bin(phash).count("1") <= 64 - MIN_HASH_BITS
+
+
+@dataclass(frozen=True)
+class ImageKey:
+    """Identity of an image: exact content digest plus perceptual hash."""
+    digest: str
+    phash: int
+
+
+class ImageIndex:
+    """
+    Caption cache with near-duplicate lookup.
+
+    Records (captions and optionally narratives) are found by exact SHA-256 digest
+    first, then by the closest perceptual hash within `threshold` bits, so resized
+    or re-encoded copies of a known photo reuse its results without running the
+    model. Flat and low-texture images (see `is_distinctive`) are never matched by
+    hash. Hashes live in a preallocated uint64 ring buffer searched with one
+    vectorized XOR/popcount; the oldest entries are overwritten once `max_entries`
+    is reached. The index is saved to `path` at most every `persist_interval`
+    seconds and on `save()`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: int = 5,
+        max_entries: int = 100_000,
+        persist_interval: float = 60.0
+    ):
+        """
+        Initialize the index, loading a previously saved one from `path`.
+
+        Args:
+            path: .npz file the index is persisted to (None keeps it in memory)
+            threshold: Maximum Hamming distance (of 64 bits) for a near-duplicate
+            max_entries: Maximum number of images remembered
+            persist_interval: Minimum seconds between automatic saves
+        """
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.persist_interval = persist_interval
+        self._hashes = np.zeros(min(max_entries, 1024), dtype=np.uint64)
+        self._digests: list[Optional[str]] = []
+        self._records: list[dict[str, Any]] = []
+        self._rows: dict[str, int] = {}
+        self._next = 0
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            try:
+                self._load(path)
+            except Exception as e:
+                logger.warning("Ignoring unreadable image index %s: %s", path, e)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @staticmethod
+    def key_for(image_bytes: bytes) -> ImageKey:
+        """Compute the key of encoded image bytes (decodes the image)."""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return ImageKey(digest, dhash(image))
+
+    @classmethod
+    def key_for_file(cls, path: str) -> ImageKey:
+        """Compute the key of an image file."""
+        with open(path, "rb") as f:
+            return cls.key_for(f.read())
+
+    def get(self, key: ImageKey) -> Optional[dict[str, Any]]:
+        """Return a copy of the record of the image or its closest near-duplicate."""
+        with self._lock:
+            row = self._rows.get(key.digest)
+            if row is not None:
+                self.hits += 1
+                return dict(self._records[row])
+            if self._records and is_distinctive(key.phash):
+                hashes = self._hashes[:len(self._records)]
+                distances = hamming_distances(hashes, key.phash)
+                set_bits = hamming_distances(hashes, 0)
+                # Stored flat images are not near-duplicates of anything either
+                distances[(set_bits < MIN_HASH_BITS) | (set_bits > 64 - MIN_HASH_BITS)] = 64 + 1
+                row = int(np.argmin(distances))
+                if distances[row] <= self.threshold:
+                    self.near_hits += 1
+                    return dict(self._records[row])
+            self.misses += 1
+            return None
+
+    def lookup(self, digest: str) -> Optional[dict[str, Any]]:
+        """Return a copy of the record of an exact content digest, without counting a hit."""
+        with self._lock:
+            row = self._rows.get(digest)
+            return dict(self._records[row]) if row is not None else None
+
+    def put(self, key: ImageKey, **fields: Any) -> None:
+        """Store fields (e.g. captions, narrative) for an image, merging with its record."""
+        with self._lock:
+            row = self._rows.get(key.digest)
+            if row is None:
+                row = self._allocate(key)
+            self._records[row].update(fields)
+            self._dirty = True
+        self._maybe_persist()
+
+    def _allocate(self, key: ImageKey) -> int:
+        if len(self._records) < self.max_entries:
+            row = len(self._records)
+            if row >= len(self._hashes):
+                grown = np.zeros(min(self.max_entries, len(self._hashes) * 2), dtype=np.uint64)
+                grown[:row] = self._hashes[:row]
+                self._hashes = grown
+            self._digests.append(None)
+            self._records.append({})
+        else:
+            # Full: overwrite the oldest entry
+            row = self._next
+            self._rows.pop(self._digests[row], None)
+            self._records[row] = {}
+        self._next = (row + 1) % self.max_entries
+        self._hashes[row] = np.uint64(key.phash)
+        self._digests[row] = key.digest
+        self._rows[key.digest] = row
+        return row
+
+    def _maybe_persist(self) -> None:
+        if self.path and self._dirty and time.monotonic() - self._saved_at >= self.persist_interval:
+            self.save()
+
+    def save(self) -> None:
+        """Write the index to its path atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            size = len(self._records)
+            hashes = self._hashes[:size].copy()
+            digests = np.array(self._digests, dtype="U64")
+            records = json.dumps(self._records)
+            next_row = self._next
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, hashes=hashes, digests=digests, records=np.array(records), next=np.array(next_row))
+        os.replace(tmp_path, self.path)
+
+    def _load(self, path: str) -> None:
+        with np.load(path, allow_pickle=False) as data:
+            hashes = data["hashes"][:self.max_entries]
+            digests = [str(digest) for digest in data["digests"][:self.max_entries]]
+            records = json.loads(str(data["records"]))[:self.max_entries]
+            next_row = int(data["next"])
+        self._hashes = np.zeros(max(len(self._hashes), len(hashes)), dtype=np.uint64)
+        self._hashes[:len(hashes)] = hashes
+        self._digests = digests
+        self._records = records
+        self._rows = {digest: row for row, digest in enumerate(digests)}
+        self._next = next_row % self.max_entries
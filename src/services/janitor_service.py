@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CleanupReport:
+    """Outcome of a cleanup sweep."""
+
+    files_removed: int = 0
+    bytes_reclaimed: int = 0
+
+    def add(self, other: "CleanupReport") -> None:
+        """Accumulate another report into this one."""
+        self.files_removed += other.files_removed
+        self.bytes_reclaimed += other.bytes_reclaimed
+
+
+@dataclass
+class _TrackedFile:
+    expires_at: float
+    size: int
+
+
+class StorageJanitor:
+    """
+    Background cleanup of the upload and audio directories.
+
+    Files are kept in an in-memory expiry index: a min-heap ordered by expiry time
+    plus a dict of the current record per path. The directories are scanned once at
+    startup; after that new files are registered with `track`, so a sweep only looks
+    at the files that are actually due instead of globbing and stat-ing everything.
+    Until that scan has run (e.g. with JANITOR_ENABLED off) `track` does nothing.
+    Expired files are removed in small batches, and when the directories together
+    exceed the disk budget the files closest to expiry are evicted first.
+    """
+
+    def __init__(
+        self,
+        max_ages: Optional[dict[str, float]] = None,
+        disk_budget_bytes: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        interval: Optional[float] = None
+    ):
+        """
+        Initialize the janitor.
+
+        Args:
+            max_ages: Maximum file age in seconds per directory. Defaults to
+                UPLOAD_CLEANUP_AGE and TTS_CLEANUP_AGE (hours) from settings
+            disk_budget_bytes: Total size allowed across all directories (0 disables)
+            batch_size: Maximum number of files removed per batch
+            interval: Seconds between background sweeps
+        """
+        if max_ages is None:
+            max_ages = {
+                settings.UPLOAD_DIR: settings.UPLOAD_CLEANUP_AGE * 3600,
+                settings.AUDIO_DIR: settings.TTS_CLEANUP_AGE * 3600
+            }
+        self.max_ages = {os.path.abspath(directory): age for directory, age in max_ages.items()}
+        if disk_budget_bytes is None:
+            disk_budget_bytes = settings.STORAGE_DISK_BUDGET_MB * 1024 * 1024
+        self.disk_budget_bytes = disk_budget_bytes
+        self.batch_size = batch_size or settings.JANITOR_BATCH_SIZE
+        self.interval = interval or settings.JANITOR_INTERVAL
+
+        self._heap: list[tuple[float, str]] = []
+        self._files: dict[str, _TrackedFile] = {}
+        self._total_bytes = 0
+        self._scanned = False
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.totals = CleanupReport()
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes currently tracked across all directories."""
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def _max_age_for(self, path: str) -> Optional[float]:
+        """Find the retention period of the managed directory containing a path."""
+        directory = os.path.dirname(path)
+        while True:
+            if directory in self.max_ages:
+                return self.max_ages[directory]
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+
+    def _add(self, path: str, stat_result: os.stat_result, max_age: float) -> None:
+        """Insert or refresh the index record for a file. Caller holds the lock."""
+        previous = self._files.get(path)
+        if previous is not None:
+            self._total_bytes -= previous.size
+        record = _TrackedFile(stat_result.st_mtime + max_age, stat_result.st_size)
+        self._files[path] = record
+        self._total_bytes += record.size
+        if previous is not None and previous.expires_at == record.expires_at:
+            return  # Its heap entry is still current
+        # Superseded heap entries are skipped when popped (lazy deletion); files
+        # re-tracked often leave many, so rebuild the heap once they dominate it
+        heapq.heappush(self._heap, (record.expires_at, path))
+        if len(self._heap) > 2 * len(self._files) + 1024:
+            self._heap = [(record.expires_at, path) for path, record in self._files.items()]
+            heapq.heapify(self._heap)
+
+    def track(self, path: str) -> None:
+        """
+        Register a newly written file with the expiry index. Does nothing before
+        `scan`, as no sweep would ever remove it.
+
+        Args:
+            path: Path of the file inside one of the managed directories
+        """
+        if not self._scanned:
+            return
+        path = os.path.abspath(path)
+        max_age = self._max_age_for(path)
+        if max_age is None:
+            return
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._add(path, stat_result, max_age)
+
+    def scan(self) -> int:
+        """
+        Seed the index from the managed directories. Run once at startup.
+
+        Returns:
+            int: Number of files indexed
+        """
+        indexed = 0
+        self._scanned = True
+        for directory, max_age in self.max_ages.items():
+            pending = [directory]
+            while pending:
+                try:
+                    entries = list(os.scandir(pending.pop()))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat_result = entry.stat(follow_symlinks=False)
+                        with self._lock:
+                            self._add(entry.path, stat_result, max_age)
+                        indexed += 1
+        return indexed
+
+    def _next_batch(self, now: float) -> list[tuple[str, int]]:
+        """Pop the next files due for removal, expired or over budget."""
+        batch = []
+        with self._lock:
+            while self._heap and len(batch) < self.batch_size:
+                expires_at, path = self._heap[0]
+                record = self._files.get(path)
+                if record is None or record.expires_at != expires_at:
+                    heapq.heappop(self._heap)
+                    continue
+                over_budget = 0 < self.disk_budget_bytes < self._total_bytes
+                if expires_at > now and not over_budget:
+                    break
+                heapq.heappop(self._heap)
+                del self._files[path]
+                self._total_bytes -= record.size
+                batch.append((path, record.size))
+        return batch
+
+    def _remove(self, batch: list[tuple[str, int]]) -> CleanupReport:
+        """Delete a batch of files from disk."""
+        report = CleanupReport()
+        for path, size in batch:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning("Failed to remove %s: %s", path, e)
+                continue
+            report.files_removed += 1
+            report.bytes_reclaimed += size
+        return report
+
+    def sweep_batch(self, now: Optional[float] = None) -> Optional[CleanupReport]:
+        """
+        Remove one batch of due files.
+
+        Returns:
+            CleanupReport: What was removed, or None if nothing was due
+        """
+        batch = self._next_batch(time.time() if now is None else now)
+        if not batch:
+            return None
+        report = self._remove(batch)
+        with self._lock:
+            self.totals.add(report)
+        return report
+
+    def sweep(self, now: Optional[float] = None) -> CleanupReport:
+        """Remove every file that is currently due, batch by batch."""
+        report = CleanupReport()
+        while (batch_report := self.sweep_batch(now)) is not None:
+            report.add(batch_report)
+        return report
+
+    async def run(self) -> None:
+        """Sweep periodically, yielding to the event loop between batches."""
+        while True:
+            report = CleanupReport()
+            try:
+                while (batch_report := await asyncio.to_thread(self.sweep_batch)) is not None:
+                    report.add(batch_report)
+                    await asyncio.sleep(0)
+            except Exception as e:
+                # Cleanup failures shouldn't break the service
+                logger.warning("Storage cleanup failed: %s", e)
+            if report.files_removed:
+                logger.info(
+                    "Storage janitor removed %d files, reclaimed %d bytes (%d bytes tracked)",
+                    report.files_removed, report.bytes_reclaimed, self.total_bytes
+                )
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        """Index existing files and start the background sweep task."""
+        if self._task is not None:
+            return
+        indexed = await asyncio.to_thread(self.scan)
+        logger.info("Storage janitor indexed %d files (%d bytes)", indexed, self.total_bytes)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the background sweep task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
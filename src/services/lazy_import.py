@@ -0,0 +1,73 @@
+import importlib
+import threading
+from typing import Any, Optional
+
+
+class LazyImport:
+    """
+    Placeholder for a module or module attribute that is imported on first use.
+
+    The heavy ML and HTTP client libraries (torch, transformers, openai, gtts) take
+    seconds to import. Binding them through a LazyImport keeps `src.api.main` cheap to
+    import so endpoints that never touch a model (health checks, audio, static files)
+    are served as soon as the worker boots.
+    """
+
+    def __init__(self, module_name: str, attribute: Optional[str] = None):
+        """
+        Initialize the placeholder.
+
+        Args:
+            module_name: Fully qualified name of the module to import
+            attribute: Optional attribute of the module to resolve instead of the module
+        """
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target: Any = None
+        self._lock = threading.Lock()
+
+    # The proxy's own API is underscore-prefixed so it cannot shadow attributes of
+    # the target (e.g. torch.load)
+    @property
+    def _is_loaded(self) -> bool:
+        """Whether the underlying import has already happened."""
+        return self._target is not None
+
+    def _load(self) -> Any:
+        """Import the target if needed and return it."""
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    module = importlib.import_module(self._module_name)
+                    self._target = (
+                        getattr(module, self._attribute) if self._attribute else module
+                    )
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name in ("_module_name", "_attribute", "_target", "_lock"):
+            # Keep copy/pickle protocol probes from importing (or recursing)
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        target = f"{self._module_name}.{self._attribute}" if self._attribute else self._module_name
+        state = "loaded" if self._is_loaded else "deferred"
+        return f"<LazyImport {target} ({state})>"
+
+
+def lazy_import(module_name: str, attribute: Optional[str] = None) -> Any:
+    """
+    Defer importing a module, or one of its attributes, until it is first used.
+
+    Args:
+        module_name: Fully qualified name of the module to import
+        attribute: Optional attribute of the module to resolve (e.g. a class)
+
+    Returns:
+        LazyImport: A proxy forwarding attribute access and calls to the real object
+    """
+    return LazyImport(module_name, attribute)
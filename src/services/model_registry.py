@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Optional
+from src.services.lazy_import import lazy_import
+
+BlipProcessor = lazy_import("transformers", "BlipProcessor")
+BlipForConditionalGeneration = lazy_import("transformers", "BlipForConditionalGeneration")
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# Records the file stats at the last full checksum pass, so unchanged files are
+# not re-hashed on every start
+VERIFIED_STAMP_NAME = ".verified"
+
+
+class ModelNotFoundError(Exception):
+    """Raised when a model variant is not registered."""
+    pass
+
+
+class ModelChecksumError(Exception):
+    """Raised when a registered model's files do not match their recorded checksums."""
+    pass
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, streamed in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Local store of captioning model variants in safetensors format.
+
+    Each variant lives in `<root>/<name>/` with its weights as `model.safetensors`,
+    its config and processor files, and a manifest of SHA-256 checksums. safetensors
+    files are memory-mapped on load instead of unpickled into freshly allocated
+    memory, so loading is close to instant and worker processes share the weights
+    through the page cache.
+    """
+
+    def __init__(self, root: str):
+        """
+        Initialize the registry.
+
+        Args:
+            root: Directory holding one subdirectory per registered variant
+        """
+        self.root = root
+
+    def path(self, name: str) -> str:
+        """Directory of a variant."""
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Invalid model name: {name!r}")
+        return os.path.join(self.root, name)
+
+    def names(self) -> list[str]:
+        """Names of all registered variants."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            entry.name for entry in os.scandir(self.root)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, MANIFEST_NAME))
+        )
+
+    def manifest(self, name: str) -> dict[str, Any]:
+        """Manifest of a variant: source, creation time and file checksums."""
+        manifest_path = os.path.join(self.path(name), MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise ModelNotFoundError(f"Model variant not registered: {name}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def register(
+        self,
+        name: str,
+        source: Optional[str] = None,
+        model: Any = None,
+        processor: Any = None,
+        cache_dir: Optional[str] = None
+    ) -> dict[str, Any]:
+        """
+        Convert a model to safetensors and add it to the registry.
+
+        Args:
+            name: Variant name, e.g. "blip-base"
+            source: Hugging Face model id or local directory to load from
+            model: Already loaded model (instead of `source`)
+            processor: Already loaded processor (instead of `source`)
+            cache_dir: Hugging Face cache to load `source` from
+
+        Returns:
+            dict: The variant's manifest
+        """
+        target = self.path(name)
+        if model is None:
+            model = BlipForConditionalGeneration.from_pretrained(source, cache_dir=cache_dir)
+        if processor is None:
+            processor = BlipProcessor.from_pretrained(source, cache_dir=cache_dir)
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{name}-", dir=self.root)
+        try:
+            model.save_pretrained(staging, safe_serialization=True)
+            processor.save_pretrained(staging)
+            files = {
+                filename: file_sha256(os.path.join(staging, filename))
+                for filename in sorted(os.listdir(staging))
+            }
+            manifest = {
+                "name": name,
+                "source": source or type(model).__name__,
+                "created": time.time(),
+                "files": files
+            }
+            with open(os.path.join(staging, MANIFEST_NAME), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            self._write_stamp(staging, files)
+            # Swap the finished directory in, so readers never see a partial variant
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.replace(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        logger.info("Registered model variant %s from %s", name, manifest["source"])
+        return manifest
+
+    @staticmethod
+    def _stats(directory: str, files: dict[str, str]) -> dict[str, list[int]]:
+        stats = {}
+        for filename in files:
+            st = os.stat(os.path.join(directory, filename))
+            stats[filename] = [st.st_size, st.st_mtime_ns]
+        return stats
+
+    def _write_stamp(self, directory: str, files: dict[str, str]) -> None:
+        with open(os.path.join(directory, VERIFIED_STAMP_NAME), "w", encoding="utf-8") as f:
+            json.dump(self._stats(directory, files), f)
+
+    def verify(self, name: str, full: bool = False) -> None:
+        """
+        Check a variant's files against the checksums in its manifest.
+
+        Files whose size and modification time are unchanged since the last full
+        check are trusted; pass `full=True` to re-hash everything.
+
+        Raises:
+            ModelNotFoundError: If the variant is not registered
+            ModelChecksumError: If a file is missing or its checksum differs
+        """
+        directory = self.path(name)
+        files = self.manifest(name)["files"]
+        stamp_path = os.path.join(directory, VERIFIED_STAMP_NAME)
+        try:
+            stats = self._stats(directory, files)
+        except FileNotFoundError as e:
+            raise ModelChecksumError(f"Model variant {name} is missing {os.path.basename(e.filename)}")
+
+        if not full and os.path.exists(stamp_path):
+            with open(stamp_path, "r", encoding="utf-8") as f:
+                if json.load(f) == stats:
+                    return
+
+        for filename, expected in files.items():
+            if file_sha256(os.path.join(directory, filename)) != expected:
+                raise ModelChecksumError(f"Checksum mismatch for {filename} of model variant {name}")
+        self._write_stamp(directory, files)
+
+    def load(self, name: str, device: str = "cpu", verify: bool = True) -> tuple[Any, Any]:
+        """
+        Load a variant's processor and model.
+
+        Weights are read from safetensors only, memory-mapped rather than unpickled.
+
+        Returns:
+            tuple: (processor, model), the model moved to `device` in eval mode
+        """
+        if verify:
+            self.verify(name)
+        directory = self.path(name)
+        processor = BlipProcessor.from_pretrained(directory, local_files_only=True)
+        model = BlipForConditionalGeneration.from_pretrained(
+            directory, local_files_only=True, use_safetensors=True
+        )
+        model.to(device)
+        model.eval()
+        return processor, model
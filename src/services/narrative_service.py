@@ -1,15 +1,81 @@
+import asyncio
+import hashlib
+import logging
 import os
+from dataclasses import dataclass
 from typing import Optional
-from openai import AsyncOpenAI
 from src.config import settings
+from src.services.lazy_import import lazy_import
+from src.services.metrics import metrics
+from src.services.single_flight import SingleFlight, content_key
+from src.services.token_budget import TokenCounter, max_tokens_for, words_for_duration
+from src.services.upstream_client import UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+# The OpenAI SDK (and httpx/pydantic models behind it) is imported on first request
+AsyncOpenAI = lazy_import("openai", "AsyncOpenAI")
+
+tokens_total = metrics.counter(
+    "narrative_tokens_total", "Tokens consumed by narrative requests", ["kind"]
+)
+truncated_total = metrics.counter(
+    "narrative_truncated_total", "Narratives cut off by their max_tokens budget"
+)
+narrative_source_total = metrics.counter(
+    "narrative_source_total", "Narratives served, by source (upstream, cache or local)", ["source"]
+)
+deadline_exceeded_total = metrics.counter(
+    "narrative_deadline_exceeded_total", "Narrative requests that missed their deadline"
+)
+
+# Stories of the local fallback generator, in the upstream's mysterious register
+LOCAL_NARRATIVE_TEMPLATES = (
+    "At first glance it is only {caption}. Look a little longer, though, and something "
+    "strange begins to stir beneath the surface, as if the scene is holding its breath, "
+    "waiting for someone curious enough to ask what really happened here.",
+    "No one remembers exactly when it appeared: {caption}. Those who pass by feel a "
+    "curious pull, a quiet sense of wonder, and the unsettling certainty that the scene "
+    "is keeping a secret it has no intention of sharing.",
+    "The story begins with {caption}, ordinary enough to be overlooked. Yet in the "
+    "details lies a mystery - a shadow slightly out of place, a silence that lingers too "
+    "long - inviting the unknown to step a little closer.",
+)
 
 class NarrativeGenerationError(Exception):
     """Raised when narrative generation fails."""
     pass
 
+class NarrativeTimeoutError(NarrativeGenerationError):
+    """Raised when a narrative misses its deadline and no fallback is available."""
+    pass
+
+@dataclass
+class NarrativeCompletion:
+    """Narratives returned by one upstream call, with the tokens it consumed."""
+    narratives: list[str]
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Where the narratives came from: "upstream", "cache" or "local" (fallback generator)
+    source: str = "upstream"
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+def _token_count(usage, field: str) -> Optional[int]:
+    value = getattr(usage, field, None)
+    return value if isinstance(value, int) else None
+
 class NarrativeService:
     """Service for generating creative narratives from image captions using OpenAI's GPT models."""
     
+    SYSTEM_PROMPT = """You are a creative writer who excels at crafting mysterious and intriguing narratives. Your stories should:
+1. Evoke a sense of wonder, curiosity, and the unknown
+2. Use words like 'mysterious', 'strange', 'unknown', 'curious', 'wonder' frequently
+3. Create an atmosphere of intrigue and mystery
+4. Transform even ordinary scenes into something enigmatic
+5. Make the reader question what lies beneath the surface"""
     DEFAULT_PROMPT_TEMPLATE = """Create an engaging narrative based on this scene: {caption}"""
     MAX_PROMPT_LENGTH = 2000
     
@@ -19,7 +85,8 @@ class NarrativeService:
         model: Optional[str] = None,
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
-        prompt_template: Optional[str] = None
+        prompt_template: Optional[str] = None,
+        upstream: Optional[UpstreamClient] = None
     ):
         """
         Initialize the narrative service.
@@ -30,29 +97,86 @@ class NarrativeService:
             max_tokens: Maximum tokens in the generated narrative
             temperature: Creativity level (0.0 to 1.0)
             prompt_template: Custom prompt template with {caption} placeholder
+            upstream: Managed upstream client (connection pool, rate limits, retries)
         """
-        self.client = AsyncOpenAI(api_key=api_key or settings.OPENAI_API_KEY)
+        self._api_key = api_key or settings.OPENAI_API_KEY
+        # Resolve the client class now (so patched classes are honoured) but only
+        # construct it, and import the SDK, when the first request needs it
+        self._client_factory = AsyncOpenAI
+        self._client = None
         self.model = model or settings.OPENAI_MODEL
         self.max_tokens = max_tokens or settings.OPENAI_MAX_TOKENS
         self.temperature = temperature or settings.OPENAI_TEMPERATURE
         self.prompt_template = prompt_template or self.DEFAULT_PROMPT_TEMPLATE
+        self.upstream = upstream or UpstreamClient(model=self.model)
+        self.tokens = TokenCounter(self.model)
+        self._in_flight = SingleFlight()
     
-    def _format_prompt(self, caption: str, template: Optional[str] = None) -> str:
-        """Format the prompt, ensuring it doesn't exceed the maximum length."""
-        prompt = (template or self.prompt_template).format(caption=caption)
+    @property
+    def client(self):
+        """Lazy initialization of the OpenAI client."""
+        if self._client is None:
+            # Retries, timeouts and pooling are handled by the upstream client
+            self._client = self._client_factory(
+                api_key=self._api_key,
+                base_url=self.upstream.base_url,
+                http_client=self.upstream.http_client,
+                max_retries=0
+            )
+        return self._client
+    
+    def _format_prompt(
+        self,
+        caption: str,
+        template: Optional[str] = None,
+        target_words: Optional[int] = None
+    ) -> str:
+        """
+        Format the prompt, trimming the caption so the prompt fits the token budget
+        (NARRATIVE_PROMPT_MAX_TOKENS) and doesn't exceed the maximum length.
+        """
+        template = template or self.prompt_template
+        if target_words:
+            template += f" Keep it to about {target_words} words."
+        budget = settings.NARRATIVE_PROMPT_MAX_TOKENS
+        prompt = template.format(caption=caption)
+        excess = self.tokens.count(prompt) - budget
+        if excess > 0:
+            caption_budget = budget - self.tokens.count(template.format(caption=""))
+            if caption_budget <= 0:
+                # The template alone is over budget: cut the whole prompt
+                return self.tokens.truncate(prompt, budget)[:self.MAX_PROMPT_LENGTH]
+            # Tokens can merge across the caption boundary, so re-check the result
+            full_caption = caption
+            while excess > 0 and caption_budget > 0:
+                caption = self.tokens.truncate(full_caption, caption_budget)
+                prompt = template.format(caption=caption)
+                excess = self.tokens.count(prompt) - budget
+                caption_budget -= max(excess, 0)
         if len(prompt) > self.MAX_PROMPT_LENGTH:
             # Calculate how much we need to truncate the caption
             excess = len(prompt) - self.MAX_PROMPT_LENGTH
             truncated_caption = caption[:-excess-3] + "..."  # Add ellipsis
-            prompt = (template or self.prompt_template).format(caption=truncated_caption)
+            prompt = template.format(caption=truncated_caption)
         return prompt
     
+    def _usage(self, response, prompt_tokens: int) -> tuple[int, int]:
+        """Prompt and completion tokens of a response, counted locally where it reports none."""
+        usage = getattr(response, "usage", None)
+        used_prompt = _token_count(usage, "prompt_tokens")
+        used_completion = _token_count(usage, "completion_tokens")
+        if used_completion is None:
+            used_completion = sum(self.tokens.count(choice.message.content or "") for choice in response.choices)
+        return prompt_tokens if used_prompt is None else used_prompt, used_completion
+    
     async def generate_narrative(
         self, 
         caption: str,
         prompt_template: Optional[str] = None,
         max_tokens: Optional[int] = None,
-        temperature: Optional[float] = None
+        temperature: Optional[float] = None,
+        target_words: Optional[int] = None,
+        target_seconds: Optional[float] = None
     ) -> str:
         """
         Generate a creative narrative from an image caption.
@@ -62,6 +186,8 @@ class NarrativeService:
             prompt_template: Optional custom prompt template
             max_tokens: Optional maximum tokens for generation
             temperature: Optional temperature for controlling creativity
+            target_words: Optional narrative length in words; sets max_tokens unless given
+            target_seconds: Optional narration time in seconds, used without target_words
             
         Returns:
             str: The generated narrative
@@ -70,38 +196,185 @@ class NarrativeService:
             ValueError: If caption is empty
             NarrativeGenerationError: If generation fails
         """
+        narratives = await self.generate_narratives(
+            caption,
+            prompt_template=prompt_template,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            target_words=target_words,
+            target_seconds=target_seconds
+        )
+        return narratives[0]
+    
+    async def generate_narratives(
+        self,
+        caption: str,
+        num_narratives: int = 1,
+        prompt_template: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        target_words: Optional[int] = None,
+        target_seconds: Optional[float] = None
+    ) -> list[str]:
+        """
+        Generate alternative narratives from an image caption in one upstream call.
+        
+        Args:
+            caption: The image caption to base the narratives on
+            num_narratives: Number of alternatives to request (the `n` choices)
+            prompt_template: Optional custom prompt template
+            max_tokens: Optional maximum tokens per narrative
+            temperature: Optional temperature for controlling creativity
+            target_words: Optional narrative length in words; sets max_tokens unless given
+            target_seconds: Optional narration time in seconds, used without target_words
+            
+        Returns:
+            list[str]: The narratives, complete ones ranked before truncated ones
+            
+        Raises:
+            ValueError: If caption is empty
+            NarrativeGenerationError: If generation fails
+        """
+        completion = await self.complete(
+            caption,
+            num_narratives=num_narratives,
+            prompt_template=prompt_template,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            target_words=target_words,
+            target_seconds=target_seconds
+        )
+        return completion.narratives
+    
+    async def complete(
+        self,
+        caption: str,
+        num_narratives: int = 1,
+        prompt_template: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        target_words: Optional[int] = None,
+        target_seconds: Optional[float] = None,
+        deadline: Optional[float] = None,
+        cached_narrative: Optional[str] = None
+    ) -> NarrativeCompletion:
+        """
+        Generate narratives like `generate_narratives`, also reporting token usage.
+        
+        Usage comes from the upstream's response, or is counted locally when the
+        upstream does not report it. Slow upstream requests are hedged (see
+        `UpstreamClient.hedged_call`). If no answer arrives within `deadline` seconds,
+        `cached_narrative` is returned, or else a locally generated story when
+        NARRATIVE_FALLBACK is "local"; the request keeps running for callers sharing it.
+        
+        Args:
+            deadline: Seconds to wait for the upstream (None waits indefinitely)
+            cached_narrative: Earlier narrative of the same image to fall back to
+        
+        Returns:
+            NarrativeCompletion: Ranked narratives, their token counts and source
+            
+        Raises:
+            ValueError: If caption is empty
+            NarrativeTimeoutError: If the deadline passes and there is no fallback
+            NarrativeGenerationError: If generation fails
+        """
         if not caption:
             raise ValueError("Caption cannot be empty")
         
         try:
-            # Use provided parameters or defaults
+            # Use provided parameters or defaults; a length target sizes the completion budget
+            if target_words is None and target_seconds is not None:
+                target_words = words_for_duration(target_seconds)
             current_prompt_template = prompt_template or self.prompt_template
-            current_max_tokens = max_tokens or self.max_tokens
+            current_max_tokens = max_tokens or max_tokens_for(target_words) or self.max_tokens
             current_temperature = temperature or self.temperature
             
             # Format the prompt with the caption
-            prompt = self._format_prompt(caption, template=current_prompt_template)
+            prompt = self._format_prompt(
+                caption, template=current_prompt_template, target_words=target_words
+            )
             
-            # Create chat completion request
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": """You are a creative writer who excels at crafting mysterious and intriguing narratives. Your stories should:
-1. Evoke a sense of wonder, curiosity, and the unknown
-2. Use words like 'mysterious', 'strange', 'unknown', 'curious', 'wonder' frequently
-3. Create an atmosphere of intrigue and mystery
-4. Transform even ordinary scenes into something enigmatic
-5. Make the reader question what lies beneath the surface"""},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=current_max_tokens,
-                temperature=current_temperature,
-                n=1
+            # Create chat completion request under the upstream rate limits and retry policy
+            messages = [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+            prompt_tokens = self.tokens.count_messages(messages)
+            
+            async def request():
+                response = await self.upstream.hedged_call(
+                    lambda: self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=current_max_tokens,
+                        temperature=current_temperature,
+                        n=num_narratives
+                    ),
+                    tokens=prompt_tokens + current_max_tokens * num_narratives
+                )
+                # Recorded once per upstream call, not per coalesced caller
+                used_prompt, used_completion = self._usage(response, prompt_tokens)
+                tokens_total.inc(used_prompt, kind="prompt")
+                tokens_total.inc(used_completion, kind="completion")
+                truncated_total.inc(sum(choice.finish_reason == "length" for choice in response.choices))
+                return response
+            
+            # Identical concurrent requests (retries, double submits) share one upstream call
+            key = content_key(
+                self.model, messages, current_max_tokens, current_temperature, num_narratives
             )
+            flight = asyncio.ensure_future(self._in_flight.do(key, request))
+            done, _ = await asyncio.wait({flight}, timeout=deadline)
+            if not done:
+                flight.cancel()
+                deadline_exceeded_total.inc()
+                return self._fallback(caption, num_narratives, deadline, cached_narrative)
+            response = flight.result()
             
-            # Extract and return the narrative
-            narrative = response.choices[0].message.content.strip()
-            return narrative
+            # Choices that stopped naturally rank ahead of ones cut off by max_tokens
+            choices = sorted(response.choices, key=lambda choice: choice.finish_reason == "length")
+            used_prompt, used_completion = self._usage(response, prompt_tokens)
+            narrative_source_total.inc(source="upstream")
+            return NarrativeCompletion(
+                narratives=[choice.message.content.strip() for choice in choices],
+                prompt_tokens=used_prompt,
+                completion_tokens=used_completion
+            )
             
+        except NarrativeTimeoutError:
+            raise
         except Exception as e:
-            raise NarrativeGenerationError(f"Failed to generate narrative: {str(e)}") 
\ No newline at end of file
+            raise NarrativeGenerationError(f"Failed to generate narrative: {str(e)}")
+    
+    def _fallback(
+        self,
+        caption: str,
+        num_narratives: int,
+        deadline: float,
+        cached_narrative: Optional[str]
+    ) -> NarrativeCompletion:
+        """Narratives to serve after a missed deadline."""
+        if cached_narrative:
+            source, narratives = "cache", [cached_narrative]
+        elif settings.NARRATIVE_FALLBACK == "local":
+            source, narratives = "local", self.local_narratives(caption, num_narratives)
+        else:
+            raise NarrativeTimeoutError(f"No narrative within the {deadline:.1f}s deadline")
+        logger.warning("Narrative missed its %.1fs deadline; serving a %s narrative", deadline, source)
+        narrative_source_total.inc(source=source)
+        return NarrativeCompletion(narratives, source=source)
+    
+    @staticmethod
+    def local_narratives(caption: str, num_narratives: int = 1) -> list[str]:
+        """
+        Template stories about a caption, generated without the upstream.
+        
+        The same caption always gets the same stories, distinct ones for alternatives.
+        """
+        caption = caption.strip().rstrip(".")
+        first = int(hashlib.sha256(caption.encode("utf-8")).hexdigest(), 16)
+        return [
+            LOCAL_NARRATIVE_TEMPLATES[(first + i) % len(LOCAL_NARRATIVE_TEMPLATES)].format(caption=caption)
+            for i in range(num_narratives)
+        ]
@@ -0,0 +1,365 @@
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+from typing import Awaitable, Callable, Optional
+import aiofiles
+import aiofiles.os
+from src.config import settings
+from src.services.sharded_storage import ShardedDirectory, shard_key
+
+logger = logging.getLogger(__name__)
+
+# S3 rejects multipart parts below 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class LocalStorageBackend:
+    """
+    Objects stored as files in a sharded local directory.
+
+    Backends share one interface, used by FileService and TTSService: objects are
+    addressed by name (e.g. "audio_<digest>.mp3") and `location` gives the path or
+    URI to report to clients.
+    """
+
+    def __init__(self, root: str, levels: Optional[int] = None):
+        """
+        Initialize the backend.
+
+        Args:
+            root: Directory holding the objects
+            levels: Shard directory levels (default: STORAGE_SHARD_LEVELS)
+        """
+        self.directory = ShardedDirectory(
+            root, levels=settings.STORAGE_SHARD_LEVELS if levels is None else levels
+        )
+
+    def location(self, name: str) -> str:
+        """Path an object is stored at."""
+        return self.directory.path_for(name)
+
+    async def put(self, name: str, data: bytes, content_type: Optional[str] = None) -> str:
+        """Store an object, returning its location."""
+        file_path = await self.directory.prepare(name)
+
+        async def write(part_path: str) -> None:
+            async with aiofiles.open(part_path, "wb") as f:
+                await f.write(data)
+
+        await self._write_atomically(file_path, write)
+        return file_path
+
+    async def put_file(self, name: str, source: str, content_type: Optional[str] = None) -> str:
+        """Store the content of a local file as an object, returning its location."""
+        file_path = await self.directory.prepare(name)
+        if os.path.abspath(source) != os.path.abspath(file_path):
+            await self._write_atomically(
+                file_path, lambda part_path: asyncio.to_thread(shutil.copyfile, source, part_path)
+            )
+        return file_path
+
+    @staticmethod
+    async def _write_atomically(file_path: str, write: Callable[[str], Awaitable[None]]) -> None:
+        """
+        Write through a temporary file renamed into place, so readers never see a
+        partial object; the temporary file is removed if the write fails or is cancelled.
+        """
+        part_path = file_path + ".part"
+        try:
+            await write(part_path)
+            await aiofiles.os.replace(part_path, file_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part_path)
+            raise
+
+    async def get(self, name: str) -> bytes:
+        """
+        Read an object.
+
+        Raises:
+            FileNotFoundError: If there is no such object
+        """
+        located = await self.directory.locate(name)
+        if located is None:
+            raise FileNotFoundError(name)
+        async with aiofiles.open(located[0], "rb") as f:
+            return await f.read()
+
+    async def exists(self, name: str) -> bool:
+        """Whether an object exists."""
+        return await self.directory.locate(name) is not None
+
+    async def touch(self, name: str) -> bool:
+        """Mark an object as recently used, restarting its retention. False if it is gone."""
+        located = await self.directory.locate(name)
+        if located is None:
+            return False
+        try:
+            await asyncio.to_thread(os.utime, located[0])
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def delete(self, name: str) -> None:
+        """Remove an object if it exists."""
+        located = await self.directory.locate(name)
+        if located is not None:
+            with contextlib.suppress(FileNotFoundError):
+                await aiofiles.os.remove(located[0])
+
+    async def presigned_url(self, name: str) -> Optional[str]:
+        """Direct download URL of an object; local objects are served by the app (None)."""
+        return None
+
+    async def close(self) -> None:
+        """Release resources (nothing to do for local files)."""
+        pass
+
+
+class S3StorageBackend:
+    """
+    Objects stored in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    One client, with a pooled HTTP connection per concurrent request, is shared by
+    all calls. Objects above `multipart_threshold` are uploaded as parts in
+    parallel. Downloads can bypass the app server through presigned URLs. Keys use
+    the same hashed shard prefixes as local directories, which also spreads load
+    over S3's per-prefix request limits. Requires aiobotocore.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        part_size: int = 8 * 1024 * 1024,
+        part_concurrency: int = 4,
+        max_pool_connections: int = 32,
+        presign_expires: int = 3600,
+        levels: Optional[int] = None
+    ):
+        """
+        Initialize the backend. The client is created on first use.
+
+        Args:
+            bucket: Bucket name
+            prefix: Key prefix, e.g. "audio/"
+            endpoint_url: Endpoint of an S3-compatible server (default: AWS)
+            region: Bucket region
+            access_key_id, secret_access_key: Credentials (default: the AWS chain)
+            multipart_threshold: Objects from this size on are uploaded in parts
+            part_size: Bytes per part (at least 5 MiB)
+            part_concurrency: Parts uploaded at the same time per object
+            max_pool_connections: HTTP connections kept open to the server
+            presign_expires: Lifetime of presigned download URLs in seconds
+            levels: Shard prefix levels in keys (default: STORAGE_SHARD_LEVELS)
+        """
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.multipart_threshold = multipart_threshold
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.part_concurrency = part_concurrency
+        self.max_pool_connections = max_pool_connections
+        self.presign_expires = presign_expires
+        self.levels = settings.STORAGE_SHARD_LEVELS if levels is None else levels
+        self._client = None
+        self._exit_stack: Optional[contextlib.AsyncExitStack] = None
+        self._client_lock = asyncio.Lock()
+
+    def key(self, name: str) -> str:
+        """Object key of a name."""
+        return self.prefix + shard_key(name, self.levels)
+
+    def location(self, name: str) -> str:
+        """URI of an object."""
+        return f"s3://{self.bucket}/{self.key(name)}"
+
+    async def _get_client(self):
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    try:
+                        from aiobotocore.session import get_session
+                        from botocore.config import Config
+                    except ImportError:
+                        raise RuntimeError("S3 storage requires aiobotocore: pip install aiobotocore")
+                    config = Config(
+                        max_pool_connections=self.max_pool_connections,
+                        signature_version="s3v4",
+                        # Custom endpoints (MinIO, moto) usually lack virtual-host DNS
+                        s3={"addressing_style": "path"} if self.endpoint_url else None
+                    )
+                    exit_stack = contextlib.AsyncExitStack()
+                    self._client = await exit_stack.enter_async_context(get_session().create_client(
+                        "s3",
+                        endpoint_url=self.endpoint_url,
+                        region_name=self.region,
+                        aws_access_key_id=self.access_key_id,
+                        aws_secret_access_key=self.secret_access_key,
+                        config=config
+                    ))
+                    self._exit_stack = exit_stack
+        return self._client
+
+    @staticmethod
+    def _is_missing(error: Exception) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    async def put(self, name: str, data: bytes, content_type: Optional[str] = None) -> str:
+        """Store an object, returning its location."""
+        client = await self._get_client()
+        extra = {"ContentType": content_type} if content_type else {}
+        if len(data) < self.multipart_threshold:
+            await client.put_object(Bucket=self.bucket, Key=self.key(name), Body=data, **extra)
+        else:
+            view = memoryview(data)
+
+            async def read_part(offset: int, size: int) -> bytes:
+                return bytes(view[offset:offset + size])
+
+            await self._put_multipart(name, len(data), read_part, extra)
+        return self.location(name)
+
+    async def put_file(self, name: str, source: str, content_type: Optional[str] = None) -> str:
+        """Store the content of a local file as an object, returning its location."""
+        size = (await aiofiles.os.stat(source)).st_size
+        if size < self.multipart_threshold:
+            async with aiofiles.open(source, "rb") as f:
+                return await self.put(name, await f.read(), content_type)
+
+        async def read_part(offset: int, length: int) -> bytes:
+            async with aiofiles.open(source, "rb") as f:
+                await f.seek(offset)
+                return await f.read(length)
+
+        await self._put_multipart(name, size, read_part, {"ContentType": content_type} if content_type else {})
+        return self.location(name)
+
+    async def _put_multipart(
+        self,
+        name: str,
+        size: int,
+        read_part: Callable[[int, int], Awaitable[bytes]],
+        extra: dict
+    ) -> None:
+        """Upload an object as parts, `part_concurrency` at a time; aborted on failure."""
+        client = await self._get_client()
+        key = self.key(name)
+        upload_id = (await client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra))["UploadId"]
+        slots = asyncio.Semaphore(self.part_concurrency)
+
+        async def upload_part(number: int, offset: int) -> dict:
+            async with slots:
+                body = await read_part(offset, self.part_size)
+                response = await client.upload_part(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+                )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+
+        try:
+            parts = await asyncio.gather(*(
+                upload_part(number, offset)
+                for number, offset in enumerate(range(0, size, self.part_size), start=1)
+            ))
+            await client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            with contextlib.suppress(Exception):
+                await client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def get(self, name: str) -> bytes:
+        """
+        Read an object.
+
+        Raises:
+            FileNotFoundError: If there is no such object
+        """
+        client = await self._get_client()
+        try:
+            response = await client.get_object(Bucket=self.bucket, Key=self.key(name))
+        except Exception as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(name)
+            raise
+        async with response["Body"] as stream:
+            return await stream.read()
+
+    async def exists(self, name: str) -> bool:
+        """Whether an object exists."""
+        client = await self._get_client()
+        try:
+            await client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except Exception as e:
+            if self._is_missing(e):
+                return False
+            raise
+        return True
+
+    async def touch(self, name: str) -> bool:
+        """
+        Check that an object still exists. Bucket lifecycle rules expire objects by
+        creation date, so reuse does not extend their retention.
+        """
+        return await self.exists(name)
+
+    async def delete(self, name: str) -> None:
+        """Remove an object if it exists."""
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=self.key(name))
+
+    async def presigned_url(self, name: str) -> Optional[str]:
+        """Time-limited URL clients can download an object from directly."""
+        client = await self._get_client()
+        return await client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.key(name)},
+            ExpiresIn=self.presign_expires
+        )
+
+    async def close(self) -> None:
+        """Close the client and its connection pool."""
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._client = None
+
+
+def create_storage_backend(local_dir: str, prefix: str):
+    """
+    Build the storage backend named in settings (STORAGE_BACKEND 'local' or 's3').
+
+    Args:
+        local_dir: Directory used by the local backend
+        prefix: Key prefix used by the S3 backend
+    """
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorageBackend(local_dir)
+    if settings.STORAGE_BACKEND == "s3":
+        if not settings.S3_BUCKET:
+            raise ValueError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        return S3StorageBackend(
+            bucket=settings.S3_BUCKET,
+            prefix=prefix,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            presign_expires=settings.S3_PRESIGN_EXPIRES
+        )
+    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
@@ -0,0 +1,234 @@
+import asyncio
+import time
+import weakref
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Mapping, Optional
+from src.services.metrics import metrics
+
+stage_seconds = metrics.histogram(
+    "pipeline_stage_seconds", "Duration of pipeline stages, cache hits included", ["pipeline", "stage"]
+)
+stage_cache_hits_total = metrics.counter(
+    "pipeline_stage_cache_hits_total", "Pipeline stages answered from their cache", ["pipeline", "stage"]
+)
+stage_skipped_total = metrics.counter(
+    "pipeline_stage_skipped_total", "Pipeline stages skipped by their condition", ["pipeline", "stage"]
+)
+
+# How a stage function is run: awaited on the event loop, or called in a worker thread
+EXECUTORS = ("async", "thread")
+
+
+class StageCache:
+    """
+    Caching hooks of a stage. Both hooks see the values of the run so far, which
+    include the stage's inputs. The base class caches nothing.
+    """
+
+    async def get(self, values: Mapping[str, Any]) -> Optional[Any]:
+        """The stored result for these values, or None to run the stage."""
+        return None
+
+    async def put(self, values: Mapping[str, Any], result: Any) -> None:
+        """Store the result of a stage run."""
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    A pipeline node: a function from named inputs to named outputs.
+
+    The function is called with the stage's inputs as keyword arguments. It returns
+    the value of a single output, a tuple with one value per output, or nothing for
+    stages run for their side effects. A stage whose `when` condition is false is
+    skipped and its outputs are None.
+    """
+    name: str
+    func: Callable[..., Any]
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    # Stages to wait for without consuming their outputs
+    after: tuple[str, ...] = ()
+    when: Optional[Callable[[Mapping[str, Any]], bool]] = None
+    executor: str = "async"
+    # Runs of this stage in flight across all pipeline runs (None for no limit)
+    max_concurrency: Optional[int] = None
+    cache: Optional[StageCache] = None
+
+
+@dataclass
+class PipelineRun:
+    """Values, stage timings in seconds, and skipped and cached stages of one run."""
+    values: dict[str, Any]
+    timings: dict[str, float] = field(default_factory=dict)
+    skipped: set[str] = field(default_factory=set)
+    cached: set[str] = field(default_factory=set)
+
+    def __getitem__(self, name: str) -> Any:
+        return self.values[name]
+
+    def server_timing(self) -> str:
+        """Stage timings as a `Server-Timing` header value, in milliseconds."""
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" + (';desc="cached"' if name in self.cached else "")
+            for name, seconds in self.timings.items()
+        )
+
+
+class Pipeline:
+    """
+    Runs stages as a dependency graph.
+
+    A stage starts as soon as the stages producing its inputs (and those named in
+    its `after`) have finished, so independent stages run concurrently. When a stage
+    fails, the stages still running are cancelled and its exception is raised.
+    """
+
+    def __init__(self, name: str, stages: Iterable[Stage], inputs: Iterable[str] = ()):
+        """
+        Initialize the pipeline.
+
+        Args:
+            name: Pipeline name, used as a metric label
+            stages: Stages, in any order
+            inputs: Names of the values passed to `run`
+
+        Raises:
+            ValueError: If the stages do not form an acyclic graph over the inputs
+        """
+        self.name = name
+        self.inputs = tuple(inputs)
+        stages = list(stages)
+        by_name = {stage.name: stage for stage in stages}
+        if len(by_name) != len(stages):
+            raise ValueError(f"Pipeline {name}: stage names must be unique")
+
+        producers: dict[str, str] = {}
+        for stage in stages:
+            if stage.executor not in EXECUTORS:
+                raise ValueError(f"Pipeline {name}: unknown executor {stage.executor!r} of stage {stage.name}")
+            for output in stage.outputs:
+                if output in producers or output in self.inputs:
+                    raise ValueError(f"Pipeline {name}: {output} is produced more than once")
+                producers[output] = stage.name
+
+        self._dependencies: dict[str, set[str]] = {}
+        for stage in stages:
+            unknown = [
+                value for value in stage.inputs if value not in producers and value not in self.inputs
+            ] + [other for other in stage.after if other not in by_name]
+            if unknown:
+                raise ValueError(f"Pipeline {name}: stage {stage.name} depends on unknown {', '.join(unknown)}")
+            self._dependencies[stage.name] = {
+                producers[value] for value in stage.inputs if value in producers
+            } | set(stage.after)
+
+        self.stages = self._ordered(by_name)
+        # Concurrency limits per event loop: a semaphore is bound to the loop it is
+        # first used in, and pipelines are built at import, before any loop runs
+        self._limits: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _ordered(self, by_name: dict[str, Stage]) -> list[Stage]:
+        """Stages in dependency order."""
+        ordered: list[Stage] = []
+        done: set[str] = set()
+        remaining = list(by_name)
+        while remaining:
+            ready = [name for name in remaining if self._dependencies[name] <= done]
+            if not ready:
+                raise ValueError(f"Pipeline {self.name}: stages {', '.join(remaining)} form a cycle")
+            for stage_name in ready:
+                remaining.remove(stage_name)
+                done.add(stage_name)
+                ordered.append(by_name[stage_name])
+        return ordered
+
+    def _limit(self, stage: Stage) -> Optional[asyncio.Semaphore]:
+        """The concurrency limit of a stage in the running event loop, if it has one."""
+        if not stage.max_concurrency:
+            return None
+        limits = self._limits.setdefault(asyncio.get_running_loop(), {})
+        if stage.name not in limits:
+            limits[stage.name] = asyncio.Semaphore(stage.max_concurrency)
+        return limits[stage.name]
+
+    async def run(self, **inputs: Any) -> PipelineRun:
+        """
+        Run all stages.
+
+        Args:
+            **inputs: A value for each of the pipeline's inputs
+
+        Returns:
+            PipelineRun: The inputs and every stage output, with timings
+
+        Raises:
+            ValueError: If an input is missing
+            Exception: The first exception raised by a stage
+        """
+        missing = [name for name in self.inputs if name not in inputs]
+        if missing:
+            raise ValueError(f"Pipeline {self.name}: missing inputs {', '.join(missing)}")
+
+        run = PipelineRun(dict(inputs))
+        pending = list(self.stages)
+        running: dict[asyncio.Task, Stage] = {}
+        done: set[str] = set()
+        try:
+            while pending or running:
+                for stage in [stage for stage in pending if self._dependencies[stage.name] <= done]:
+                    pending.remove(stage)
+                    running[asyncio.create_task(self._run_stage(stage, run))] = stage
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                errors = []
+                for task in finished:
+                    done.add(running.pop(task).name)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                if errors:
+                    raise errors[0]
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return run
+
+    async def _run_stage(self, stage: Stage, run: PipelineRun) -> None:
+        if stage.when is not None and not stage.when(run.values):
+            run.skipped.add(stage.name)
+            stage_skipped_total.inc(pipeline=self.name, stage=stage.name)
+            self._store(stage, run, None)
+            return
+
+        started = time.perf_counter()
+        result = await stage.cache.get(run.values) if stage.cache is not None else None
+        if result is not None:
+            run.cached.add(stage.name)
+            stage_cache_hits_total.inc(pipeline=self.name, stage=stage.name)
+        else:
+            kwargs = {name: run.values[name] for name in stage.inputs}
+            async with self._limit(stage) or nullcontext():
+                if stage.executor == "thread":
+                    result = await asyncio.to_thread(stage.func, **kwargs)
+                else:
+                    result = await stage.func(**kwargs)
+            if stage.cache is not None:
+                await stage.cache.put(run.values, result)
+        elapsed = time.perf_counter() - started
+        run.timings[stage.name] = elapsed
+        stage_seconds.observe(elapsed, pipeline=self.name, stage=stage.name)
+        self._store(stage, run, result)
+
+    @staticmethod
+    def _store(stage: Stage, run: PipelineRun, result: Any) -> None:
+        if len(stage.outputs) == 1:
+            run.values[stage.outputs[0]] = result
+        elif stage.outputs:
+            values = result if result is not None else (None,) * len(stage.outputs)
+            if len(values) != len(stage.outputs):
+                raise ValueError(
+                    f"Stage {stage.name} returned {len(values)} values for {len(stage.outputs)} outputs"
+                )
+            run.values.update(zip(stage.outputs, values))
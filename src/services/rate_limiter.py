@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Collection, Optional
+from src.config import settings
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a client has used up its request allowance."""
+
+    def __init__(self, client: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.1f} seconds")
+        self.client = client
+        self.retry_after = retry_after
+
+
+@dataclass
+class ClientUsage:
+    """Accumulated usage of one client."""
+
+    client: str
+    requests: int = 0
+    images: int = 0
+    tokens: int = 0
+    audio_seconds: float = 0.0
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_api_keys(spec: str) -> frozenset[str]:
+    """API keys of a comma-separated list (RATE_LIMIT_API_KEYS)."""
+    return frozenset(key.strip() for key in spec.split(",") if key.strip())
+
+
+def client_id(api_key: Optional[str], host: Optional[str], accepted_keys: Collection[str] = ()) -> str:
+    """
+    Identify the client of a request.
+
+    Accepted API keys take precedence over the remote address and are stored as a
+    digest, so the ledger never holds usable credentials. Any other key is ignored:
+    otherwise a caller could send a new key with each request and never be limited.
+    """
+    if api_key and api_key in accepted_keys:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"ip:{host or 'unknown'}"
+
+
+def _take(
+    tokens: float,
+    updated: float,
+    now: float,
+    rate_per_minute: float,
+    burst: float,
+    cost: float
+) -> tuple[float, float]:
+    """
+    Apply one token bucket step.
+
+    Returns:
+        tuple: (tokens left, seconds until the request would fit or 0 if it was taken)
+    """
+    rate = rate_per_minute / 60.0
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryRateLimitBackend:
+    """
+    Per-process bucket and ledger storage (one API worker).
+
+    Buckets that have refilled are dropped, since a missing bucket starts full. At
+    most `max_clients` buckets and ledger entries are kept; beyond that the least
+    recently seen clients are forgotten.
+    """
+
+    def __init__(self, max_clients: Optional[int] = None):
+        self.max_clients = max_clients or settings.RATE_LIMIT_MAX_CLIENTS
+        # key -> (tokens, updated, time the bucket is full again), least recently used first
+        self._buckets: OrderedDict[str, tuple[float, float, float]] = OrderedDict()
+        self._usage: OrderedDict[str, ClientUsage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate_per_minute: float, burst: float, cost: float, now: float) -> float:
+        """Take `cost` tokens from a client's bucket; returns the retry delay or 0."""
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens, retry_after = _take(tokens, updated, now, rate_per_minute, burst, cost)
+            self._buckets[key] = (tokens, now, now + (burst - tokens) * 60.0 / rate_per_minute)
+            self._buckets.move_to_end(key)
+            while self._buckets:
+                oldest, (_, _, full_at) = next(iter(self._buckets.items()))
+                if full_at > now and len(self._buckets) <= self.max_clients:
+                    break
+                del self._buckets[oldest]
+            return retry_after
+
+    def record(
+        self,
+        client: str,
+        requests: int,
+        images: int,
+        tokens: int,
+        audio_seconds: float,
+        now: float
+    ) -> None:
+        """Add usage to a client's ledger entry."""
+        with self._lock:
+            usage = self._usage.setdefault(client, ClientUsage(client, first_seen=now))
+            self._usage.move_to_end(client)
+            while len(self._usage) > self.max_clients:
+                self._usage.popitem(last=False)
+            usage.requests += requests
+            usage.images += images
+            usage.tokens += tokens
+            usage.audio_seconds += audio_seconds
+            usage.last_seen = now
+
+    def usage(self, client: str) -> Optional[ClientUsage]:
+        with self._lock:
+            usage = self._usage.get(client)
+            return ClientUsage(**asdict(usage)) if usage else None
+
+    def all_usage(self) -> list[ClientUsage]:
+        with self._lock:
+            return [ClientUsage(**asdict(usage)) for usage in self._usage.values()]
+
+    def reset(self) -> None:
+        """Forget all buckets and usage."""
+        with self._lock:
+            self._buckets.clear()
+            self._usage.clear()
+
+
+class SQLiteRateLimitBackend:
+    """
+    Bucket and ledger storage in a local SQLite database.
+
+    Every update runs in an immediate (write-locked) transaction, so API workers
+    sharing the database file see consistent limits and totals.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS client_usage ("
+                "client TEXT PRIMARY KEY, requests INTEGER NOT NULL DEFAULT 0, "
+                "images INTEGER NOT NULL DEFAULT 0, tokens INTEGER NOT NULL DEFAULT 0, "
+                "audio_seconds REAL NOT NULL DEFAULT 0, first_seen REAL NOT NULL, "
+                "last_seen REAL NOT NULL)"
+            )
+
+    def _transaction(self, func):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def take(self, key: str, rate_per_minute: float, burst: float, cost: float, now: float) -> float:
+        """Take `cost` tokens from a client's bucket; returns the retry delay or 0."""
+        def update(conn: sqlite3.Connection) -> float:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens, retry_after = _take(tokens, updated, now, rate_per_minute, burst, cost)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            return retry_after
+
+        return self._transaction(update)
+
+    def record(
+        self,
+        client: str,
+        requests: int,
+        images: int,
+        tokens: int,
+        audio_seconds: float,
+        now: float
+    ) -> None:
+        """Add usage to a client's ledger entry."""
+        self._transaction(lambda conn: conn.execute(
+            "INSERT INTO client_usage "
+            "(client, requests, images, tokens, audio_seconds, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(client) DO UPDATE SET "
+            "requests = requests + excluded.requests, images = images + excluded.images, "
+            "tokens = tokens + excluded.tokens, "
+            "audio_seconds = audio_seconds + excluded.audio_seconds, "
+            "last_seen = excluded.last_seen",
+            (client, requests, images, tokens, audio_seconds, now, now)
+        ))
+
+    def _select_usage(self, where: str = "", params: tuple = ()) -> list[ClientUsage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT client, requests, images, tokens, audio_seconds, first_seen, last_seen "
+                f"FROM client_usage {where}",
+                params
+            ).fetchall()
+        return [ClientUsage(*row) for row in rows]
+
+    def usage(self, client: str) -> Optional[ClientUsage]:
+        rows = self._select_usage("WHERE client = ?", (client,))
+        return rows[0] if rows else None
+
+    def all_usage(self) -> list[ClientUsage]:
+        return self._select_usage()
+
+    def reset(self) -> None:
+        """Forget all buckets and usage."""
+        def clear(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM rate_limit_buckets")
+            conn.execute("DELETE FROM client_usage")
+
+        self._transaction(clear)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend(name: Optional[str] = None, path: Optional[str] = None):
+    """Build the rate limit backend named in settings ('memory' or 'sqlite')."""
+    name = name or settings.RATE_LIMIT_BACKEND
+    if name == "memory":
+        return MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_CLIENTS)
+    if name == "sqlite":
+        return SQLiteRateLimitBackend(path or settings.RATE_LIMIT_DB_PATH)
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+class RateLimiter:
+    """
+    Per-client token bucket rate limiting and usage accounting.
+
+    Each client may make `burst` requests at once and `rate_per_minute` on average.
+    The same backend keeps a ledger of the images, upstream tokens and seconds of
+    audio each client consumed.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        rate_per_minute: Optional[float] = None,
+        burst: Optional[float] = None
+    ):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            backend: Memory or SQLite backend (defaults to RATE_LIMIT_BACKEND)
+            rate_per_minute: Sustained requests per minute per client
+            burst: Maximum requests a client can make at once
+        """
+        self.backend = backend or create_backend()
+        self.rate_per_minute = rate_per_minute or settings.RATE_LIMIT_PER_MINUTE
+        self.burst = burst or settings.RATE_LIMIT_BURST
+        # SQLite calls may wait on another worker's write lock
+        self._blocking = isinstance(self.backend, SQLiteRateLimitBackend)
+
+    async def _run(self, func, *args):
+        if self._blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def check(self, client: str, cost: float = 1) -> None:
+        """
+        Charge a request to a client's allowance.
+
+        Raises:
+            RateLimitExceeded: If the client has no allowance left
+        """
+        retry_after = await self._run(
+            self.backend.take, client, self.rate_per_minute, self.burst, cost, time.time()
+        )
+        if retry_after > 0:
+            raise RateLimitExceeded(client, retry_after)
+
+    async def record_usage(
+        self,
+        client: str,
+        images: int = 0,
+        tokens: int = 0,
+        audio_seconds: float = 0.0
+    ) -> None:
+        """Add one request and the resources it consumed to a client's ledger."""
+        await self._run(
+            self.backend.record, client, 1, images, tokens, audio_seconds, time.time()
+        )
+
+    async def usage(self, client: str) -> ClientUsage:
+        """Return a client's accumulated usage."""
+        usage = await self._run(self.backend.usage, client)
+        return usage or ClientUsage(client)
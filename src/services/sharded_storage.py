@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import os
+from typing import Optional
+import aiofiles.os
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(name: str, levels: int = 2, width: int = 2) -> str:
+    """Relative sharded location of a name, e.g. "ab/cd/<name>" (always "/"-separated)."""
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+    shards = [digest[i * width:(i + 1) * width] for i in range(levels)]
+    return "/".join(shards + [name])
+
+
+class ShardedDirectory:
+    """
+    Directory whose files are fanned out into hashed subdirectories.
+
+    A file named `name` is stored as `<root>/ab/cd/<name>`, where `abcd` are the
+    leading hex digits of SHA-256(name), so no directory grows beyond a few hundred
+    entries and lookups stay fast with hundreds of thousands of files. The location
+    follows from the name alone, so no index is needed to find a file.
+
+    Files of the older flat layout (`<root>/<name>`) are still found until they are
+    moved with `migrate()` (`python -m src.cli storage migrate`).
+    """
+
+    def __init__(self, root: str, levels: int = 2, width: int = 2):
+        """
+        Initialize the directory.
+
+        Args:
+            root: Directory holding the shards
+            levels: Number of nested shard directories (0 keeps the layout flat)
+            width: Hex digits per shard directory name (2 gives 256 subdirectories)
+        """
+        self.root = root
+        self.levels = levels
+        self.width = width
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, name: str) -> str:
+        """Path of a file in the sharded layout."""
+        return os.path.join(self.root, *shard_key(name, self.levels, self.width).split("/"))
+
+    def legacy_path_for(self, name: str) -> str:
+        """Path of a file in the flat layout."""
+        return os.path.join(self.root, name)
+
+    async def prepare(self, name: str) -> str:
+        """Path for writing a file, with its shard directory created off the event loop."""
+        file_path = self.path_for(name)
+        # Not remembered between calls: cleanup may remove shard directories it emptied
+        await aiofiles.os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        return file_path
+
+    async def locate(self, name: str) -> Optional[tuple[str, os.stat_result]]:
+        """
+        Find a file by name, in the sharded layout or else the flat one.
+
+        Returns:
+            tuple: (path, stat result), or None if there is no such entry
+        """
+        for file_path in (self.path_for(name), self.legacy_path_for(name)):
+            try:
+                return file_path, await aiofiles.os.stat(file_path)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def migrate(self) -> int:
+        """
+        Move files of the flat layout into their shard directories.
+
+        Safe to run while the service is up (files are renamed atomically and are
+        found in either place) and to rerun after an interruption.
+
+        Returns:
+            int: Number of files moved
+        """
+        if self.levels == 0:
+            return 0
+        moved = 0
+        with os.scandir(self.root) as entries:
+            names = [entry.name for entry in entries if entry.is_file(follow_symlinks=False)]
+        for name in names:
+            target = self.path_for(name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.replace(self.legacy_path_for(name), target)
+            except FileNotFoundError:
+                continue  # Removed by cleanup meanwhile
+            moved += 1
+            if moved % 10_000 == 0:
+                logger.info("Moved %d files into shards of %s", moved, self.root)
+        return moved
@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def content_key(*parts: Any) -> str:
+    """
+    Build a compact, stable key from request content and parameters.
+
+    Bytes are hashed as-is; everything else by its repr, so (caption, 0.7) and
+    (caption, 0.70) map to the same key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else repr(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving while it
+    is in flight await the same task instead of repeating the work. The work is
+    shielded from cancellation of individual callers, so a disconnecting client does
+    not fail the others. Once the task finishes the key is released, so later calls
+    run afresh (this is coalescing, not caching).
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `func` once per key among concurrent callers.
+
+        Args:
+            key: Identity of the work, e.g. a content hash plus parameters
+            func: Zero-argument callable returning the awaitable doing the work
+
+        Returns:
+            The result of the shared execution (exceptions are shared too)
+        """
+        loop = asyncio.get_running_loop()
+        task = self._in_flight.get(key)
+        if task is not None and task.get_loop() is loop and not task.done():
+            self.coalesced += 1
+        else:
+            task = loop.create_task(func())
+            self._in_flight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done, key=key: self._release(key, done))
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
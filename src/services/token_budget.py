@@ -0,0 +1,133 @@
+import logging
+import math
+import threading
+from typing import Optional
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough size of an English token, used when no BPE encoding can be loaded
+CHARS_PER_TOKEN = 4
+# English prose averages about 1.3 BPE tokens per word
+TOKENS_PER_WORD = 1.3
+# Narration pace of the TTS voice
+WORDS_PER_SECOND = 2.5
+# Chat formatting tokens added per message, and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_OVERHEAD_TOKENS = 3
+# Fallback encoding for models tiktoken does not know (OpenAI-compatible servers)
+DEFAULT_ENCODING = "o200k_base"
+
+
+class TokenCounter:
+    """
+    Counts and trims text in the tokens of the narrative model.
+
+    Uses tiktoken's BPE encoding for the model, loaded on first use. The encoding
+    files are read from TIKTOKEN_CACHE_DIR (the Docker image bundles them) and
+    downloaded once otherwise. Without tiktoken, or offline without a cached
+    encoding, counts fall back to an estimate of CHARS_PER_TOKEN characters per
+    token and `exact` is False.
+    """
+
+    def __init__(self, model: str):
+        """
+        Initialize the counter.
+
+        Args:
+            model: Model whose tokenizer to use, e.g. "gpt-4o-mini"
+        """
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._encoding = self._load_encoding()
+                    self._loaded = True
+        return self._encoding
+
+    def _load_encoding(self):
+        try:
+            import tiktoken
+        except ImportError:
+            logger.warning("tiktoken is not installed; estimating token counts from text length")
+            return None
+        try:
+            try:
+                return tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                return tiktoken.get_encoding(DEFAULT_ENCODING)
+        except Exception as e:
+            logger.warning("Could not load the tokenizer for %s (%s); estimating token counts", self.model, e)
+            return None
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the model's tokenizer rather than an estimate."""
+        return self._get_encoding() is not None
+
+    def count(self, text: str) -> int:
+        """Number of tokens in a text."""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages: list[dict]) -> int:
+        """Number of prompt tokens a chat request with these messages is billed for."""
+        return REPLY_OVERHEAD_TOKENS + sum(
+            MESSAGE_OVERHEAD_TOKENS + self.count(message["content"]) for message in messages
+        )
+
+    def truncate(self, text: str, max_tokens: int, suffix: str = "...") -> str:
+        """
+        Cut a text to at most `max_tokens` tokens, suffix included.
+
+        Text that fits is returned unchanged; otherwise it is cut at a token
+        boundary and `suffix` is appended.
+        """
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is None:
+            max_chars = max_tokens * CHARS_PER_TOKEN
+            if len(text) <= max_chars:
+                return text
+            if max_chars <= len(suffix):
+                return text[:max_chars]
+            return text[:max_chars - len(suffix)] + suffix
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        suffix_tokens = len(encoding.encode(suffix)) if suffix else 0
+        if suffix_tokens >= max_tokens:
+            return encoding.decode(tokens[:max_tokens])
+        # Decoding a cut token sequence can end in a partial character; drop it
+        return encoding.decode(tokens[:max_tokens - suffix_tokens]).rstrip("�") + suffix
+
+
+def words_for_duration(seconds: float) -> int:
+    """Narrative length in words that takes about `seconds` to narrate."""
+    return max(1, round(seconds * WORDS_PER_SECOND))
+
+
+def max_tokens_for(words: Optional[int], headroom: float = 1.2) -> Optional[int]:
+    """
+    Completion budget for a narrative of a target length.
+
+    Args:
+        words: Target length in words
+        headroom: Allowance so a story of the target length is not cut off
+
+    Returns:
+        int: Tokens to allow, within [NARRATIVE_MIN_TOKENS, NARRATIVE_MAX_TOKENS_LIMIT],
+            or None without a target
+    """
+    if words is None:
+        return None
+    tokens = math.ceil(words * TOKENS_PER_WORD * headroom)
+    return min(max(tokens, settings.NARRATIVE_MIN_TOKENS), settings.NARRATIVE_MAX_TOKENS_LIMIT)
@@ -1,25 +1,118 @@
+import asyncio
+import contextlib
+import hashlib
+import io
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from gtts import gTTS
 from pathlib import Path
 from src.config import settings
+from src.services.lazy_import import lazy_import
+from src.services.sharded_storage import ShardedDirectory
+from src.services.single_flight import SingleFlight
+
+# gTTS pulls in requests/urllib3 and is only needed when synthesizing
+gTTS = lazy_import("gtts", "gTTS")
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+_CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:])\s+")
 
 class TTSError(Exception):
     """Raised when text-to-speech conversion fails."""
     pass
 
+def split_text(text: str, max_chars: int = 100) -> list[str]:
+    """
+    Split text into chunks of at most `max_chars` characters for synthesis.
+    
+    Text is cut at sentence ends, then at clause punctuation, then between words,
+    and the pieces are packed back together up to the limit, so chunks end where
+    a speaker would pause anyway. Chunks without any letters or digits are dropped.
+    """
+    pieces = []
+    for sentence in _SENTENCE_BOUNDARY.split(text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_BOUNDARY.split(sentence):
+            if len(clause) <= max_chars:
+                pieces.append(clause)
+                continue
+            for word in clause.split():
+                pieces.extend(word[i:i + max_chars] for i in range(0, len(word), max_chars))
+    
+    chunks: list[str] = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += " " + piece
+        elif piece:
+            chunks.append(piece)
+    return [chunk for chunk in chunks if any(char.isalnum() for char in chunk)]
+
+def _strip_id3(data: bytes) -> bytes:
+    """Drop a leading ID3v2 tag, so concatenated chunks form one MPEG frame stream."""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return data[10 + size + footer:]
+    return data
+
 class TTSService:
     """Service for converting text to speech using gTTS."""
     
-    def __init__(self, output_dir: Optional[str] = None):
+    # gTTS returns constant bitrate MPEG audio at 32 kbps
+    AUDIO_BITRATE = 32_000
+    
+    def __init__(
+        self,
+        output_dir: Optional[str] = None,
+        backend=None,
+        parallel: Optional[bool] = None,
+        max_chunk_chars: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ):
         """
         Initialize the TTS service.
         
         Args:
             output_dir: Directory to store audio files. If not provided, uses settings
+            backend: Optional shared object storage (e.g. S3) audio files are also
+                published to, so every API instance can serve them
+            parallel: Synthesize long texts as concurrent chunks (default: TTS_PARALLEL_CHUNKS)
+            max_chunk_chars: Maximum characters per chunk (default: TTS_CHUNK_MAX_CHARS)
+            concurrency: Maximum chunk requests in flight across all texts
+                (default: TTS_MAX_CONCURRENCY)
         """
         self.output_dir = output_dir or settings.AUDIO_DIR
-        os.makedirs(self.output_dir, exist_ok=True)
+        self.storage = ShardedDirectory(self.output_dir, levels=settings.STORAGE_SHARD_LEVELS)
+        self.backend = backend
+        self.parallel = settings.TTS_PARALLEL_CHUNKS if parallel is None else parallel
+        self.max_chunk_chars = max_chunk_chars or settings.TTS_CHUNK_MAX_CHARS
+        # Bounds requests to the TTS API, shared by every synthesis of this service
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency or settings.TTS_MAX_CONCURRENCY, thread_name_prefix="tts"
+        )
+        self._in_flight = SingleFlight()
+    
+    @staticmethod
+    def audio_filename(text: str, language: str) -> str:
+        """
+        Build the content-addressed filename for a synthesized text.
+        
+        The same text and language always produce the same speech, so the name is
+        derived from a SHA-256 digest of both. Clients can cache such files forever.
+        """
+        digest = hashlib.sha256(f"{language}\0{text}".encode("utf-8")).hexdigest()
+        return f"audio_{digest}.mp3"
+    
+    @classmethod
+    def estimate_duration(cls, file_path: str) -> float:
+        """Estimate the playing time of a generated file in seconds from its size."""
+        try:
+            return os.path.getsize(file_path) * 8 / cls.AUDIO_BITRATE
+        except OSError:
+            return 0.0
     
     async def text_to_speech(
         self,
@@ -48,27 +141,91 @@ class TTSService:
             # Use default language from settings if not provided
             lang = language or settings.TTS_LANGUAGE
             
-            # Generate audio file
-            tts = gTTS(text=text, lang=lang)
-            
-            # Create unique filename if not provided
-            if not filename:
-                import uuid
-                filename = f"audio_{uuid.uuid4()}.mp3"
+            # Name the file after its content if no filename was provided
+            content_addressed = not filename
+            if content_addressed:
+                filename = self.audio_filename(text, lang)
             
             # Ensure filename has .mp3 extension
             if not filename.endswith(".mp3"):
                 filename += ".mp3"
             
-            # Save to file
-            file_path = os.path.join(self.output_dir, filename)
-            tts.save(file_path)
+            file_path = await self.storage.prepare(filename)
+            # Content-addressed files are served as immutable: never synthesize them twice
+            if content_addressed and await asyncio.to_thread(self._reuse, file_path):
+                return file_path
+            
+            # Concurrent requests for the same file share one synthesis
+            await self._in_flight.do(
+                (file_path, lang, text),
+                lambda: self._produce(text, lang, file_path)
+            )
             
             return file_path
             
         except Exception as e:
             raise TTSError(f"Failed to convert text to speech: {str(e)}")
     
+    @staticmethod
+    def _reuse(file_path: str) -> bool:
+        """
+        Refresh the modification time of an existing file, so its retention restarts
+        now that it is handed out again. False if there is no such file. Blocking.
+        """
+        try:
+            os.utime(file_path)
+        except FileNotFoundError:
+            return False
+        return True
+    
+    async def _produce(self, text: str, lang: str, file_path: str) -> None:
+        """Synthesize an audio file and publish it to the shared backend, if any."""
+        loop = asyncio.get_running_loop()
+        chunks = split_text(text, self.max_chunk_chars) if self.parallel else [text]
+        if len(chunks) <= 1:
+            await loop.run_in_executor(self._pool, self._synthesize, text, lang, file_path)
+        else:
+            # gTTS would fetch the chunks one after another; fetch them all at once
+            # and join the MP3 frames in order (MPEG audio concatenates losslessly)
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(self._pool, self._synthesize_chunk, chunk, lang)
+                for chunk in chunks
+            ))
+            await asyncio.to_thread(self._write_parts, parts, file_path)
+        if self.backend is not None:
+            await self.backend.put_file(os.path.basename(file_path), file_path, "audio/mpeg")
+    
+    def _synthesize(self, text: str, lang: str, file_path: str) -> None:
+        """Generate and save the audio file, atomically. Blocking; called from a worker thread."""
+        tmp_path = file_path + ".part"
+        try:
+            gTTS(text=text, lang=lang).save(tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+    
+    def _synthesize_chunk(self, text: str, lang: str) -> bytes:
+        """Synthesize one chunk (a single TTS API request) to MP3 bytes. Blocking."""
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def _write_parts(parts: list[bytes], file_path: str) -> None:
+        """Write chunk audio in order as one file, atomically. Blocking."""
+        tmp_path = file_path + ".part"
+        try:
+            with open(tmp_path, "wb") as f:
+                for i, part in enumerate(parts):
+                    f.write(part if i == 0 else _strip_id3(part))
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+    
     def cleanup_old_files(self, max_age_hours: int = 24):
         """
         Clean up audio files older than specified age.
@@ -81,7 +238,7 @@ class TTSService:
         max_age_seconds = max_age_hours * 3600
         
         try:
-            for file_path in Path(self.output_dir).glob("*.mp3"):
+            for file_path in Path(self.output_dir).rglob("*.mp3"):
                 if current_time - file_path.stat().st_mtime > max_age_seconds:
                     file_path.unlink()
         except Exception as e:
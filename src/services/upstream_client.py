@@ -0,0 +1,450 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from urllib.parse import urlparse
+from src.config import settings
+from src.services.lazy_import import lazy_import
+from src.services.metrics import metrics
+
+httpx = lazy_import("httpx")
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Default (requests per minute, tokens per minute) limits per model, used when
+# OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT are not configured explicitly
+MODEL_RATE_LIMITS: dict[str, tuple[int, int]] = {
+    "gpt-4o-mini": (500, 200_000),
+    "gpt-4o": (500, 30_000),
+    "gpt-4-turbo": (500, 30_000),
+    "gpt-4-0125-preview": (500, 30_000),
+    "gpt-4": (500, 10_000),
+    "gpt-3.5-turbo": (3_500, 200_000),
+}
+DEFAULT_RATE_LIMITS = (500, 30_000)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+hedgeable_requests_total = metrics.counter(
+    "upstream_hedgeable_requests_total", "Upstream requests eligible for hedging"
+)
+hedged_requests_total = metrics.counter(
+    "upstream_hedged_requests_total", "Upstream requests that sent a hedge after the latency threshold"
+)
+hedge_wins_total = metrics.counter(
+    "upstream_hedge_wins_total", "Hedged requests by the attempt that answered first", ["winner"]
+)
+hedge_delay_seconds = metrics.gauge(
+    "upstream_hedge_delay_seconds", "Current latency threshold for sending a hedge"
+)
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream call fails after exhausting its retry budget."""
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised when the circuit breaker rejects a call without contacting the upstream."""
+    pass
+
+
+def rate_limits_for(model: str) -> tuple[int, int]:
+    """
+    Resolve the (RPM, TPM) limits for a model.
+
+    Settings take precedence; otherwise the longest matching model prefix in
+    MODEL_RATE_LIMITS is used (so dated snapshots inherit their family's limits).
+    """
+    prefix = max((name for name in MODEL_RATE_LIMITS if model.startswith(name)), key=len, default=None)
+    rpm, tpm = MODEL_RATE_LIMITS[prefix] if prefix else DEFAULT_RATE_LIMITS
+    return settings.OPENAI_RPM_LIMIT or rpm, settings.OPENAI_TPM_LIMIT or tpm
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate_per_minute: Tokens added per minute
+            capacity: Maximum burst size (defaults to one minute worth of tokens)
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """
+        Take tokens if available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise seconds until they will be
+        """
+        amount = min(amount, self.capacity)
+        self._refill()
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Wait until the requested number of tokens can be taken."""
+        while (wait := self.try_acquire(amount)) > 0:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream failures.
+
+    Closed: calls pass through. After `failure_threshold` consecutive failures the
+    circuit opens and rejects calls for `reset_timeout` seconds. It then lets a single
+    trial call through (half-open); success closes it, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Current state: 'closed', 'open' or 'half_open'."""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not reach the upstream."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitOpenError("Upstream circuit is open; failing fast")
+        if state == "half_open":
+            self._trial_in_flight = True
+
+    def release_trial(self) -> None:
+        """Allow another trial call after one was abandoned without an outcome."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (starting at 1).
+
+        A server-provided Retry-After is honoured as a lower bound.
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(backoff, min(retry_after or 0.0, self.max_delay))
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Initialize the tracker.
+
+        Args:
+            window: Number of most recent latencies kept
+            min_samples: Samples needed before percentiles are reported
+        """
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a call."""
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Latency below which `percent` of recent calls finished, or None with too few samples."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an upstream error is transient (rate limit, timeout, server or network error)."""
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # SDK and httpx network errors, matched by name to avoid importing either here
+    return any(
+        cls.__name__ in ("APIConnectionError", "APITimeoutError", "TransportError")
+        for cls in type(error).__mro__
+    )
+
+
+class UpstreamClient:
+    """
+    Managed access to a rate-limited HTTP upstream such as the OpenAI API.
+
+    Bundles a tuned, pooled httpx client with the policies applied around each call:
+    a per-host concurrency semaphore, request and token buckets sized from the
+    model's RPM/TPM limits, jittered exponential retries for transient errors and a
+    circuit breaker that fails fast while the upstream is unhealthy.
+
+    `hedged_call` additionally cuts tail latency: when a request has not answered
+    within the recent latency percentile, an identical second request is sent and the
+    first answer wins. Hedges are capped at a fraction of requests so a slow upstream
+    does not receive double the load.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        transport: Any = None,
+        hedging: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_initial_delay: Optional[float] = None,
+        hedge_min_delay: Optional[float] = None,
+        hedge_max_fraction: Optional[float] = None,
+        latency_tracker: Optional[LatencyTracker] = None
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Upstream base URL (defaults to OPENAI_BASE_URL or the public API)
+            model: Model whose RPM/TPM limits drive rate limiting
+            max_concurrency: Maximum in-flight requests per upstream host
+            timeout: Total request timeout in seconds
+            retry_policy: Retry/backoff policy for transient failures
+            circuit_breaker: Circuit breaker guarding the upstream
+            transport: Optional httpx transport, e.g. a mock server in tests
+            hedging: Whether `hedged_call` sends hedges (default: OPENAI_HEDGING_ENABLED)
+            hedge_percentile: Latency percentile after which a hedge is sent
+            hedge_initial_delay: Hedge threshold until enough latencies are recorded
+            hedge_min_delay: Lower bound of the hedge threshold in seconds
+            hedge_max_fraction: Largest share of requests that may be hedged
+            latency_tracker: Window of recent latencies the threshold is taken from
+        """
+        self.base_url = base_url or settings.OPENAI_BASE_URL or "https://api.openai.com/v1"
+        self.max_concurrency = max_concurrency or settings.OPENAI_MAX_CONCURRENCY
+        self.timeout = timeout or settings.OPENAI_TIMEOUT
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=settings.OPENAI_MAX_RETRIES + 1)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(
+            failure_threshold=settings.OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.OPENAI_CIRCUIT_RESET_TIMEOUT
+        )
+        rpm, tpm = rate_limits_for(model or settings.OPENAI_MODEL)
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.hedging = settings.OPENAI_HEDGING_ENABLED if hedging is None else hedging
+        self.hedge_percentile = hedge_percentile or settings.OPENAI_HEDGE_PERCENTILE
+        self.hedge_initial_delay = (
+            settings.OPENAI_HEDGE_INITIAL_DELAY if hedge_initial_delay is None else hedge_initial_delay
+        )
+        self.hedge_min_delay = settings.OPENAI_HEDGE_MIN_DELAY if hedge_min_delay is None else hedge_min_delay
+        self.hedge_max_fraction = (
+            settings.OPENAI_HEDGE_MAX_FRACTION if hedge_max_fraction is None else hedge_max_fraction
+        )
+        self.latency = latency_tracker or LatencyTracker()
+        self.hedgeable_requests = 0
+        self.hedged_requests = 0
+        self._transport = transport
+        self._http_client = None
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def host(self) -> str:
+        """Host name of the upstream."""
+        return urlparse(self.base_url).netloc
+
+    @property
+    def http_client(self):
+        """Lazily built pooled httpx client shared by all calls."""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self._transport,
+                timeout=httpx.Timeout(self.timeout, connect=min(5.0, self.timeout)),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=30.0
+                )
+            )
+        return self._http_client
+
+    def semaphore_for(self, host: str) -> asyncio.Semaphore:
+        """Return the concurrency semaphore of an upstream host."""
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[host]
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        tokens: int = 0,
+        host: Optional[str] = None
+    ) -> T:
+        """
+        Run an upstream operation under the client's limits and retry policy.
+
+        Args:
+            operation: Zero-argument callable returning a fresh awaitable per attempt
+            tokens: Estimated tokens consumed by the request (prompt plus completion)
+            host: Host whose concurrency limit applies (defaults to the base URL host)
+
+        Returns:
+            The operation's result
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            Exception: The last error if it is not retryable or retries are exhausted
+        """
+        semaphore = self.semaphore_for(host or self.host)
+        attempt = 0
+        while True:
+            attempt += 1
+            self.circuit_breaker.before_call()
+            try:
+                # Inside the try: a caller cancelled while rate limited must release the trial
+                await self.request_bucket.acquire(1)
+                if tokens:
+                    await self.token_bucket.acquire(tokens)
+                async with semaphore:
+                    started = time.monotonic()
+                    result = await asyncio.wait_for(operation(), timeout=self.timeout)
+                    self.latency.observe(time.monotonic() - started)
+            except asyncio.CancelledError:
+                # Abandoned (e.g. a losing hedge): no verdict on upstream health
+                self.circuit_breaker.release_trial()
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.circuit_breaker.record_failure()
+                else:
+                    # Client errors say nothing about upstream health
+                    self.circuit_breaker.record_success()
+                if not retryable or attempt >= self.retry_policy.max_attempts:
+                    raise
+                delay = self.retry_policy.delay(attempt, _retry_after(e))
+                logger.warning(
+                    "Upstream call failed (attempt %d/%d), retrying in %.2fs: %s",
+                    attempt, self.retry_policy.max_attempts, delay, e
+                )
+                await asyncio.sleep(delay)
+                continue
+            self.circuit_breaker.record_success()
+            return result
+
+    @property
+    def hedge_delay(self) -> float:
+        """Seconds to wait for a request before hedging it."""
+        threshold = self.latency.percentile(self.hedge_percentile)
+        return max(self.hedge_initial_delay if threshold is None else threshold, self.hedge_min_delay)
+
+    async def hedged_call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        tokens: int = 0,
+        host: Optional[str] = None
+    ) -> T:
+        """
+        Run an upstream operation like `call`, hedging it when it is slow.
+
+        If the operation has not finished after `hedge_delay`, and fewer than
+        `hedge_max_fraction` of requests have been hedged, a second attempt is started
+        (under the same limits) and the first success is returned; the other attempt is
+        cancelled. Only idempotent operations may be hedged.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            Exception: The first attempt's error if every attempt fails
+        """
+        hedgeable_requests_total.inc()
+        self.hedgeable_requests += 1
+        if not self.hedging:
+            return await self.call(operation, tokens, host)
+        delay = self.hedge_delay
+        hedge_delay_seconds.set(delay)
+        attempts = {asyncio.ensure_future(self.call(operation, tokens, host)): "primary"}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done or self.hedged_requests >= self.hedge_max_fraction * self.hedgeable_requests:
+                return await next(iter(attempts))
+            self.hedged_requests += 1
+            hedged_requests_total.inc()
+            attempts[asyncio.ensure_future(self.call(operation, tokens, host))] = "hedge"
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        hedge_wins_total.inc(winner=attempts[attempt])
+                        return attempt.result()
+            return next(iter(attempts)).result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from src.services.lazy_import import lazy_import
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger(__name__)
+
+
+class VisionFeatureCache:
+    """
+    LRU cache of BLIP vision encoder outputs, keyed by image content digest.
+
+    Captioning an image again with different decoding settings or a text prompt
+    only needs the text decoder, so keeping the encoder's image embeddings turns
+    those requests into a decoder-only pass. Memory use is bounded by `max_bytes`;
+    entries can also be kept on disk (as fp16 by default, halving their size),
+    where the least recently used files are deleted beyond `max_disk_bytes`, and
+    are promoted back to memory on their next use.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        fp16_on_disk: bool = True,
+        max_disk_bytes: int = 1024 * 1024 * 1024
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Memory budget for cached embeddings
+            disk_dir: Optional directory for a second, on-disk cache tier
+            fp16_on_disk: Store on-disk embeddings as float16
+            max_disk_bytes: Budget for on-disk embeddings
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.fp16_on_disk = fp16_on_disk
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: OrderedDict[str, "torch.Tensor"] = OrderedDict()
+        self._bytes = 0
+        # Files of the disk tier by digest, least recently used first, with their sizes
+        self._disk_entries: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        """Memory currently used by cached embeddings."""
+        return self._bytes
+
+    @property
+    def disk_bytes(self) -> int:
+        """Disk space currently used by cached embeddings."""
+        return self._disk_bytes
+
+    @staticmethod
+    def _nbytes(tensor) -> int:
+        return tensor.element_size() * tensor.nelement()
+
+    def _disk_path(self, digest: str) -> str:
+        return os.path.join(self.disk_dir, f"{digest}.pt")
+
+    def _scan_disk(self) -> None:
+        """Index the files left by earlier runs, oldest first, and trim them to the budget."""
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pt"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-len(".pt")], stat.st_size))
+        for _, digest, size in sorted(files):
+            self._disk_entries[digest] = size
+            self._disk_bytes += size
+        self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        """Delete the least recently used files beyond the disk budget."""
+        while self._disk_bytes > self.max_disk_bytes and self._disk_entries:
+            with self._lock:
+                digest, size = self._disk_entries.popitem(last=False)
+                self._disk_bytes -= size
+            try:
+                os.unlink(self._disk_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def get(self, digest: str, device=None, dtype=None):
+        """
+        Return the cached embeddings of an image, or None.
+
+        Args:
+            digest: Content digest of the encoded image
+            device: Device to move embeddings loaded from disk to
+            dtype: Dtype to cast embeddings loaded from disk to
+        """
+        with self._lock:
+            tensor = self._entries.get(digest)
+            if tensor is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return tensor
+        if self.disk_dir and digest in self._disk_entries:
+            with self._lock:
+                if digest in self._disk_entries:
+                    self._disk_entries.move_to_end(digest)
+            try:
+                tensor = torch.load(self._disk_path(digest), map_location=device or "cpu", weights_only=True)
+            except Exception as e:
+                logger.warning("Discarding unreadable vision features %s: %s", digest, e)
+            else:
+                if dtype is not None:
+                    tensor = tensor.to(dtype)
+                self._remember(digest, tensor)
+                with self._lock:
+                    self.hits += 1
+                return tensor
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, digest: str, tensor) -> None:
+        """Cache the embeddings of one image (without a batch dimension)."""
+        # A copy: a view into the encoder's batch output would keep the whole batch alive
+        tensor = tensor.detach().clone()
+        self._remember(digest, tensor)
+        if self.disk_dir and digest not in self._disk_entries:
+            stored = tensor.to("cpu", torch.float16 if self.fp16_on_disk else tensor.dtype)
+            tmp_path = self._disk_path(digest) + ".tmp"
+            torch.save(stored.clone(), tmp_path)
+            os.replace(tmp_path, self._disk_path(digest))
+            size = os.path.getsize(self._disk_path(digest))
+            with self._lock:
+                if digest not in self._disk_entries:
+                    self._disk_entries[digest] = size
+                    self._disk_bytes += size
+            self._trim_disk()
+
+    def clear(self) -> None:
+        """Drop all cached embeddings, e.g. after switching models."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._disk_entries.clear()
+            self._disk_bytes = 0
+        if self.disk_dir:
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith(".pt"):
+                    os.unlink(entry.path)
+
+    def _remember(self, digest: str, tensor) -> None:
+        size = self._nbytes(tensor)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(digest, None)
+            if previous is not None:
+                self._bytes -= self._nbytes(previous)
+            self._entries[digest] = tensor
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._nbytes(evicted)
@@ -15,6 +15,25 @@ document.addEventListener('DOMContentLoaded', () => {
     const audioPlayer = document.querySelector('.audio-player');
     const resultsSection = document.querySelector('.results-section');
 
+    // Upload preferences advertised by the server (see GET /config)
+    const uploadConfig = {
+        targetSize: 384,
+        format: 'image/webp',
+        quality: 0.85,
+        workerUrl: '/static/js/image-worker.js'
+    };
+    const configLoaded = fetch('/config')
+        .then((response) => (response.ok ? response.json() : null))
+        .then((config) => {
+            if (config && config.image) {
+                uploadConfig.targetSize = config.image.target_size;
+                uploadConfig.format = config.image.format;
+                uploadConfig.quality = config.image.quality;
+                uploadConfig.workerUrl = config.image.worker_url;
+            }
+        })
+        .catch(() => {});
+
     // File upload handling
     fileInput.addEventListener('change', async (e) => {
         const file = e.target.files[0];
@@ -46,28 +65,24 @@ document.addEventListener('DOMContentLoaded', () => {
             resultsSection.style.display = 'none';
             resultsSection.classList.remove('visible');
 
-            // Prepare form data
-            const formData = new FormData();
-            formData.append('file', fileInput.files[0]);
-            formData.append('tts', ttsEnabled.checked);
+            // Prepare a downscaled copy of the image
+            const upload = await prepareUpload(fileInput.files[0]);
+            const fields = { tts: ttsEnabled.checked };
             
             if (maxTokens.value) {
-                formData.append('max_tokens', maxTokens.value);
+                fields.max_tokens = maxTokens.value;
             }
             
             if (temperature.value) {
-                formData.append('temperature', temperature.value);
+                fields.temperature = temperature.value;
             }
             
             if (promptTemplate.value) {
-                formData.append('prompt_template', promptTemplate.value);
+                fields.prompt_template = promptTemplate.value;
             }
 
-            // Process image
-            const response = await fetch('/process_with_narrative/', {
-                method: 'POST',
-                body: formData
-            });
+            // Process image, sending only its hash when the server already has it
+            const response = await postImage('/process_with_narrative/', upload, fields);
 
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
@@ -108,6 +123,114 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Image downscaling before upload
+    let imageWorker = null;
+
+    function scaledDimensions(width, height, targetSize) {
+        const scale = Math.min(1, targetSize / Math.min(width, height));
+        return {
+            width: Math.max(1, Math.round(width * scale)),
+            height: Math.max(1, Math.round(height * scale))
+        };
+    }
+
+    function resizeInWorker(file) {
+        if (!imageWorker) {
+            imageWorker = new Worker(uploadConfig.workerUrl);
+        }
+        return new Promise((resolve, reject) => {
+            imageWorker.onmessage = (event) => {
+                if (event.data.error) {
+                    reject(new Error(event.data.error));
+                } else {
+                    resolve(event.data.blob);
+                }
+            };
+            imageWorker.onerror = (event) => reject(new Error(event.message));
+            imageWorker.postMessage({
+                file,
+                targetSize: uploadConfig.targetSize,
+                format: uploadConfig.format,
+                quality: uploadConfig.quality
+            });
+        });
+    }
+
+    async function resizeOnMainThread(file) {
+        const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+        const { width, height } = scaledDimensions(bitmap.width, bitmap.height, uploadConfig.targetSize);
+        const canvas = document.createElement('canvas');
+        canvas.width = width;
+        canvas.height = height;
+        canvas.getContext('2d').drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        const encode = (type) => new Promise((resolve) => canvas.toBlob(resolve, type, uploadConfig.quality));
+        const blob = await encode(uploadConfig.format);
+        return blob && blob.type === uploadConfig.format ? blob : encode('image/jpeg');
+    }
+
+    async function prepareUpload(file) {
+        await configLoaded;
+        try {
+            const canUseWorker = typeof Worker !== 'undefined' && typeof OffscreenCanvas !== 'undefined';
+            const blob = canUseWorker ? await resizeInWorker(file) : await resizeOnMainThread(file);
+            // Keep the original when re-encoding would not make it smaller
+            if (!blob || blob.size >= file.size) {
+                return file;
+            }
+            const extension = blob.type === 'image/webp' ? '.webp' : '.jpg';
+            const baseName = file.name.replace(/\.[^.]+$/, '');
+            return new File([blob], baseName + extension, { type: blob.type });
+        } catch (error) {
+            console.warn('Image downscaling failed, uploading original:', error);
+            return file;
+        }
+    }
+
+    // Hash-first upload: skip sending bytes the server already stores
+    async function sha256Hex(blob) {
+        if (!window.crypto || !window.crypto.subtle) {
+            return null; // SubtleCrypto needs a secure context
+        }
+        const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function isStored(imageHash) {
+        try {
+            const response = await fetch(`/images/${imageHash}`);
+            return response.ok;
+        } catch (error) {
+            return false;
+        }
+    }
+
+    async function postImage(url, upload, fields) {
+        const send = (imageHash) => {
+            const formData = new FormData();
+            if (imageHash) {
+                formData.append('image_hash', imageHash);
+            } else {
+                formData.append('file', upload, upload.name);
+            }
+            for (const [name, value] of Object.entries(fields)) {
+                formData.append(name, value);
+            }
+            return fetch(url, { method: 'POST', body: formData });
+        };
+
+        const imageHash = await sha256Hex(upload).catch(() => null);
+        if (imageHash && await isStored(imageHash)) {
+            const response = await send(imageHash);
+            // The stored copy may have expired in between: upload it after all
+            if (response.status !== 404) {
+                return response;
+            }
+        }
+        return send(null);
+    }
+
     // Helper functions
     function showError(message) {
         errorMessage.textContent = message;
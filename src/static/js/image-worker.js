@@ -0,0 +1,37 @@
+// Downscales and re-encodes images off the main thread before upload.
+// Receives {file, targetSize, format, quality}; replies with {blob, width, height} or {error}.
+
+function scaledDimensions(width, height, targetSize) {
+    // Scale so the shorter side matches what the captioning model consumes
+    const scale = Math.min(1, targetSize / Math.min(width, height));
+    return {
+        width: Math.max(1, Math.round(width * scale)),
+        height: Math.max(1, Math.round(height * scale))
+    };
+}
+
+async function resizeImage({ file, targetSize, format, quality }) {
+    const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+    const { width, height } = scaledDimensions(bitmap.width, bitmap.height, targetSize);
+
+    const canvas = new OffscreenCanvas(width, height);
+    const context = canvas.getContext('2d');
+    context.imageSmoothingQuality = 'high';
+    context.drawImage(bitmap, 0, 0, width, height);
+    bitmap.close();
+
+    let blob = await canvas.convertToBlob({ type: format, quality });
+    if (blob.type !== format) {
+        // The browser cannot encode the preferred format (e.g. WebP); use JPEG
+        blob = await canvas.convertToBlob({ type: 'image/jpeg', quality });
+    }
+    return { blob, width, height };
+}
+
+self.addEventListener('message', async (event) => {
+    try {
+        self.postMessage(await resizeImage(event.data));
+    } catch (error) {
+        self.postMessage({ error: error.message });
+    }
+});
@@ -1,8 +1,13 @@
 import pytest
 import os
 import shutil
+import tempfile
 from src.config import settings
 
+# Keep the near-duplicate index the app saves on shutdown out of the working tree;
+# set before any test imports the app
+settings.IMAGE_INDEX_PATH = os.path.join(tempfile.mkdtemp(prefix="image-index-"), "image_index.npz")
+
 pytest_plugins = ["pytest_asyncio"]
 
 @pytest.fixture(scope="session", autouse=True)
@@ -33,6 +38,13 @@ def test_cleanup():
         shutil.rmtree(settings.AUDIO_DIR)
     os.makedirs(settings.AUDIO_DIR, exist_ok=True)
 
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Give every test a fresh per-client rate limit allowance."""
+    from src.api.main import rate_limiter
+    rate_limiter.backend.reset()
+    yield
+
 @pytest.fixture(scope="session")
 def event_loop_policy():
     """Return an event loop policy for the test session."""
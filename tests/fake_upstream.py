@@ -0,0 +1,117 @@
+"""
+Local stand-in for the OpenAI chat completions API that injects latency.
+
+Use it in-process through `FakeUpstream.transport()`, or run it as a server to
+exercise deadlines and hedging by hand:
+
+    FAKE_UPSTREAM_LATENCY=0.2 FAKE_UPSTREAM_SLOW_RATE=0.05 FAKE_UPSTREAM_SLOW_LATENCY=10 \
+        uvicorn tests.fake_upstream:app --port 8080
+
+and point the service at it with OPENAI_BASE_URL=http://localhost:8080/v1.
+"""
+import asyncio
+import json
+import os
+import random
+from typing import Iterable, Optional
+import httpx
+from fastapi import FastAPI, Request
+
+
+class FakeUpstream:
+    """Chat completions endpoint whose response times are scripted or drawn at random."""
+
+    def __init__(
+        self,
+        latencies: Iterable[float] = (),
+        latency: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        content: str = "Fake narrative",
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the fake.
+
+        Args:
+            latencies: Latencies of the first requests, in order
+            latency: Latency of later requests
+            slow_rate: Probability that a later request takes `slow_latency` instead
+            slow_latency: Latency of slow requests
+            content: Narrative returned by every choice
+            seed: Seed of the slow request draws
+        """
+        self.latencies = list(latencies)
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.content = content
+        self.requests = 0
+        self.completed = 0
+        self.cancelled = 0
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls) -> "FakeUpstream":
+        """Configure from FAKE_UPSTREAM_LATENCY, _SLOW_RATE and _SLOW_LATENCY."""
+        return cls(
+            latency=float(os.getenv("FAKE_UPSTREAM_LATENCY", "0.1")),
+            slow_rate=float(os.getenv("FAKE_UPSTREAM_SLOW_RATE", "0")),
+            slow_latency=float(os.getenv("FAKE_UPSTREAM_SLOW_LATENCY", "0"))
+        )
+
+    def _next_latency(self) -> float:
+        if self.latencies:
+            return self.latencies.pop(0)
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            return self.slow_latency
+        return self.latency
+
+    async def complete(self, payload: dict) -> dict:
+        """Answer a chat completion request after the injected latency."""
+        self.requests += 1
+        try:
+            await asyncio.sleep(self._next_latency())
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        self.completed += 1
+        return {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload.get("model", "fake"),
+            "choices": [
+                {
+                    "index": i,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": self.content}
+                }
+                for i in range(payload.get("n") or 1)
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        }
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        """httpx handler serving POST .../chat/completions."""
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return httpx.Response(404, json={"error": {"message": "Not found"}})
+        return httpx.Response(200, json=await self.complete(json.loads(request.content)))
+
+    def transport(self) -> httpx.MockTransport:
+        """In-process transport for an httpx client or UpstreamClient."""
+        return httpx.MockTransport(self.handler)
+
+
+def create_app(upstream: FakeUpstream) -> FastAPI:
+    """Serve a fake upstream over HTTP at /v1/chat/completions."""
+    fake_app = FastAPI(title="Fake OpenAI upstream")
+
+    @fake_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> dict:
+        return await upstream.complete(await request.json())
+
+    return fake_app
+
+
+app = create_app(FakeUpstream.from_env())
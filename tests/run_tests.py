@@ -39,7 +39,7 @@ def run_tests(stage=None):
     Run tests with optional stage selection.
     
     Args:
-        stage: Optional stage to run ('unit', 'integration', 'e2e', or None for all)
+        stage: Optional stage to run ('unit', 'cli', 'integration', 'e2e', or None for all)
     """
     # Get the project root directory
     root_dir = Path(__file__).parent.parent
@@ -57,6 +57,10 @@ def run_tests(stage=None):
             "name": "Unit Tests",
             "path": "tests/test_services",
         },
+        "cli": {
+            "name": "CLI Tests",
+            "path": "tests/test_cli.py",
+        },
         "integration": {
             "name": "API Integration Tests",
             "path": "tests/test_api",
@@ -79,7 +83,7 @@ def run_tests(stage=None):
     
     # Run all stages in order
     failed = False
-    for stage_name in ["unit", "integration", "e2e"]:
+    for stage_name in ["unit", "cli", "integration", "e2e"]:
         stage_success = run_test_stage(test_stages[stage_name])
         if not stage_success:
             failed = True
@@ -90,8 +94,8 @@ def run_tests(stage=None):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run Visual Storyteller tests")
-    parser.add_argument("--stage", choices=["unit", "integration", "e2e"],
-                      help="Run specific test stage (unit, integration, or e2e)")
+    parser.add_argument("--stage", choices=["unit", "cli", "integration", "e2e"],
+                      help="Run specific test stage (unit, cli, integration, or e2e)")
     args = parser.parse_args()
     
     run_tests(args.stage)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+from src.api.admission import (
+    AdmissionControlMiddleware,
+    AdmissionController,
+    AdmissionRejected,
+    PriorityClass
+)
+from src.api.main import app
+
+def _controller(capacity=1, max_queue=4, timeout=10.0, service_time=0.01):
+    routes = [
+        (("/health",), PriorityClass("critical", 0, capacity, 0, timeout, service_time, bypass=True)),
+        (("/process",), PriorityClass("processing", 2, capacity, max_queue, timeout, service_time)),
+        (("/",), PriorityClass("interactive", 1, capacity, max_queue, timeout, service_time)),
+    ]
+    return AdmissionController(capacity=capacity, routes=routes)
+
+@pytest.mark.asyncio
+async def test_higher_priority_waiters_are_admitted_first():
+    """Test that a freed slot goes to the most important waiting class."""
+    controller = _controller()
+    processing = controller.classify("/process_with_narrative/")
+    interactive = controller.classify("/audio/a.mp3")
+    order = []
+    
+    await controller.acquire(processing)
+    
+    async def request(cls, name):
+        await controller.acquire(cls)
+        order.append(name)
+        controller.release(cls)
+    
+    waiting = [
+        asyncio.create_task(request(processing, "processing")),
+        asyncio.create_task(request(interactive, "interactive")),
+    ]
+    await asyncio.sleep(0)
+    controller.release(processing)
+    await asyncio.gather(*waiting)
+    
+    assert order == ["interactive", "processing"]
+    assert controller.running == 0
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected():
+    """Test that requests beyond the queue bound are shed immediately."""
+    controller = _controller(max_queue=1)
+    processing = controller.classify("/process/")
+    await controller.acquire(processing)
+    queued = asyncio.create_task(controller.acquire(processing))
+    await asyncio.sleep(0)
+    
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await controller.acquire(processing)
+    
+    assert exc_info.value.reason == "queue_full"
+    assert exc_info.value.retry_after >= 1
+    queued.cancel()
+
+@pytest.mark.asyncio
+async def test_request_that_cannot_meet_deadline_is_shed():
+    """Test that a request is rejected when expected wait exceeds its timeout."""
+    controller = _controller(service_time=5.0)
+    processing = controller.classify("/process/")
+    await controller.acquire(processing)
+    
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await controller.acquire(processing, timeout=1.0)
+    
+    assert exc_info.value.reason == "deadline"
+
+@pytest.mark.asyncio
+async def test_queued_request_times_out():
+    """Test that a queued request is shed once its deadline passes."""
+    controller = _controller(service_time=0.01)
+    processing = controller.classify("/process/")
+    await controller.acquire(processing)
+    
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire(processing, timeout=0.05)
+    
+    assert len(processing.waiters) == 0
+
+@pytest.mark.asyncio
+async def test_bypass_class_is_never_queued():
+    """Test that critical routes skip admission even when capacity is exhausted."""
+    controller = _controller(max_queue=0)
+    await controller.acquire(controller.classify("/process/"))
+    
+    assert await controller.acquire(controller.classify("/health")) == 0.0
+
+def test_middleware_returns_503_with_retry_after():
+    """Test that shed requests get a 503 JSON response with Retry-After."""
+    async def endpoint(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+    
+    controller = _controller(max_queue=0)
+    controller.running = controller.capacity
+    client = TestClient(AdmissionControlMiddleware(endpoint, controller))
+    
+    response = client.get("/process/")
+    
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+    assert response.json()["detail"]["reason"] == "queue_full"
+    assert client.get("/health").text == "ok"
+
+def test_metrics_expose_queue_wait_times():
+    """Test that admitted requests report queue wait in headers and metrics."""
+    client = TestClient(app)
+    
+    response = client.get("/config")
+    metrics_response = client.get("/metrics")
+    
+    assert response.headers["server-timing"].startswith("queue;dur=")
+    assert metrics_response.status_code == 200
+    assert "server-timing" not in metrics_response.headers
+    assert 'admission_queue_wait_seconds_count{priority_class="interactive"}' in metrics_response.text
+
+@pytest.mark.asyncio
+async def test_caption_tier_follows_admission_queue():
+    """Test that processing requests queued by the middleware step captioning down a tier."""
+    import io
+    import httpx
+    import torch
+    from unittest.mock import Mock
+    from fastapi import FastAPI
+    from PIL import Image
+    from src.services.caption_tiers import CaptionTier, TierController
+    from src.services.captioning_service import CaptioningService
+    controller = _controller(capacity=2)
+    processor = Mock(return_value={"pixel_values": torch.zeros((1, 3, 224, 224))})
+    processor.decode.return_value = "a test caption"
+    model = Mock()
+    model.generate.return_value = [torch.tensor([1, 2, 3])]
+    captioning = CaptioningService(
+        processor=processor, model=model,
+        tier_controller=TierController(
+            [CaptionTier("beam", num_beams=3), CaptionTier("short", max_new_tokens=12)],
+            # Reached only while all four requests are in: two served, two queued
+            queue_thresholds=[4], latency_target=0,
+            load=lambda: controller.queue_depth("processing")
+        )
+    )
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color="red").save(buffer, format="PNG")
+    arrived = asyncio.Event()
+    processing_app = FastAPI()
+    
+    @processing_app.post("/process/")
+    async def process():
+        await arrived.wait()
+        return {"caption_tier": (await captioning.caption(buffer.getvalue())).tier}
+    
+    transport = httpx.ASGITransport(app=AdmissionControlMiddleware(processing_app, controller))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        requests = [asyncio.create_task(client.post("/process/")) for _ in range(4)]
+        while controller.queue_depth("processing") < 4:
+            await asyncio.sleep(0.001)
+        arrived.set()
+        responses = await asyncio.gather(*requests)
+    
+    assert sorted(response.json()["caption_tier"] for response in responses) == [
+        "beam", "beam", "short", "short"
+    ]
@@ -66,4 +66,23 @@ def test_process_corrupted_image(client, tmp_path):
     
     assert response.status_code == 500
     assert "detail" in response.json()
-    assert "Failed to process image" in response.json()["detail"] 
\ No newline at end of file
+    assert "Failed to process image" in response.json()["detail"] 
+def test_list_models(client):
+    """Test that the active model and registered variants are reported."""
+    response = client.get("/models")
+    
+    assert response.status_code == 200
+    assert "active" in response.json()
+    assert isinstance(response.json()["variants"], list)
+
+def test_activate_model_requires_admin_key(client, monkeypatch):
+    """Test that switching models is refused without the admin key."""
+    from src.config import settings
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "secret")
+    
+    assert client.post("/models/blip-base/activate").status_code == 403
+    assert client.post(
+        "/models/blip-base/activate", headers={"X-Admin-Key": "wrong"}
+    ).status_code == 403
+    response = client.post("/models/missing/activate", headers={"X-Admin-Key": "secret"})
+    assert response.status_code == 404
@@ -4,6 +4,8 @@ from fastapi.testclient import TestClient
 from pathlib import Path
 from PIL import Image
 from src.api.main import app
+from src.config import settings
+from src.services.captioning_service import CaptionResult
 from tests.test_api.fixtures import realistic_image
 
 @pytest.fixture
@@ -93,4 +95,77 @@ def test_concurrent_uploads(client, realistic_image):
     # Verify all uploads were successful and unique
     assert len(paths) == 5
     assert len(set(paths)) == 5  # All paths should be unique
-    assert all(os.path.exists(path) for path in paths) 
\ No newline at end of file
+    assert all(os.path.exists(path) for path in paths) 
+def test_client_config(client):
+    """Test that the server advertises its preferred upload resolution and encoding."""
+    response = client.get("/config")
+    
+    assert response.status_code == 200
+    image_config = response.json()["image"]
+    assert image_config["target_size"] == settings.UPLOAD_TARGET_SIZE
+    assert image_config["format"] == settings.UPLOAD_IMAGE_FORMAT
+    assert 0 < image_config["quality"] <= 1
+    assert image_config["worker_url"].startswith("/static/js/image-worker.")
+    
+    # The advertised worker script is served
+    assert client.get(image_config["worker_url"]).status_code == 200
+
+def test_upload_downscaled_webp(client, tmp_path):
+    """Test uploading a client-side downscaled WebP image."""
+    webp_image = tmp_path / "upload.webp"
+    Image.new('RGB', (512, 384), color='blue').save(webp_image, "WEBP", quality=85)
+    
+    with open(webp_image, "rb") as f:
+        response = client.post(
+            "/upload/",
+            files={"file": ("upload.webp", f, "image/webp")}
+        )
+    
+    assert response.status_code == 200
+    assert response.json()["file_path"].endswith(".webp")
+
+def test_process_by_known_image_hash(client, realistic_image):
+    """Test that a stored image is processed by its content hash without re-uploading."""
+    import hashlib
+    from unittest.mock import AsyncMock, patch
+    from src.api import main
+    image_hash = hashlib.sha256(Path(realistic_image).read_bytes()).hexdigest()
+    
+    with patch.object(
+        main.captioning_service, "caption", AsyncMock(return_value=CaptionResult(["a green field"]))
+    ):
+        assert client.get(f"/images/{'0' * 64}").status_code == 404
+        with open(realistic_image, "rb") as f:
+            uploaded = client.post("/process/", files={"file": ("scene.jpg", f, "image/jpeg")})
+        
+        lookup = client.get(f"/images/{image_hash}")
+        response = client.post("/process/", data={"image_hash": image_hash})
+    
+    assert lookup.status_code == 200
+    assert lookup.json()["image_hash"] == image_hash
+    assert response.status_code == 200
+    assert response.json()["file_path"] == uploaded.json()["file_path"]
+    assert response.json()["caption"] == "a green field"
+
+def test_process_unknown_hash_or_no_image(client):
+    """Test that an unknown hash asks for the upload and a missing image is rejected."""
+    assert client.post("/process/", data={"image_hash": "f" * 64}).status_code == 404
+    assert client.post("/process/", data={}).status_code == 422
+
+@pytest.mark.parametrize("persistence, stored", [("sync", True), ("background", True), ("ephemeral", False)])
+def test_process_from_memory(client, realistic_image, monkeypatch, persistence, stored):
+    """Test that uploads are captioned from memory and stored while processing, after the response or never."""
+    from unittest.mock import AsyncMock, patch
+    from src.api import main
+    monkeypatch.setattr(settings, "UPLOAD_PERSISTENCE", persistence)
+    content = Path(realistic_image).read_bytes()
+    
+    with patch.object(
+        main.captioning_service, "caption", AsyncMock(return_value=CaptionResult(["a green field"]))
+    ) as caption:
+        response = client.post("/process/", files={"file": ("scene.jpg", content, "image/jpeg")})
+    
+    assert response.status_code == 200
+    assert caption.call_args.args[0] == content
+    file_path = response.json()["file_path"]
+    assert (file_path is not None and os.path.exists(file_path)) == stored
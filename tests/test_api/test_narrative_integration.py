@@ -1,8 +1,12 @@
 import os
 import time
 import pytest
+from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
+from src.api import main
 from src.api.main import app
+from src.services.captioning_service import CaptionResult
+from src.services.narrative_service import NarrativeCompletion
 from tests.test_api.fixtures import realistic_image
 
 @pytest.fixture
@@ -134,4 +138,131 @@ def test_narrative_performance(client, realistic_image):
     # Verify we got meaningful content despite performance requirements
     narrative = response.json()["narrative"]
     assert len(narrative.split()) >= 20
-    assert "." in narrative  # Complete sentences 
\ No newline at end of file
+    assert "." in narrative  # Complete sentences 
+def test_multiple_alternatives(client, realistic_image):
+    """Test that ranked caption and narrative alternatives are returned."""
+    with patch.object(
+        main.captioning_service, "caption",
+        AsyncMock(return_value=CaptionResult(["a green field", "a meadow under a blue sky"], tier="beam"))
+    ) as caption, patch.object(
+        main.narrative_service, "complete",
+        AsyncMock(return_value=NarrativeCompletion(["First story.", "Second story."]))
+    ) as complete:
+        with open(realistic_image, "rb") as f:
+            response = client.post(
+                "/process_with_narrative/",
+                files={"file": ("scene.jpg", f, "image/jpeg")},
+                data={"num_captions": "2", "num_narratives": "2"}
+            )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["captions"] == ["a green field", "a meadow under a blue sky"]
+    assert data["caption"] == "a green field"
+    assert data["narratives"] == ["First story.", "Second story."]
+    assert data["narrative"] == "First story."
+    assert data["caption_tier"] == "beam"
+    assert caption.call_args.kwargs["num_captions"] == 2
+    assert complete.call_args.args[0] == "a green field"
+    assert complete.call_args.kwargs["num_narratives"] == 2
+
+def test_too_many_alternatives_rejected(client, realistic_image):
+    """Test that alternative counts above the limit are rejected."""
+    with open(realistic_image, "rb") as f:
+        response = client.post(
+            "/process_with_narrative/",
+            files={"file": ("scene.jpg", f, "image/jpeg")},
+            data={"num_captions": "100"}
+        )
+    
+    assert response.status_code == 422
+
+def test_conditional_prompts_enrich_narrative_input(client, realistic_image):
+    """Test that completed caption prompts are returned and fed to the narrative."""
+    with patch.object(
+        main.captioning_service, "caption", AsyncMock(return_value=CaptionResult(["a green field"]))
+    ), patch.object(
+        main.captioning_service, "generate_conditional_captions",
+        AsyncMock(return_value=["a photograph of a sunny meadow", "the weather is clear"])
+    ) as generate_conditional, patch.object(
+        main.narrative_service, "complete", AsyncMock(return_value=NarrativeCompletion(["A story."]))
+    ) as complete:
+        with open(realistic_image, "rb") as f:
+            response = client.post(
+                "/process_with_narrative/",
+                files={"file": ("scene.jpg", f, "image/jpeg")},
+                data={"prompts": ["a photograph of", "the weather is"]}
+            )
+    
+    assert response.status_code == 200
+    assert response.json()["scene_details"] == ["a photograph of a sunny meadow", "the weather is clear"]
+    assert generate_conditional.call_args.args[1] == ["a photograph of", "the weather is"]
+    assert complete.call_args.args[0] == (
+        "a green field. a photograph of a sunny meadow. the weather is clear"
+    )
+
+def test_too_many_prompts_rejected(client, realistic_image):
+    """Test that the number of caption prompts is limited."""
+    with open(realistic_image, "rb") as f:
+        response = client.post(
+            "/process_with_narrative/",
+            files={"file": ("scene.jpg", f, "image/jpeg")},
+            data={"prompts": ["a photograph of"] * 20}
+        )
+    
+    assert response.status_code == 422
+
+def test_slow_upstream_falls_back_within_deadline(client, realistic_image, monkeypatch):
+    """Test that a narrative missing its deadline is replaced by a local one."""
+    from src.config import settings
+    from src.services.upstream_client import UpstreamClient
+    from tests.fake_upstream import FakeUpstream
+    fake = FakeUpstream(latency=2.0)
+    upstream = UpstreamClient(base_url="http://fake-openai.local/v1", transport=fake.transport(), hedging=False)
+    monkeypatch.setattr(settings, "NARRATIVE_DEADLINE", 0.1)
+    monkeypatch.setattr(settings, "NARRATIVE_FALLBACK", "local")
+    
+    with patch.object(
+        main.captioning_service, "caption", AsyncMock(return_value=CaptionResult(["a green field"]))
+    ), patch.object(main.narrative_service, "upstream", upstream), \
+            patch.object(main.narrative_service, "_client", None), \
+            patch.object(main.narrative_service, "_api_key", "test_key"):
+        started = time.monotonic()
+        with open(realistic_image, "rb") as f:
+            response = client.post(
+                "/process_with_narrative/",
+                files={"file": ("scene.jpg", f, "image/jpeg")}
+            )
+    
+    assert response.status_code == 200
+    assert time.monotonic() - started < 1.5
+    data = response.json()
+    assert data["narrative_source"] == "local"
+    assert "a green field" in data["narrative"]
+
+def test_duplicate_image_reuses_narrative(client, realistic_image, monkeypatch):
+    """Test that a repeat image with the same scene is served the stored narrative."""
+    from src.config import settings
+    from src.services.image_index import ImageIndex
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_REUSE_NARRATIVE", True)
+    
+    with patch.object(main, "image_index", ImageIndex()), patch.object(
+        main.captioning_service, "caption", AsyncMock(return_value=CaptionResult(["a green field"]))
+    ), patch.object(
+        main.narrative_service, "complete",
+        AsyncMock(return_value=NarrativeCompletion(["A story."], source="upstream"))
+    ) as complete:
+        responses = []
+        for _ in range(2):
+            with open(realistic_image, "rb") as f:
+                responses.append(client.post(
+                    "/process_with_narrative/",
+                    files={"file": ("scene.jpg", f, "image/jpeg")}
+                ))
+    
+    assert [response.json()["narrative_source"] for response in responses] == ["upstream", "cache"]
+    assert responses[1].json()["narrative"] == "A story."
+    assert complete.call_count == 1
+    timing = responses[1].headers["Server-Timing"]
+    assert "caption;dur=" in timing
+    assert 'narrative;dur=' in timing and 'desc="cached"' in timing
@@ -0,0 +1,86 @@
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from src.api import main
+from src.api.main import app
+from src.services.captioning_service import CaptionResult
+from src.services.narrative_service import NarrativeCompletion
+from tests.test_api.fixtures import realistic_image
+
+@pytest.fixture
+def client():
+    with patch.object(main, "api_keys", frozenset({"client-a", "client-b"})):
+        yield TestClient(app)
+
+@pytest.fixture
+def mocked_pipeline():
+    with patch.object(
+        main.captioning_service, "caption", AsyncMock(return_value=CaptionResult(["a green field"]))
+    ), patch.object(
+        main.narrative_service, "complete",
+        AsyncMock(return_value=NarrativeCompletion(["A story."], prompt_tokens=90, completion_tokens=30))
+    ):
+        yield
+
+def _process(client, image_path, api_key):
+    with open(image_path, "rb") as f:
+        return client.post(
+            "/process_with_narrative/",
+            files={"file": ("scene.jpg", f, "image/jpeg")},
+            headers={"X-API-Key": api_key}
+        )
+
+def test_client_over_limit_gets_429(client, realistic_image, mocked_pipeline):
+    """Test that a client exceeding its burst is rejected while others are not."""
+    with patch.object(main.rate_limiter, "burst", 2):
+        statuses = [_process(client, realistic_image, "client-a").status_code for _ in range(3)]
+        rejected = _process(client, realistic_image, "client-a")
+        other = _process(client, realistic_image, "client-b")
+    
+    assert statuses == [200, 200, 429]
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) >= 1
+    assert other.status_code == 200
+
+def test_rotating_unknown_api_keys_is_still_limited(client, realistic_image, mocked_pipeline):
+    """Test that a new made-up key per request does not reset the caller's allowance."""
+    with patch.object(main.rate_limiter, "burst", 2):
+        statuses = [_process(client, realistic_image, f"made-up-{i}").status_code for i in range(3)]
+    
+    assert statuses == [200, 200, 429]
+
+@pytest.mark.asyncio
+async def test_clients_behind_a_proxy_are_limited_separately(realistic_image, mocked_pipeline):
+    """Test that the forwarded client address, not the proxy's, identifies the caller."""
+    with open(realistic_image, "rb") as f:
+        image = f.read()
+    
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 40000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as proxied:
+        async def process(forwarded_for):
+            response = await proxied.post(
+                "/process_with_narrative/",
+                files={"file": ("scene.jpg", image, "image/jpeg")},
+                headers={"X-Forwarded-For": forwarded_for}
+            )
+            return response.status_code
+        
+        with patch.object(main.rate_limiter, "burst", 1):
+            statuses = [await process("203.0.113.7"), await process("198.51.100.2")]
+            # A spoofed entry in front of the proxy's does not change the identity
+            statuses.append(await process("192.0.2.99, 203.0.113.7"))
+    
+    assert statuses == [200, 200, 429]
+
+def test_usage_is_recorded_per_client(client, realistic_image, mocked_pipeline):
+    """Test that images and tokens are added to the caller's ledger."""
+    _process(client, realistic_image, "client-a")
+    _process(client, realistic_image, "client-a")
+    
+    usage = client.get("/usage", headers={"X-API-Key": "client-a"}).json()
+    
+    assert usage["requests"] == 2
+    assert usage["images"] == 2
+    assert usage["tokens"] == 240
+    assert client.get("/usage", headers={"X-API-Key": "client-b"}).json()["requests"] == 0
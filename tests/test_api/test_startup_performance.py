@@ -0,0 +1,60 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+# Budget for `import src.api.main`, in milliseconds. Eager imports of torch and
+# transformers put this at several seconds; without them it is well under one.
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "2000"))
+
+HEAVY_MODULES = ("torch", "transformers", "openai", "gtts")
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+def _profile_import(module: str) -> tuple[dict[str, int], str]:
+    """Import a module in a fresh interpreter with -X importtime.
+    
+    Returns:
+        tuple: Cumulative import time in microseconds per module, and raw stderr
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(PROJECT_ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    
+    timings = {}
+    pattern = re.compile(r"^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.+)$")
+    for line in result.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            timings[match.group(2).strip()] = int(match.group(1))
+    return timings, result.stderr
+
+@pytest.mark.performance
+def test_api_import_does_not_load_heavy_dependencies():
+    """Test that importing the API does not import ML or upstream client libraries."""
+    timings, _ = _profile_import("src.api.main")
+    
+    loaded = [name for name in HEAVY_MODULES if name in timings]
+    assert loaded == [], f"Heavy modules imported at startup: {loaded}"
+
+@pytest.mark.performance
+def test_api_import_time_within_budget():
+    """Test that importing the API stays within the startup time budget."""
+    timings, stderr = _profile_import("src.api.main")
+    
+    assert "src.api.main" in timings, stderr
+    import_time_ms = timings["src.api.main"] / 1000
+    assert import_time_ms <= IMPORT_TIME_BUDGET_MS, (
+        f"Importing src.api.main took {import_time_ms:.0f}ms "
+        f"(budget {IMPORT_TIME_BUDGET_MS}ms)"
+    )
@@ -0,0 +1,92 @@
+import gzip
+import re
+import pytest
+from fastapi.testclient import TestClient
+from src.api.main import app, static_assets
+from src.api.static_assets import StaticAssetPipeline, brotli
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _asset_urls(html: str) -> list[str]:
+    return re.findall(r'(?:src|href)="(/static/[^"]+)"', html)
+
+def test_index_references_fingerprinted_assets(client):
+    """Test that index.html points at content-hashed asset URLs."""
+    response = client.get("/")
+    
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    urls = _asset_urls(response.text)
+    assert static_assets.url_for("css/styles.css") in urls
+    assert static_assets.url_for("js/app.js") in urls
+    assert all(re.search(r"\.[0-9a-f]{12}\.(css|js)$", url) for url in urls)
+
+def test_fingerprinted_asset_is_immutable(client):
+    """Test that fingerprinted assets are cached forever and compressed."""
+    url = static_assets.url_for("js/app.js")
+    
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "addEventListener" in response.text
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_preferred_when_accepted(client):
+    """Test that brotli is served when the client accepts it."""
+    url = static_assets.url_for("css/styles.css")
+    
+    response = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+    
+    assert response.headers["content-encoding"] == "br"
+
+def test_identity_when_compression_not_accepted(client):
+    """Test that uncompressed bytes are served to clients without compression support."""
+    response = client.get("/static/css/styles.css", headers={"Accept-Encoding": "identity"})
+    
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["cache-control"] == "no-cache"
+
+def test_static_conditional_get(client):
+    """Test that a matching ETag revalidates with 304."""
+    url = static_assets.url_for("css/styles.css")
+    etag = client.get(url, headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    
+    response = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    
+    assert response.status_code == 304
+
+def test_unknown_static_file_falls_back(client):
+    """Test that files outside the pipeline are still looked up on disk."""
+    response = client.get("/static/js/missing.js")
+    assert response.status_code == 404
+
+def test_json_responses_are_gzipped(client):
+    """Test that large JSON API responses are gzip compressed."""
+    response = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "paths" in response.json()
+
+def test_pipeline_precomputes_variants(tmp_path):
+    """Test fingerprinting, compression and HTML rewriting on a standalone pipeline."""
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "main.js").write_text("console.log('hello');\n" * 50)
+    (tmp_path / "index.html").write_text('<script src="/static/js/main.js"></script>')
+    
+    pipeline = StaticAssetPipeline(tmp_path)
+    pipeline.build()
+    
+    asset, fingerprinted = pipeline.lookup("js/main.js")
+    assert not fingerprinted
+    assert gzip.decompress(asset.variants["gzip"]) == asset.variants["identity"]
+    assert pipeline.lookup(asset.fingerprinted_path) == (asset, True)
+    
+    html, _ = pipeline.lookup("index.html")
+    assert pipeline.url_for("js/main.js").encode() in html.variants["identity"]
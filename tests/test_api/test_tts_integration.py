@@ -1,7 +1,9 @@
+import hashlib
 import os
 import time
 import pytest
 from fastapi.testclient import TestClient
+from src.api import main
 from src.api.main import app
 from src.config import settings
 from tests.test_api.fixtures import realistic_image
@@ -31,7 +33,7 @@ def test_process_with_tts(client, realistic_image):
     
     # Verify files exist
     assert os.path.exists(data["file_path"])
-    audio_path = os.path.join(settings.AUDIO_DIR, data["audio_file"])
+    audio_path = main.tts_service.storage.path_for(data["audio_file"])
     assert os.path.exists(audio_path)
     assert data["audio_file"].endswith(".mp3")
 
@@ -47,7 +49,7 @@ def test_tts_with_custom_language(client, realistic_image):
     assert response.status_code == 200
     data = response.json()
     assert "audio_file" in data
-    audio_path = os.path.join(settings.AUDIO_DIR, data["audio_file"])
+    audio_path = main.tts_service.storage.path_for(data["audio_file"])
     assert os.path.exists(audio_path)
 
 def test_tts_disabled(client, realistic_image):
@@ -193,7 +195,7 @@ def test_end_to_end_workflow(client, realistic_image):
     
     # Verify file paths are unique and exist
     assert os.path.exists(data["file_path"])
-    audio_path = os.path.join(settings.AUDIO_DIR, data["audio_file"])
+    audio_path = main.tts_service.storage.path_for(data["audio_file"])
     assert os.path.exists(audio_path)
     assert data["audio_file"].endswith(".mp3")
     
@@ -228,4 +230,202 @@ def test_end_to_end_workflow(client, realistic_image):
     assert "audio_file" not in data
     assert "file_path" in data
     assert "caption" in data
-    assert "narrative" in data 
\ No newline at end of file
+    assert "narrative" in data
+
+
+@pytest.fixture
+def stored_audio():
+    """Write an audio file with a content-addressed name straight to the audio directory."""
+    filename = f"audio_{'ab' * 32}.mp3"
+    content = bytes(range(256)) * 40
+    with open(os.path.join(settings.AUDIO_DIR, filename), "wb") as f:
+        f.write(content)
+    return filename, content
+
+def test_audio_range_request(client, stored_audio):
+    """Test that a byte range is served as 206 Partial Content."""
+    filename, content = stored_audio
+    
+    response = client.get(f"/audio/{filename}", headers={"Range": "bytes=100-199"})
+    
+    assert response.status_code == 206
+    assert response.content == content[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+    assert response.headers["accept-ranges"] == "bytes"
+
+def test_audio_strong_etag_and_immutable_caching(client, stored_audio):
+    """Test that audio carries a content-hash ETag and immutable Cache-Control."""
+    filename, content = stored_audio
+    
+    response = client.get(f"/audio/{filename}")
+    
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["etag"] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert "immutable" in response.headers["cache-control"]
+
+def test_audio_conditional_get(client, stored_audio):
+    """Test that a matching If-None-Match returns 304 without a body."""
+    filename, _ = stored_audio
+    etag = client.get(f"/audio/{filename}").headers["etag"]
+    
+    response = client.get(f"/audio/{filename}", headers={"If-None-Match": etag})
+    
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    
+    # A stale ETag gets the full file again
+    response = client.get(f"/audio/{filename}", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+def test_audio_custom_name_is_revalidated(client):
+    """Test that files without a content-addressed name must be revalidated."""
+    with open(os.path.join(settings.AUDIO_DIR, "custom.mp3"), "wb") as f:
+        f.write(b"custom audio")
+    
+    response = client.get("/audio/custom.mp3")
+    
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    assert "etag" in response.headers
+
+def test_audio_served_from_shard_directory(client):
+    """Test that audio files are found in their shard directory."""
+    filename = f"audio_{'cd' * 32}.mp3"
+    file_path = main.tts_service.storage.path_for(filename)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(b"\xff\xfb" * 100)
+    
+    response = client.get(f"/audio/{filename}")
+    
+    assert response.status_code == 200
+    assert response.content == b"\xff\xfb" * 100
+
+def test_audio_redirects_to_object_storage(client):
+    """Test that audio in shared object storage is served by a presigned redirect."""
+    from unittest.mock import AsyncMock, Mock, patch
+    backend = Mock()
+    backend.exists = AsyncMock(return_value=True)
+    backend.presigned_url = AsyncMock(return_value="http://storage.example/audio.mp3?sig=1")
+    filename = f"audio_{'ef' * 32}.mp3"
+    
+    with patch.object(main.tts_service, "backend", backend):
+        response = client.get(f"/audio/{filename}", follow_redirects=False)
+    
+    assert response.status_code == 307
+    assert response.headers["location"] == "http://storage.example/audio.mp3?sig=1"
+    backend.presigned_url.assert_awaited_once_with(filename)
+
+@pytest.fixture
+def fake_transcoder():
+    """Audio transcoder whose encoder writes a marker file instead of running ffmpeg."""
+    from unittest.mock import patch
+    from src.services.audio_transcoder import AudioTranscoder
+    transcoder = AudioTranscoder(main.tts_service.storage)
+    transcoder.ffmpeg = "ffmpeg"
+    
+    async def encode(source, name, audio_format):
+        file_path = await transcoder.storage.prepare(name)
+        with open(file_path, "wb") as f:
+            f.write(audio_format.name.encode())
+        return file_path
+    
+    with patch.object(transcoder, "_encode", side_effect=encode), \
+            patch.object(main, "audio_transcoder", transcoder):
+        yield transcoder
+
+def test_audio_negotiates_format_from_accept(client, fake_transcoder):
+    """Test that an MP3 name is served in the best format the client accepts."""
+    filename = f"audio_{'12' * 32}.mp3"
+    with open(os.path.join(settings.AUDIO_DIR, filename), "wb") as f:
+        f.write(b"mp3")
+    
+    response = client.get(f"/audio/{filename}", headers={"Accept": "audio/mp4, audio/ogg;q=0.8"})
+    
+    assert response.status_code == 200
+    assert response.content == b"aac"
+    assert response.headers["content-type"] == "audio/mp4"
+    assert response.headers["vary"] == "Accept"
+    assert "immutable" in response.headers["cache-control"]
+    
+    # Wildcards get the original MP3
+    response = client.get(f"/audio/{filename}", headers={"Accept": "*/*"})
+    assert response.content == b"mp3"
+    assert response.headers["content-type"] == "audio/mpeg"
+
+def test_audio_variant_by_extension_is_encoded_once(client, fake_transcoder):
+    """Test that a variant requested by name is encoded on first use and then reused."""
+    source = f"audio_{'34' * 32}.mp3"
+    with open(os.path.join(settings.AUDIO_DIR, source), "wb") as f:
+        f.write(b"mp3")
+    filename = source.replace(".mp3", ".opus")
+    
+    first = client.get(f"/audio/{filename}")
+    second = client.get(f"/audio/{filename}")
+    
+    assert first.status_code == second.status_code == 200
+    assert first.content == b"opus"
+    assert first.headers["content-type"] == "audio/ogg"
+    assert first.headers["etag"] == second.headers["etag"]
+    assert fake_transcoder._encode.call_count == 1
+    assert client.get(f"/audio/audio_{'56' * 32}.opus").status_code == 404
+
+def test_audio_variant_unavailable_without_ffmpeg(client, stored_audio):
+    """Test that explicitly named variants fail with 503 and negotiation falls back to MP3."""
+    from unittest.mock import patch
+    from src.services.audio_transcoder import AudioTranscoder
+    filename, content = stored_audio
+    transcoder = AudioTranscoder(main.tts_service.storage, ffmpeg="no-such-ffmpeg")
+    
+    with patch.object(main, "audio_transcoder", transcoder):
+        response = client.get(f"/audio/{filename.replace('.mp3', '.m4a')}")
+        assert response.status_code == 503
+        
+        response = client.get(f"/audio/{filename}", headers={"Accept": "audio/ogg"})
+        assert response.status_code == 200
+        assert response.content == content
+        assert "vary" not in response.headers
+
+def test_tts_rejects_unknown_audio_format(client, realistic_image):
+    """Test that an unsupported audio_format is rejected before any processing."""
+    with open(realistic_image, "rb") as f:
+        response = client.post(
+            "/process_with_narrative/",
+            files={"file": ("scene.jpg", f, "image/jpeg")},
+            data={"tts": "true", "audio_format": "flac"}
+        )
+    
+    assert response.status_code == 422
+    assert "Unknown audio format" in response.json()["detail"]["error"]
+
+def test_tts_stages_deliver_requested_format(client, realistic_image, fake_transcoder):
+    """Test that the pipeline synthesizes, transcodes and accounts for the narration."""
+    from unittest.mock import AsyncMock, patch
+    from src.services.captioning_service import CaptionResult
+    from src.services.narrative_service import NarrativeCompletion
+    audio_file = os.path.join(settings.AUDIO_DIR, f"audio_{'78' * 32}.mp3")
+    with open(audio_file, "wb") as f:
+        f.write(b"mp3")
+    
+    with patch.object(
+        main.captioning_service, "caption", AsyncMock(return_value=CaptionResult(["a green field"]))
+    ), patch.object(
+        main.narrative_service, "complete", AsyncMock(return_value=NarrativeCompletion(["A story."]))
+    ), patch.object(
+        main.tts_service, "text_to_speech", AsyncMock(return_value=audio_file)
+    ) as text_to_speech, patch.object(main.tts_service, "estimate_duration", return_value=1.5):
+        with open(realistic_image, "rb") as f:
+            response = client.post(
+                "/process_with_narrative/",
+                files={"file": ("scene.jpg", f, "image/jpeg")},
+                data={"tts": "true", "audio_format": "opus", "language": "fr"}
+            )
+    
+    assert response.status_code == 200
+    assert response.json()["audio_file"] == f"audio_{'78' * 32}.opus"
+    assert text_to_speech.call_args.args[0] == "A story."
+    assert text_to_speech.call_args.kwargs["language"] == "fr"
+    timing = response.headers["Server-Timing"]
+    assert "tts;dur=" in timing and "transcode;dur=" in timing and "audio_seconds;dur=" in timing
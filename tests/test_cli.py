@@ -0,0 +1,100 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock
+from PIL import Image
+from src.cli import BatchOptions, iter_images, main, run_batch
+
+@pytest.fixture
+def image_dir(tmp_path):
+    directory = tmp_path / "images"
+    (directory / "nested").mkdir(parents=True)
+    for name in ["a.jpg", "b.png", "nested/c.jpg"]:
+        Image.new("RGB", (32, 32), color="blue").save(directory / name)
+    (directory / "notes.txt").write_text("not an image")
+    return directory
+
+@pytest.fixture
+def services():
+    captioning = Mock()
+    captioning.generate_captions_batch = AsyncMock(
+        side_effect=lambda paths: [f"caption of {path.rsplit('/', 1)[-1]}" for path in paths]
+    )
+    narrative = Mock()
+    narrative.generate_narrative = AsyncMock(side_effect=lambda caption, **kwargs: f"story about {caption}")
+    return {"captioning_service": captioning, "narrative_service": narrative}
+
+def _read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_iter_images_from_directory_and_manifest(image_dir, tmp_path):
+    """Test that directories are walked and manifest entries resolved."""
+    paths = list(iter_images(str(image_dir)))
+    assert [p.rsplit("/", 1)[-1] for p in paths] == ["a.jpg", "b.png", "c.jpg"]
+    
+    manifest = image_dir / "manifest.jsonl"
+    manifest.write_text('{"path": "a.jpg"}\n{"path": "nested/c.jpg"}\n')
+    assert list(iter_images(str(manifest))) == [str(image_dir / "a.jpg"), str(image_dir / "nested/c.jpg")]
+
+@pytest.mark.asyncio
+async def test_batch_writes_results(image_dir, tmp_path, services):
+    """Test that every image is captioned in batches and narrated."""
+    output = str(tmp_path / "results.jsonl")
+    
+    report = await run_batch(str(image_dir), output, BatchOptions(batch_size=2), **services)
+    
+    results = _read_results(output)
+    assert report.processed == 3
+    assert len(results) == 3
+    assert {r["narrative"] for r in results} == {
+        "story about caption of a.jpg", "story about caption of b.png", "story about caption of c.jpg"
+    }
+    # Three images in batches of two: two captioning passes
+    assert services["captioning_service"].generate_captions_batch.call_count == 2
+
+@pytest.mark.asyncio
+async def test_batch_resumes_from_checkpoint(image_dir, tmp_path, services):
+    """Test that a rerun skips finished items and drops uncommitted results."""
+    output = tmp_path / "results.jsonl"
+    first = str(image_dir / "a.jpg")
+    output.write_text(
+        json.dumps({"path": first, "caption": "done"}) + "\n"
+        + json.dumps({"path": "uncommitted.jpg", "caption": "torn"}) + "\n"
+    )
+    (tmp_path / "results.jsonl.checkpoint").write_text(first + "\n")
+    
+    report = await run_batch(str(image_dir), str(output), BatchOptions(), **services)
+    
+    results = _read_results(output)
+    assert report.skipped == 1
+    assert report.processed == 2
+    assert [r["path"] for r in results].count(first) == 1
+    assert "uncommitted.jpg" not in [r["path"] for r in results]
+    assert len(results) == 3
+
+@pytest.mark.asyncio
+async def test_bad_image_does_not_fail_batch(image_dir, tmp_path, services):
+    """Test that a failing batch falls back to per-image captioning."""
+    captioning = services["captioning_service"]
+    captioning.generate_captions_batch = AsyncMock(side_effect=Exception("bad image"))
+    captioning.generate_caption = AsyncMock(side_effect=["ok", Exception("corrupt"), "ok"])
+    output = str(tmp_path / "results.jsonl")
+    
+    report = await run_batch(str(image_dir), output, BatchOptions(), **services)
+    
+    assert report.processed == 2
+    assert report.failed == 1
+    assert len(_read_results(output)) == 2
+
+def test_cli_requires_subcommand():
+    """Test that the CLI rejects a missing subcommand."""
+    with pytest.raises(SystemExit):
+        main([])
+
+def test_storage_migrate_command(tmp_path, capsys):
+    """Test that the storage migrate subcommand shards the given directories."""
+    (tmp_path / "a.jpg").write_bytes(b"image")
+    
+    assert main(["storage", "migrate", str(tmp_path)]) == 0
+    assert "moved 1 files" in capsys.readouterr().out
+    assert not (tmp_path / "a.jpg").exists()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import pytest
+from src.config import settings
+from src.services.audio_transcoder import (
+    AudioTranscoder, TranscodingError, audio_formats, format_for_extension, negotiate
+)
+from src.services.sharded_storage import ShardedDirectory
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, None),
+    ("*/*", None),
+    ("audio/*", None),
+    ("audio/mpeg", None),
+    ("audio/ogg", "opus"),
+    ('audio/ogg; codecs="opus"', "opus"),
+    ("audio/ogg; codecs=vorbis", None),
+    ("audio/mp4, audio/ogg;q=0.5", "aac"),
+    ("audio/mp4, audio/ogg", "opus"),
+    ("audio/mpeg, audio/mp4;q=0.9", None),
+    ("audio/ogg;q=0, audio/aac;q=0.4", "aac"),
+])
+def test_negotiate(accept, expected):
+    """Test choosing a format from an Accept header."""
+    audio_format = negotiate(accept)
+    assert (audio_format.name if audio_format else None) == expected
+
+def test_variant_names():
+    """Test that variants are named after their source."""
+    formats = audio_formats()
+    assert AudioTranscoder.variant_name("audio_ab.mp3", formats["opus"]) == "audio_ab.opus"
+    assert AudioTranscoder.variant_name("audio_ab.mp3", formats["aac"]) == "audio_ab.m4a"
+    assert format_for_extension("audio_ab.m4a").name == "aac"
+    assert format_for_extension("audio_ab.wav") is None
+
+@pytest.mark.asyncio
+async def test_transcode_without_ffmpeg(tmp_path):
+    """Test that a missing ffmpeg is reported when a variant must be encoded."""
+    storage = ShardedDirectory(str(tmp_path))
+    transcoder = AudioTranscoder(storage, ffmpeg="no-such-ffmpeg")
+    with open(await storage.prepare("audio_1.mp3"), "wb") as f:
+        f.write(b"mp3")
+    
+    assert not transcoder.available
+    with pytest.raises(TranscodingError):
+        await transcoder.transcode("audio_1.mp3", audio_formats()["opus"])
+    # The original needs no encoding
+    assert await transcoder.transcode("audio_1.mp3", audio_formats()["mp3"]) == storage.path_for("audio_1.mp3")
+
+@pytest.fixture
+def ffmpeg():
+    """ffmpeg executable (FFMPEG_PATH), or skip."""
+    path = shutil.which(settings.FFMPEG_PATH)
+    if path is None:
+        pytest.skip("ffmpeg is not installed")
+    return path
+
+@pytest.fixture
+def speech_mp3(ffmpeg, tmp_path):
+    """Storage holding a five-second 32 kbps mono MP3, like gTTS output."""
+    storage = ShardedDirectory(str(tmp_path))
+    file_path = storage.path_for("audio_1.mp3")
+    os.makedirs(os.path.dirname(file_path))
+    subprocess.run(
+        [ffmpeg, "-loglevel", "error", "-f", "lavfi", "-i", "sine=frequency=220:duration=5",
+         "-ac", "1", "-ar", "24000", "-c:a", "libmp3lame", "-b:a", "32k", file_path],
+        check=True
+    )
+    return storage, file_path
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name, magic", [("opus", b"OggS"), ("aac", b"ftyp")])
+async def test_transcode_with_ffmpeg(speech_mp3, ffmpeg, name, magic):
+    """Test encoding smaller variants with ffmpeg, once per source even when requested concurrently."""
+    storage, source = speech_mp3
+    transcoder = AudioTranscoder(storage, ffmpeg=ffmpeg)
+    audio_format = audio_formats()[name]
+    
+    paths = await asyncio.gather(*(transcoder.transcode("audio_1.mp3", audio_format) for _ in range(3)))
+    
+    assert len(set(paths)) == 1
+    assert paths[0] == storage.path_for(transcoder.variant_name("audio_1.mp3", audio_format))
+    with open(paths[0], "rb") as f:
+        header = f.read(12)
+    assert magic in header
+    assert transcoder._in_flight.executions == 1
+    
+    # Cached variants are reused without encoding again
+    assert await transcoder.transcode("audio_1.mp3", audio_format) == paths[0]
+    assert transcoder._in_flight.executions == 1
+
+@pytest.mark.asyncio
+async def test_opus_variant_is_smaller(speech_mp3, ffmpeg):
+    """Test that the Opus variant is smaller than the 32 kbps MP3."""
+    storage, source = speech_mp3
+    transcoder = AudioTranscoder(storage, ffmpeg=ffmpeg)
+    
+    variant = await transcoder.transcode("audio_1.mp3", audio_formats()["opus"])
+    
+    assert os.path.getsize(variant) < os.path.getsize(source)
+
+@pytest.mark.asyncio
+async def test_transcode_failure_leaves_no_variant(tmp_path, ffmpeg):
+    """Test that an undecodable source raises TranscodingError and leaves nothing behind."""
+    storage = ShardedDirectory(str(tmp_path))
+    with open(await storage.prepare("audio_2.mp3"), "wb") as f:
+        f.write(b"not audio")
+    transcoder = AudioTranscoder(storage, ffmpeg=ffmpeg)
+    
+    with pytest.raises(TranscodingError):
+        await transcoder.transcode("audio_2.mp3", audio_formats()["opus"])
+    assert await storage.locate("audio_2.opus") is None
+    with pytest.raises(FileNotFoundError):
+        await transcoder.transcode("audio_3.mp3", audio_formats()["opus"])
@@ -0,0 +1,142 @@
+import io
+import pytest
+import torch
+from PIL import Image
+from unittest.mock import Mock
+from src.services.caption_tiers import CaptionTier, TierController, parse_tiers
+from src.services.captioning_service import CaptioningService
+from src.services.image_index import ImageIndex
+
+TIERS = [
+    CaptionTier("beam", num_beams=3),
+    CaptionTier("greedy"),
+    CaptionTier("short", max_new_tokens=12)
+]
+
+
+@pytest.fixture
+def image_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color="blue").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def mock_processor():
+    processor = Mock()
+    processor.return_value = {"pixel_values": torch.zeros((1, 3, 224, 224))}
+    processor.decode.return_value = "a test caption"
+    return processor
+
+
+@pytest.fixture
+def mock_model():
+    model = Mock()
+    model.generate.return_value = [torch.tensor([1, 2, 3])]
+    model.to.return_value = model
+    return model
+
+
+def test_parse_tiers():
+    tiers = parse_tiers('[{"name": "beam", "num_beams": 3}, {"name": "fast", "model": "blip-small"}]')
+    assert tiers == [CaptionTier("beam", num_beams=3), CaptionTier("fast", model="blip-small")]
+
+
+@pytest.mark.parametrize("spec", ["not json", "[]", '[{"beams": 3}]'])
+def test_parse_tiers_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError):
+        parse_tiers(spec)
+
+
+def test_generate_kwargs():
+    assert CaptionTier("greedy").generate_kwargs() == {}
+    assert CaptionTier("beam", num_beams=3).generate_kwargs() == {"num_beams": 3}
+    # Alternatives need at least one beam each
+    assert CaptionTier("greedy").generate_kwargs(4) == {"num_beams": 4, "num_return_sequences": 4}
+    assert CaptionTier("short", max_new_tokens=12).generate_kwargs() == {"max_new_tokens": 12}
+
+
+def test_controller_steps_down_with_queue_depth():
+    controller = TierController(TIERS, queue_thresholds=[4, 8], latency_target=0)
+    assert [controller.select(depth)[1].name for depth in (0, 3, 4, 8, 50)] == [
+        "beam", "beam", "greedy", "short", "short"
+    ]
+
+
+def test_controller_follows_latency():
+    controller = TierController(TIERS, queue_thresholds=[], latency_target=1.0, cooldown=0, smoothing=1.0)
+
+    controller.observe(3.0)
+    controller.observe(3.0)
+    assert controller.select(0) == (2, TIERS[2])
+    # Never below the cheapest tier
+    controller.observe(3.0)
+    assert controller.latency_level == 2
+
+    # Between half the target and the target, the tier holds
+    controller.observe(0.8)
+    assert controller.latency_level == 2
+    controller.observe(0.2)
+    assert controller.select(0) == (1, TIERS[1])
+
+
+def test_controller_cooldown_limits_changes():
+    controller = TierController(TIERS, queue_thresholds=[], latency_target=1.0, cooldown=60, smoothing=1.0)
+    controller.observe(3.0)
+    controller.observe(3.0)
+    assert controller.latency_level == 1
+
+
+def test_controller_takes_the_cheaper_signal():
+    controller = TierController(TIERS, queue_thresholds=[4], latency_target=1.0, cooldown=0, smoothing=1.0)
+    controller.observe(3.0)
+    controller.observe(3.0)
+    assert controller.select(5)[0] == 2
+
+
+@pytest.mark.asyncio
+async def test_caption_reports_tier_and_decoding(mock_processor, mock_model, image_bytes):
+    controller = TierController(TIERS, queue_thresholds=[2], latency_target=0)
+    service = CaptioningService(processor=mock_processor, model=mock_model, tier_controller=controller)
+
+    result = await service.caption(image_bytes)
+    assert result.captions == ["a test caption"]
+    assert result.tier == "beam"
+    assert mock_model.generate.call_args.kwargs["num_beams"] == 3
+
+    # A request arriving behind another is served one tier down
+    service.queue_depth = 1
+    result = await service.caption(image_bytes)
+    assert result.tier == "greedy"
+    assert "num_beams" not in mock_model.generate.call_args.kwargs
+
+
+@pytest.mark.asyncio
+async def test_degraded_captions_are_not_reused_at_a_better_tier(mock_processor, mock_model, image_bytes):
+    controller = TierController(TIERS, queue_thresholds=[2, 3], latency_target=0)
+    service = CaptioningService(
+        processor=mock_processor, model=mock_model, index=ImageIndex(), tier_controller=controller
+    )
+
+    service.queue_depth = 2
+    assert (await service.caption(image_bytes)).tier == "short"
+    assert mock_model.generate.call_args.kwargs["max_new_tokens"] == 12
+
+    # Same tier: served from the index
+    await service.caption(image_bytes)
+    assert mock_model.generate.call_count == 1
+
+    # Load dropped: the degraded caption is regenerated at full quality
+    service.queue_depth = 0
+    assert (await service.caption(image_bytes)).tier == "beam"
+    assert mock_model.generate.call_count == 2
+
+    # ...and then serves every tier
+    service.queue_depth = 2
+    await service.caption(image_bytes)
+    assert mock_model.generate.call_count == 2
+
+
+def test_unregistered_tier_model_falls_back_to_active_model(mock_processor, mock_model):
+    service = CaptioningService(processor=mock_processor, model=mock_model)
+    assert service._tier_model(CaptionTier("fast", model="missing")) == (mock_processor, mock_model)
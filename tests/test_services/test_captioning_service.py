@@ -1,3 +1,4 @@
+import asyncio
 import os
 import pytest
 from pathlib import Path
@@ -49,6 +50,17 @@ async def test_generate_caption(captioning_service, sample_image, mock_processor
     # Use ANY for tensor comparison since we can't directly compare tensors
     mock_processor.decode.assert_called_once_with(ANY, skip_special_tokens=True)
 
+@pytest.mark.asyncio
+async def test_generate_caption_from_bytes(captioning_service, sample_image, mock_model):
+    """Test that an image held in memory is captioned without touching the disk."""
+    image_bytes = sample_image.read_bytes()
+    sample_image.unlink()
+    
+    caption = await captioning_service.generate_caption(image_bytes)
+    
+    assert caption == "a test caption"
+    mock_model.generate.assert_called_once()
+
 @pytest.mark.asyncio
 async def test_invalid_image_path(captioning_service):
     # Test that an error is raised for non-existent image
@@ -64,4 +76,148 @@ async def test_invalid_image_format(captioning_service, tmp_path):
     
     # Test that an error is raised for invalid image format
     with pytest.raises(Exception):
-        await captioning_service.generate_caption(str(invalid_image)) 
\ No newline at end of file
+        await captioning_service.generate_caption(str(invalid_image)) 
+@pytest.mark.asyncio
+async def test_concurrent_identical_images_share_inference(captioning_service, sample_image, mock_model):
+    """Test that the same image captioned concurrently runs the model once."""
+    captions = await asyncio.gather(
+        *(captioning_service.generate_caption(str(sample_image)) for _ in range(3))
+    )
+    
+    assert captions == ["a test caption"] * 3
+    mock_model.generate.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_generate_multiple_captions(captioning_service, sample_image, mock_processor, mock_model):
+    """Test that alternatives come from one beam search call, ranked and deduplicated."""
+    mock_model.generate.return_value = [torch.tensor([1]), torch.tensor([2]), torch.tensor([3])]
+    mock_processor.decode.side_effect = ["a red square", "a red box", "a red square"]
+    
+    captions = await captioning_service.generate_captions(str(sample_image), num_captions=3)
+    
+    assert captions == ["a red square", "a red box"]
+    mock_model.generate.assert_called_once()
+    generate_kwargs = mock_model.generate.call_args.kwargs
+    assert generate_kwargs["num_beams"] == 3
+    assert generate_kwargs["num_return_sequences"] == 3
+
+@pytest.mark.asyncio
+async def test_generate_captions_batch(captioning_service, sample_image, mock_processor, mock_model):
+    """Test that several images are captioned with one model pass."""
+    mock_model.generate.return_value = [torch.tensor([1]), torch.tensor([2])]
+    mock_processor.decode.side_effect = ["first image", "second image"]
+    
+    captions = await captioning_service.generate_captions_batch([str(sample_image), str(sample_image)])
+    
+    assert captions == ["first image", "second image"]
+    mock_model.generate.assert_called_once()
+    assert len(mock_processor.call_args.args[0]) == 2
+
+@pytest.mark.asyncio
+async def test_near_duplicate_reuses_caption(mock_processor, mock_model, tmp_path):
+    """Test that a resized copy of a captioned image skips the model."""
+    from PIL import ImageDraw
+    from src.services.image_index import ImageIndex
+    service = CaptioningService(processor=mock_processor, model=mock_model, index=ImageIndex())
+    # Flat images are never near-duplicates, so give the scene some structure
+    scene = tmp_path / "scene.png"
+    image = Image.new('RGB', (100, 100), color='white')
+    ImageDraw.Draw(image).rectangle([10, 20, 60, 80], fill='red')
+    ImageDraw.Draw(image).ellipse([50, 5, 95, 50], fill='blue')
+    image.save(scene)
+    resized = tmp_path / "resized.png"
+    image.resize((50, 50)).save(resized)
+    
+    first = await service.generate_caption(str(scene))
+    second = await service.generate_caption(str(resized))
+    
+    assert first == second == "a test caption"
+    mock_model.generate.assert_called_once()
+
+@pytest.fixture
+def tiny_blip():
+    """A small randomly initialized BLIP model, enough to exercise the real generate path."""
+    from transformers import BlipConfig, BlipForConditionalGeneration
+    torch.manual_seed(0)
+    config = BlipConfig(
+        vision_config={
+            "hidden_size": 32, "intermediate_size": 37, "num_hidden_layers": 2,
+            "num_attention_heads": 4, "image_size": 32, "patch_size": 8
+        },
+        text_config={
+            "vocab_size": 30524, "hidden_size": 32, "intermediate_size": 37, "num_hidden_layers": 2,
+            "num_attention_heads": 4, "encoder_hidden_size": 32, "max_position_embeddings": 64
+        }
+    )
+    return BlipForConditionalGeneration(config).eval()
+
+@pytest.fixture
+def tiny_processor():
+    pixel_values = torch.randn(2, 3, 32, 32)
+    processor = Mock()
+    processor.side_effect = lambda images, return_tensors: {"pixel_values": pixel_values[:len(images)]}
+    processor.decode.side_effect = lambda sequence, skip_special_tokens: " ".join(map(str, sequence.tolist()))
+    vocabulary = {}
+    processor.tokenizer.side_effect = lambda text: {
+        "input_ids": [101] + [vocabulary.setdefault(word, 1000 + len(vocabulary)) for word in text.split()] + [102]
+    }
+    return processor
+
+def _png(color):
+    import io
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), color=color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def test_cached_vision_features_match_full_generate(tiny_blip, tiny_processor):
+    """Test that decoding from cached encoder outputs matches BLIP's own generate."""
+    from src.services.vision_feature_cache import VisionFeatureCache
+    images = [_png("red"), _png("blue")]
+    plain = CaptioningService(processor=tiny_processor, model=tiny_blip)
+    cached = CaptioningService(processor=tiny_processor, model=tiny_blip, feature_cache=VisionFeatureCache())
+    
+    for num_captions in (1, 3):
+        expected = plain._caption_images(images, num_captions)
+        assert cached._caption_images(images, num_captions) == expected
+    
+    # The second pass (3 beams) reused both images' encoder outputs
+    assert (cached.feature_cache.misses, cached.feature_cache.hits) == (2, 2)
+
+@pytest.mark.asyncio
+async def test_conditional_captions_share_one_encoder_pass(tiny_blip, tiny_processor, tmp_path):
+    """Test that prompted captions match per-prompt generate while encoding the image once."""
+    image_path = tmp_path / "scene.png"
+    image_path.write_bytes(_png("red"))
+    service = CaptioningService(processor=tiny_processor, model=tiny_blip)
+    prompts = ["a photograph of", "a picture of", "the scene shows a"]
+    pixel_values = tiny_processor(images=[None], return_tensors="pt")["pixel_values"]
+    
+    encoder_calls = []
+    hook = tiny_blip.vision_model.register_forward_hook(lambda *args: encoder_calls.append(1))
+    captions = await service.generate_conditional_captions(str(image_path), prompts)
+    hook.remove()
+    
+    assert len(encoder_calls) == 1
+    for prompt, caption in zip(prompts, captions):
+        input_ids = torch.LongTensor([tiny_processor.tokenizer(prompt)["input_ids"]])
+        expected = tiny_blip.generate(pixel_values=pixel_values, input_ids=input_ids)[0]
+        assert caption == " ".join(map(str, expected.tolist()))
+
+@pytest.mark.asyncio
+async def test_call_during_model_switch_uses_one_variant(tiny_blip, tiny_processor, tmp_path):
+    """Test that a call running while the model is switched keeps the pair it started with."""
+    image_path = tmp_path / "scene.png"
+    image_path.write_bytes(_png("red"))
+    service = CaptioningService(processor=tiny_processor, model=tiny_blip)
+    other_processor, other_model = Mock(), Mock()
+    
+    # Swap the pair the way switch_model does, right after the image is encoded
+    def switch(*args):
+        service._loaded = (other_processor, other_model)
+    hook = tiny_blip.vision_model.register_forward_hook(switch)
+    captions = await service.generate_conditional_captions(str(image_path), ["a picture of"])
+    hook.remove()
+    
+    assert len(captions) == 1
+    assert other_processor.method_calls == [] and other_model.method_calls == []
+    assert service.model is other_model
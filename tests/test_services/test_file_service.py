@@ -1,5 +1,6 @@
 import os
 import pytest
+import shutil
 import aiofiles
 import tempfile
 from fastapi import UploadFile
@@ -16,9 +17,7 @@ def file_service():
     yield service
     
     # Cleanup after tests
-    for file in Path(test_upload_dir).glob("*"):
-        file.unlink()
-    os.rmdir(test_upload_dir)
+    shutil.rmtree(test_upload_dir)
 
 @pytest.fixture
 def sample_image(tmp_path):
@@ -82,4 +81,22 @@ async def test_unique_filename_generation(file_service, sample_image):
     
     # Cleanup
     temp_file1.close()
-    temp_file2.close() 
\ No newline at end of file
+    temp_file2.close() 
+@pytest.mark.asyncio
+async def test_find_by_content_hash(file_service):
+    """Test that stored uploads are found by the SHA-256 of their content."""
+    import hashlib
+    content = b"fake image content"
+    upload_file = UploadFile(filename="test.jpg", file=tempfile.SpooledTemporaryFile())
+    upload_file.file.write(content)
+    upload_file.file.seek(0)
+    
+    file_path = await file_service.save_upload(upload_file)
+    digest = hashlib.sha256(content).hexdigest()
+    
+    assert await file_service.find_by_hash(digest) == file_path
+    assert await file_service.find_by_hash("0" * 64) is None
+    
+    # A file removed by cleanup is forgotten
+    os.unlink(file_path)
+    assert await file_service.find_by_hash(digest) is None
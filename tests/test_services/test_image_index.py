@@ -0,0 +1,91 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from src.services.image_index import ImageIndex, dhash, hamming_distances
+
+def _scene(color="navy"):
+    image = Image.new("RGB", (320, 240), color="white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([40, 60, 200, 200], fill=color)
+    draw.ellipse([180, 20, 300, 140], fill="orange")
+    return image
+
+def _encode(image, fmt="JPEG", **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **kwargs)
+    return buffer.getvalue()
+
+def test_dhash_tolerates_resize_and_reencode():
+    """Test that resized, re-encoded copies hash within a few bits."""
+    original = _scene()
+    copy = Image.open(io.BytesIO(_encode(original.resize((160, 120)), quality=60)))
+    different = _scene().transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    
+    near = bin(dhash(original) ^ dhash(copy)).count("1")
+    far = bin(dhash(original) ^ dhash(different)).count("1")
+    
+    assert near <= 5
+    assert far > 10
+
+def test_hamming_distances_vectorized():
+    """Test the vectorized distance against a scalar popcount."""
+    hashes = np.array([0, 0xFF, 2**64 - 1], dtype=np.uint64)
+    assert list(hamming_distances(hashes, 0)) == [0, 8, 64]
+
+def test_exact_and_near_duplicate_lookup():
+    """Test that records are found by digest or by perceptual similarity."""
+    index = ImageIndex(threshold=5)
+    original = _encode(_scene())
+    near_copy = _encode(_scene().resize((200, 150)), fmt="PNG")
+    unrelated = _encode(_scene().transpose(Image.Transpose.FLIP_TOP_BOTTOM))
+    
+    index.put(index.key_for(original), captions=["a navy square"])
+    
+    assert index.get(index.key_for(original))["captions"] == ["a navy square"]
+    assert index.get(index.key_for(near_copy))["captions"] == ["a navy square"]
+    assert index.get(index.key_for(unrelated)) is None
+    assert (index.hits, index.near_hits, index.misses) == (1, 1, 1)
+
+def test_flat_images_are_not_near_duplicates():
+    """Test that differently coloured flat images do not share a record."""
+    index = ImageIndex(threshold=5)
+    red = _encode(Image.new("RGB", (64, 64), color="red"), fmt="PNG")
+    blue = _encode(Image.new("RGB", (64, 64), color="blue"), fmt="PNG")
+    
+    index.put(index.key_for(red), captions=["a red square"])
+    
+    assert index.get(index.key_for(blue)) is None
+    assert index.get(index.key_for(red))["captions"] == ["a red square"]
+    # Structured images are not matched to the flat one either
+    assert index.get(index.key_for(_encode(_scene()))) is None
+
+def test_oldest_entries_are_evicted():
+    """Test that the index keeps at most max_entries images."""
+    index = ImageIndex(threshold=0, max_entries=2)
+    images = [
+        _scene(),
+        _scene().transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+        _scene().transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+    ]
+    keys = [index.key_for(_encode(image)) for image in images]
+    
+    for i, key in enumerate(keys):
+        index.put(key, captions=[str(i)])
+    
+    assert len(index) == 2
+    assert index.get(keys[0]) is None
+    assert index.get(keys[2])["captions"] == ["2"]
+
+def test_persistence_round_trip(tmp_path):
+    """Test that a saved index is loaded back."""
+    path = str(tmp_path / "index.npz")
+    index = ImageIndex(path=path)
+    key = index.key_for(_encode(_scene()))
+    index.put(key, captions=["a navy square"], narrative="A story.")
+    index.save()
+    
+    reloaded = ImageIndex(path=path)
+    
+    assert len(reloaded) == 1
+    assert reloaded.get(key) == {"captions": ["a navy square"], "narrative": "A story."}
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+import pytest
+from src.services.janitor_service import StorageJanitor
+
+@pytest.fixture
+def directories(tmp_path):
+    """Create an upload and an audio directory."""
+    uploads = tmp_path / "uploads"
+    audio = tmp_path / "audio"
+    uploads.mkdir()
+    audio.mkdir()
+    return uploads, audio
+
+def _write(path, size, age_hours=0):
+    """Write a file of the given size and backdate its modification time."""
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age_hours * 3600
+    os.utime(path, (mtime, mtime))
+    return path
+
+def test_scan_and_sweep_expired_files(directories):
+    """Test that files past their directory's age are removed and reported."""
+    uploads, audio = directories
+    old_upload = _write(uploads / "old.jpg", 100, age_hours=3)
+    new_upload = _write(uploads / "new.jpg", 100)
+    old_audio = _write(audio / "old.mp3", 50, age_hours=3)
+    
+    janitor = StorageJanitor(
+        max_ages={str(uploads): 2 * 3600, str(audio): 5 * 3600},
+        disk_budget_bytes=0
+    )
+    assert janitor.scan() == 3
+    
+    report = janitor.sweep()
+    
+    assert report.files_removed == 1
+    assert report.bytes_reclaimed == 100
+    assert not old_upload.exists()
+    assert new_upload.exists()
+    assert old_audio.exists()  # Audio is kept for longer
+    assert janitor.total_bytes == 150
+
+def test_sweep_in_batches(directories):
+    """Test that each batch removes at most batch_size files."""
+    uploads, _ = directories
+    for i in range(5):
+        _write(uploads / f"old_{i}.jpg", 10, age_hours=2)
+    janitor = StorageJanitor(max_ages={str(uploads): 3600}, disk_budget_bytes=0, batch_size=2)
+    janitor.scan()
+    
+    assert janitor.sweep_batch().files_removed == 2
+    assert janitor.sweep_batch().files_removed == 2
+    assert janitor.sweep_batch().files_removed == 1
+    assert janitor.sweep_batch() is None
+    assert janitor.totals.bytes_reclaimed == 50
+
+def test_disk_budget_evicts_soonest_expiring(directories):
+    """Test that exceeding the disk budget evicts files closest to expiry first."""
+    uploads, _ = directories
+    oldest = _write(uploads / "a.jpg", 400, age_hours=3)
+    middle = _write(uploads / "b.jpg", 400, age_hours=2)
+    newest = _write(uploads / "c.jpg", 400, age_hours=1)
+    janitor = StorageJanitor(max_ages={str(uploads): 24 * 3600}, disk_budget_bytes=1000)
+    janitor.scan()
+    
+    report = janitor.sweep()
+    
+    assert report.files_removed == 1
+    assert not oldest.exists()
+    assert middle.exists() and newest.exists()
+    assert janitor.total_bytes == 800
+
+def test_track_new_and_rewritten_files(directories):
+    """Test that tracked files are indexed once, even when rewritten."""
+    _, audio = directories
+    janitor = StorageJanitor(max_ages={str(audio): 3600}, disk_budget_bytes=0)
+    janitor.scan()
+    
+    path = _write(audio / "speech.mp3", 10, age_hours=2)
+    janitor.track(str(path))
+    # Rewriting the same content-addressed file refreshes its expiry
+    _write(path, 20)
+    janitor.track(str(path))
+    
+    assert len(janitor) == 1
+    assert janitor.total_bytes == 20
+    assert janitor.sweep().files_removed == 0
+    assert path.exists()
+
+def test_track_ignores_unmanaged_paths(tmp_path, directories):
+    """Test that files outside the managed directories are not indexed."""
+    uploads, _ = directories
+    outside = _write(tmp_path / "elsewhere.txt", 10, age_hours=100)
+    janitor = StorageJanitor(max_ages={str(uploads): 3600}, disk_budget_bytes=0)
+    janitor.scan()
+    
+    janitor.track(str(outside))
+    
+    assert len(janitor) == 0
+
+def test_track_before_scan_is_ignored(directories):
+    """Test that nothing is indexed while the janitor is not running."""
+    uploads, _ = directories
+    janitor = StorageJanitor(max_ages={str(uploads): 3600}, disk_budget_bytes=0)
+    
+    janitor.track(str(_write(uploads / "scene.jpg", 10)))
+    
+    assert len(janitor) == 0
+
+def test_retracking_does_not_grow_the_heap(directories):
+    """Test that re-tracking a file adds no heap entry unless its expiry changes."""
+    uploads, _ = directories
+    janitor = StorageJanitor(max_ages={str(uploads): 3600}, disk_budget_bytes=0)
+    janitor.scan()
+    path = _write(uploads / "scene.jpg", 10)
+    
+    for _ in range(100):
+        janitor.track(str(path))
+    assert len(janitor._heap) == 1
+    
+    # Expiries that keep moving leave stale entries, which are compacted away
+    for i in range(5000):
+        os.utime(path, (i, i))
+        janitor.track(str(path))
+    assert len(janitor._heap) <= 2 + 1024
+    assert len(janitor) == 1
+
+def test_file_already_deleted(directories):
+    """Test that files removed by someone else do not count as reclaimed."""
+    uploads, _ = directories
+    path = _write(uploads / "gone.jpg", 10, age_hours=2)
+    janitor = StorageJanitor(max_ages={str(uploads): 3600}, disk_budget_bytes=0)
+    janitor.scan()
+    path.unlink()
+    
+    report = janitor.sweep()
+    
+    assert report.files_removed == 0
+    assert report.bytes_reclaimed == 0
+
+@pytest.mark.asyncio
+async def test_background_task_lifecycle(directories):
+    """Test that the background task sweeps on start and stops cleanly."""
+    uploads, _ = directories
+    old = _write(uploads / "old.jpg", 10, age_hours=2)
+    janitor = StorageJanitor(max_ages={str(uploads): 3600}, disk_budget_bytes=0, interval=60)
+    
+    await janitor.start()
+    for _ in range(50):
+        if not old.exists():
+            break
+        await asyncio.sleep(0.01)
+    await janitor.stop()
+    
+    assert not old.exists()
+    assert janitor.totals.files_removed == 1
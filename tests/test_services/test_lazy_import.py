@@ -0,0 +1,48 @@
+import sys
+import pytest
+from src.services.lazy_import import LazyImport, lazy_import
+
+def test_import_is_deferred_until_first_use():
+    """Test that the target module is not imported when the placeholder is created."""
+    sys.modules.pop("colorsys", None)
+    
+    colorsys = lazy_import("colorsys")
+    
+    assert not colorsys._is_loaded
+    assert "colorsys" not in sys.modules
+    
+    # First attribute access triggers the import
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0)[0] == 0.0
+    assert colorsys._is_loaded
+    assert "colorsys" in sys.modules
+
+def test_lazy_attribute_is_callable():
+    """Test that an attribute placeholder forwards calls to the real object."""
+    ordered_dict = lazy_import("collections", "OrderedDict")
+    
+    result = ordered_dict(a=1)
+    
+    assert list(result.items()) == [("a", 1)]
+    assert ordered_dict.fromkeys(["x"]) == {"x": None}
+
+def test_missing_module_raises_on_use():
+    """Test that a missing module only fails when it is actually used."""
+    missing = lazy_import("definitely_not_an_installed_module")
+    
+    with pytest.raises(ModuleNotFoundError):
+        missing.anything
+
+def test_repr_reports_state():
+    """Test that the placeholder repr shows whether the import happened."""
+    placeholder = LazyImport("json", "dumps")
+    assert "deferred" in repr(placeholder)
+    
+    placeholder._load()
+    assert "loaded" in repr(placeholder)
+
+def test_target_attributes_are_not_shadowed():
+    """Test that target attributes named like proxy internals (e.g. torch.load) are forwarded."""
+    json = lazy_import("json")
+    
+    assert json.loads("[1]") == [1]
+    assert json.load.__module__ == "json"
@@ -0,0 +1,42 @@
+import pytest
+from src.services.metrics import MetricsRegistry
+
+def test_counter_and_gauge_render():
+    """Test that counters and gauges are rendered per label set."""
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests served", ["route"])
+    in_flight = registry.gauge("in_flight", "Requests in flight")
+    
+    requests.inc(route="/a")
+    requests.inc(2, route="/a")
+    in_flight.set(3)
+    in_flight.dec()
+    
+    output = registry.render()
+    assert requests.value(route="/a") == 3
+    assert "# TYPE requests_total counter" in output
+    assert 'requests_total{route="/a"} 3' in output
+    assert "in_flight 2" in output
+
+def test_histogram_buckets_are_cumulative():
+    """Test that histogram buckets, sum and count follow the Prometheus format."""
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    
+    output = registry.render()
+    assert latency.count() == 3
+    assert 'latency_seconds_bucket{le="0.1"} 1' in output
+    assert 'latency_seconds_bucket{le="1.0"} 2' in output
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in output
+    assert "latency_seconds_count 3" in output
+
+def test_registry_returns_existing_metric():
+    """Test that registering a name twice returns the same metric and rejects type clashes."""
+    registry = MetricsRegistry()
+    
+    assert registry.counter("events", "Events") is registry.counter("events", "Events")
+    with pytest.raises(ValueError):
+        registry.gauge("events", "Events")
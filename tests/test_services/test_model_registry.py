@@ -0,0 +1,90 @@
+import os
+import pytest
+import torch
+from src.services.captioning_service import CaptioningService
+from src.services.model_registry import ModelChecksumError, ModelNotFoundError, ModelRegistry
+from src.services.vision_feature_cache import VisionFeatureCache
+
+@pytest.fixture
+def tiny_variant(tmp_path):
+    """A small BLIP model and processor, as registered from a Hugging Face checkpoint."""
+    from transformers import (
+        BertTokenizer, BlipConfig, BlipForConditionalGeneration, BlipImageProcessor, BlipProcessor
+    )
+    torch.manual_seed(0)
+    vocab = tmp_path / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "a", "photo", "of"]))
+    processor = BlipProcessor(BlipImageProcessor(size={"height": 32, "width": 32}), BertTokenizer(str(vocab)))
+    config = BlipConfig(
+        vision_config={
+            "hidden_size": 32, "intermediate_size": 37, "num_hidden_layers": 2,
+            "num_attention_heads": 4, "image_size": 32, "patch_size": 8
+        },
+        text_config={
+            "vocab_size": 30524, "hidden_size": 32, "intermediate_size": 37, "num_hidden_layers": 2,
+            "num_attention_heads": 4, "encoder_hidden_size": 32, "max_position_embeddings": 64
+        }
+    )
+    return processor, BlipForConditionalGeneration(config).eval()
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / "models"))
+
+def test_register_writes_safetensors_and_manifest(registry, tiny_variant):
+    """Test that registering stores weights as safetensors with checksummed files."""
+    processor, model = tiny_variant
+    manifest = registry.register("tiny", model=model, processor=processor)
+
+    assert "model.safetensors" in manifest["files"]
+    assert not any(name.endswith(".bin") for name in os.listdir(registry.path("tiny")))
+    assert registry.names() == ["tiny"]
+    registry.verify("tiny", full=True)
+
+def test_load_restores_weights(registry, tiny_variant):
+    """Test that a loaded variant has the registered weights and is in eval mode."""
+    processor, model = tiny_variant
+    registry.register("tiny", model=model, processor=processor)
+
+    _, loaded = registry.load("tiny")
+
+    assert not loaded.training
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(loaded.state_dict()[name], tensor), name
+
+def test_verify_detects_tampering(registry, tiny_variant):
+    """Test that a modified weights file fails verification and loading."""
+    processor, model = tiny_variant
+    registry.register("tiny", model=model, processor=processor)
+    weights = os.path.join(registry.path("tiny"), "model.safetensors")
+    with open(weights, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\x00\x01\x02\x03")
+
+    with pytest.raises(ModelChecksumError):
+        registry.load("tiny")
+
+def test_unknown_and_invalid_names(registry):
+    """Test that unknown variants and path-like names are rejected."""
+    with pytest.raises(ModelNotFoundError):
+        registry.load("missing")
+    with pytest.raises(ValueError):
+        registry.path("../elsewhere")
+
+@pytest.mark.asyncio
+async def test_switch_model_swaps_variant_and_clears_features(registry, tiny_variant):
+    """Test that switching variants loads the new model and drops cached vision features."""
+    processor, model = tiny_variant
+    registry.register("tiny", model=model, processor=processor)
+    registry.register("tiny-copy", model=model, processor=processor)
+    cache = VisionFeatureCache()
+    cache.put("digest", torch.zeros(4, 8))
+    service = CaptioningService(registry=registry, model_name="tiny", feature_cache=cache)
+
+    assert service.model is not model
+    await service.switch_model("tiny-copy")
+
+    assert service.model_name == "tiny-copy"
+    assert len(cache) == 0
+    with pytest.raises(ModelNotFoundError):
+        await service.switch_model("missing")
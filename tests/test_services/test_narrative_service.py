@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from src.services.narrative_service import NarrativeService, NarrativeGenerationError
@@ -93,4 +94,86 @@ async def test_long_caption(narrative_service, mock_openai_client):
     # Verify the API call
     call_kwargs = mock_openai_client.chat.completions.create.call_args.kwargs
     # Check that the message content is within reasonable limits
-    assert len(call_kwargs["messages"][1]["content"]) <= 2000  # Reasonable limit for API 
\ No newline at end of file
+    assert len(call_kwargs["messages"][1]["content"]) <= 2000  # Reasonable limit for API 
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_upstream_call(narrative_service, mock_openai_client):
+    """Test that duplicate in-flight narrative requests make one upstream call."""
+    async def slow_create(**kwargs):
+        await asyncio.sleep(0.01)
+        return Mock(choices=[Mock(message=Mock(content="Shared narrative"))])
+    mock_openai_client.chat.completions.create = AsyncMock(side_effect=slow_create)
+    
+    narratives = await asyncio.gather(
+        narrative_service.generate_narrative("a lighthouse"),
+        narrative_service.generate_narrative("a lighthouse"),
+        narrative_service.generate_narrative("a different scene")
+    )
+    
+    assert narratives == ["Shared narrative"] * 3
+    assert mock_openai_client.chat.completions.create.call_count == 2
+
+@pytest.mark.asyncio
+async def test_generate_multiple_narratives(narrative_service, mock_openai_client):
+    """Test that alternatives are requested as n choices in one call and ranked."""
+    mock_openai_client.chat.completions.create.return_value = Mock(choices=[
+        Mock(message=Mock(content="Cut off story"), finish_reason="length"),
+        Mock(message=Mock(content="Complete story"), finish_reason="stop"),
+        Mock(message=Mock(content="Another story"), finish_reason="stop")
+    ])
+    
+    narratives = await narrative_service.generate_narratives("a foggy pier", num_narratives=3)
+    
+    assert narratives == ["Complete story", "Another story", "Cut off story"]
+    mock_openai_client.chat.completions.create.assert_called_once()
+    assert mock_openai_client.chat.completions.create.call_args.kwargs["n"] == 3
+
+@pytest.mark.asyncio
+async def test_complete_reports_token_usage(narrative_service, mock_openai_client):
+    """Test that token usage from the response is returned with the narratives."""
+    response = mock_openai_client.chat.completions.create.return_value
+    response.usage = Mock(prompt_tokens=85, completion_tokens=40)
+    
+    completion = await narrative_service.complete("a quiet harbor")
+    
+    assert completion.narratives == ["Test narrative"]
+    assert completion.total_tokens == 125
+
+@pytest.mark.asyncio
+async def test_long_caption_trimmed_to_token_budget(narrative_service, mock_openai_client, monkeypatch):
+    """Test that the caption is trimmed so the prompt fits its token budget."""
+    monkeypatch.setattr(settings, "NARRATIVE_PROMPT_MAX_TOKENS", 50)
+    
+    await narrative_service.generate_narrative("a lighthouse on a rocky cliff " * 20)
+    
+    prompt = mock_openai_client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+    assert prompt.startswith("Create an engaging narrative based on this scene: a lighthouse")
+    assert prompt.endswith("...")
+    assert narrative_service.tokens.count(prompt) <= 50
+
+@pytest.mark.asyncio
+async def test_length_target_sets_max_tokens(narrative_service, mock_openai_client):
+    """Test that a narrative length or narration time target sizes the completion budget."""
+    await narrative_service.generate_narrative("a quiet harbor", target_words=100)
+    call_kwargs = mock_openai_client.chat.completions.create.call_args.kwargs
+    assert call_kwargs["max_tokens"] == 156
+    assert "about 100 words" in call_kwargs["messages"][1]["content"]
+    
+    await narrative_service.generate_narrative("a quiet harbor", target_seconds=20)
+    assert mock_openai_client.chat.completions.create.call_args.kwargs["max_tokens"] == 78
+    
+    # An explicit max_tokens wins
+    await narrative_service.generate_narrative("a quiet harbor", max_tokens=40, target_words=100)
+    assert mock_openai_client.chat.completions.create.call_args.kwargs["max_tokens"] == 40
+
+@pytest.mark.asyncio
+async def test_usage_counted_locally_when_not_reported(narrative_service, mock_openai_client):
+    """Test that token usage is counted locally when the upstream omits it."""
+    from src.services.narrative_service import tokens_total
+    mock_openai_client.chat.completions.create.return_value.usage = None
+    before = tokens_total.value(kind="completion")
+    
+    completion = await narrative_service.complete("a quiet harbor")
+    
+    assert completion.prompt_tokens > 0
+    assert completion.completion_tokens == narrative_service.tokens.count("Test narrative")
+    assert tokens_total.value(kind="completion") == before + completion.completion_tokens
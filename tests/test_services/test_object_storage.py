@@ -0,0 +1,105 @@
+import asyncio
+import os
+import socket
+import aiofiles.os
+import httpx
+import pytest
+from src.services.object_storage import LocalStorageBackend, S3StorageBackend
+
+@pytest.mark.asyncio
+async def test_local_backend_roundtrip(tmp_path):
+    """Test storing, reading, touching and deleting local objects."""
+    backend = LocalStorageBackend(str(tmp_path))
+
+    location = await backend.put("scene.jpg", b"image bytes")
+
+    assert location == backend.location("scene.jpg")
+    assert location.startswith(str(tmp_path))
+    assert await backend.get("scene.jpg") == b"image bytes"
+    assert await backend.touch("scene.jpg")
+    assert await backend.presigned_url("scene.jpg") is None
+    await backend.delete("scene.jpg")
+    assert not await backend.exists("scene.jpg")
+    with pytest.raises(FileNotFoundError):
+        await backend.get("scene.jpg")
+
+@pytest.mark.asyncio
+async def test_local_backend_cancelled_write_leaves_no_file(tmp_path, monkeypatch):
+    """Test that a write cancelled before completing leaves neither the object nor a partial file."""
+    backend = LocalStorageBackend(str(tmp_path))
+
+    async def cancelled(*args, **kwargs):
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(aiofiles.os, "replace", cancelled)
+    with pytest.raises(asyncio.CancelledError):
+        await backend.put("scene.jpg", b"image bytes")
+
+    assert not await backend.exists("scene.jpg")
+    assert [files for _, _, files in os.walk(tmp_path) if files] == []
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    """A local S3-compatible server (moto)."""
+    pytest.importorskip("aiobotocore")
+    server_module = pytest.importorskip("moto.server")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = server_module.ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+@pytest.fixture
+async def s3_backend(s3_endpoint, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    backend = S3StorageBackend(
+        bucket="storyteller", prefix="audio/", endpoint_url=s3_endpoint, region="us-east-1",
+        multipart_threshold=6 * 1024 * 1024, part_size=5 * 1024 * 1024
+    )
+    client = await backend._get_client()
+    try:
+        await client.create_bucket(Bucket="storyteller")
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    yield backend
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_s3_backend_roundtrip(s3_backend):
+    """Test storing, reading and deleting objects in an S3-compatible bucket."""
+    location = await s3_backend.put("audio_1.mp3", b"mp3 data", "audio/mpeg")
+
+    assert location == f"s3://storyteller/{s3_backend.key('audio_1.mp3')}"
+    assert s3_backend.key("audio_1.mp3").startswith("audio/")
+    assert await s3_backend.get("audio_1.mp3") == b"mp3 data"
+    assert await s3_backend.exists("audio_1.mp3")
+    await s3_backend.delete("audio_1.mp3")
+    assert not await s3_backend.exists("audio_1.mp3")
+    with pytest.raises(FileNotFoundError):
+        await s3_backend.get("audio_1.mp3")
+
+@pytest.mark.asyncio
+async def test_s3_multipart_upload_from_file(s3_backend, tmp_path):
+    """Test that large files are uploaded in parallel parts and reassembled."""
+    data = bytes(range(256)) * (48 * 1024)  # 12 MiB: three parts
+    source = tmp_path / "large.mp3"
+    source.write_bytes(data)
+
+    await s3_backend.put_file("large.mp3", str(source), "audio/mpeg")
+
+    assert await s3_backend.get("large.mp3") == data
+
+@pytest.mark.asyncio
+async def test_s3_presigned_url_serves_object(s3_backend):
+    """Test that a presigned URL downloads the object without credentials."""
+    await s3_backend.put("audio_2.mp3", b"direct download", "audio/mpeg")
+
+    url = await s3_backend.presigned_url("audio_2.mp3")
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url)
+
+    assert response.status_code == 200
+    assert response.content == b"direct download"
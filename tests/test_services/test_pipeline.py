@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.services.pipeline import Pipeline, Stage, StageCache
+
+
+def echo(value):
+    """Async stage function returning its input after a short wait."""
+    async def stage(**inputs):
+        await asyncio.sleep(0.05)
+        return value(**inputs) if callable(value) else value
+    return stage
+
+
+@pytest.mark.asyncio
+async def test_stages_pass_outputs_downstream():
+    """Test that each stage receives the declared outputs of the stages before it."""
+    pipeline = Pipeline("test", [
+        Stage("double", echo(lambda x: x * 2), inputs=("x",), outputs=("doubled",)),
+        Stage("add", echo(lambda doubled, y: doubled + y), inputs=("doubled", "y"), outputs=("total",))
+    ], inputs=("x", "y"))
+
+    run = await pipeline.run(x=3, y=1)
+
+    assert run["total"] == 7
+    assert set(run.timings) == {"double", "add"}
+
+
+@pytest.mark.asyncio
+async def test_independent_stages_run_concurrently():
+    """Test that stages without dependencies between them overlap."""
+    pipeline = Pipeline("test", [
+        Stage(f"stage_{i}", echo(i), outputs=(f"out_{i}",)) for i in range(4)
+    ] + [
+        Stage("join", echo(lambda **outs: sorted(outs.values())), inputs=tuple(f"out_{i}" for i in range(4)),
+              outputs=("joined",))
+    ])
+
+    started = time.monotonic()
+    run = await pipeline.run()
+
+    assert run["joined"] == [0, 1, 2, 3]
+    # Two levels of 50ms stages, not five
+    assert time.monotonic() - started < 0.2
+
+
+@pytest.mark.asyncio
+async def test_after_orders_stages_without_data():
+    """Test that `after` delays a stage until another has finished."""
+    order = []
+
+    def record(name):
+        async def stage():
+            await asyncio.sleep(0.01 if name == "first" else 0)
+            order.append(name)
+        return stage
+
+    pipeline = Pipeline("test", [
+        Stage("second", record("second"), after=("first",)),
+        Stage("first", record("first"))
+    ])
+    await pipeline.run()
+
+    assert order == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_skipped_stage_outputs_none():
+    """Test that a stage whose condition is false is skipped and its outputs are None."""
+    calls = []
+
+    async def stage(x):
+        calls.append(x)
+        return x, x
+
+    pipeline = Pipeline("test", [
+        Stage("pair", stage, inputs=("x",), outputs=("a", "b"), when=lambda values: values["enabled"])
+    ], inputs=("x", "enabled"))
+
+    run = await pipeline.run(x=1, enabled=False)
+    assert (run["a"], run["b"]) == (None, None)
+    assert run.skipped == {"pair"}
+    assert calls == []
+
+    run = await pipeline.run(x=1, enabled=True)
+    assert (run["a"], run["b"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_thread_executor_runs_off_the_event_loop():
+    """Test that blocking stages run in a worker thread."""
+    def blocking():
+        return threading.current_thread() is threading.main_thread()
+
+    pipeline = Pipeline("test", [Stage("blocking", blocking, outputs=("on_main",), executor="thread")])
+
+    assert (await pipeline.run())["on_main"] is False
+
+
+@pytest.mark.asyncio
+async def test_max_concurrency_is_shared_by_runs():
+    """Test that a stage's concurrency limit holds across concurrent runs."""
+    in_flight = peak = 0
+
+    async def limited():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+
+    pipeline = Pipeline("test", [Stage("limited", limited, max_concurrency=2)])
+    await asyncio.gather(*(pipeline.run() for _ in range(6)))
+
+    assert peak == 2
+
+
+def test_limited_pipeline_runs_in_several_event_loops():
+    """Test that a pipeline with concurrency limits can be reused from another event loop."""
+    async def limited():
+        await asyncio.sleep(0.01)
+
+    pipeline = Pipeline("test", [Stage("limited", limited, max_concurrency=1)])
+
+    async def contend():
+        await asyncio.gather(*(pipeline.run() for _ in range(3)))
+
+    asyncio.run(contend())
+    # Would raise "bound to a different event loop" with a semaphore shared by both loops
+    asyncio.run(contend())
+
+
+@pytest.mark.asyncio
+async def test_cache_hooks_skip_the_stage_on_a_hit():
+    """Test that a cached result is used instead of running the stage, and new results are stored."""
+    class DictCache(StageCache):
+        def __init__(self):
+            self.stored = {}
+
+        async def get(self, values):
+            return self.stored.get(values["x"])
+
+        async def put(self, values, result):
+            self.stored[values["x"]] = result
+
+    calls = []
+
+    async def square(x):
+        calls.append(x)
+        return x * x
+
+    pipeline = Pipeline("test", [
+        Stage("square", square, inputs=("x",), outputs=("y",), cache=DictCache())
+    ], inputs=("x",))
+
+    assert (await pipeline.run(x=3))["y"] == 9
+    run = await pipeline.run(x=3)
+
+    assert run["y"] == 9
+    assert run.cached == {"square"}
+    assert calls == [3]
+    assert 'square;dur=' in run.server_timing() and 'desc="cached"' in run.server_timing()
+
+
+@pytest.mark.asyncio
+async def test_failure_cancels_running_stages():
+    """Test that a failing stage cancels the others and its exception is raised."""
+    cancelled = asyncio.Event()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise KeyError("boom")
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def never():
+        raise AssertionError("dependent of a failed stage ran")
+
+    pipeline = Pipeline("test", [
+        Stage("fail", fail, outputs=("value",)),
+        Stage("slow", slow),
+        Stage("dependent", never, inputs=("value",))
+    ])
+
+    with pytest.raises(KeyError):
+        await pipeline.run()
+    assert cancelled.is_set()
+
+
+@pytest.mark.parametrize("stages, inputs", [
+    # Unknown input
+    ([Stage("a", echo(1), inputs=("missing",))], ()),
+    # Output produced twice
+    ([Stage("a", echo(1), outputs=("x",)), Stage("b", echo(1), outputs=("x",))], ()),
+    # Output shadowing an input
+    ([Stage("a", echo(1), outputs=("x",))], ("x",)),
+    # Duplicate stage name
+    ([Stage("a", echo(1)), Stage("a", echo(2))], ()),
+    # Cycle
+    ([Stage("a", echo(1), inputs=("y",), outputs=("x",)), Stage("b", echo(1), inputs=("x",), outputs=("y",))], ()),
+    # Unknown executor
+    ([Stage("a", echo(1), executor="process")], ())
+])
+def test_invalid_graphs_are_rejected(stages, inputs):
+    """Test that malformed pipelines fail at construction."""
+    with pytest.raises(ValueError):
+        Pipeline("test", stages, inputs=inputs)
+
+
+@pytest.mark.asyncio
+async def test_missing_input_is_rejected():
+    """Test that a run without all pipeline inputs is rejected."""
+    pipeline = Pipeline("test", [Stage("a", echo(1), inputs=("x",))], inputs=("x",))
+    with pytest.raises(ValueError):
+        await pipeline.run()
@@ -0,0 +1,93 @@
+import pytest
+from src.services.rate_limiter import (
+    MemoryRateLimitBackend,
+    RateLimiter,
+    RateLimitExceeded,
+    SQLiteRateLimitBackend,
+    client_id,
+    parse_api_keys
+)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryRateLimitBackend()
+    else:
+        backend = SQLiteRateLimitBackend(str(tmp_path / "limits.db"))
+        yield backend
+        backend.close()
+
+@pytest.mark.asyncio
+async def test_burst_then_reject(backend):
+    """Test that a client is rejected once its burst is used up."""
+    limiter = RateLimiter(backend, rate_per_minute=60, burst=2)
+    
+    await limiter.check("ip:1.2.3.4")
+    await limiter.check("ip:1.2.3.4")
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        await limiter.check("ip:1.2.3.4")
+    
+    assert 0 < exc_info.value.retry_after <= 1.0
+    # Other clients have their own allowance
+    await limiter.check("ip:5.6.7.8")
+
+def test_bucket_refills_over_time(backend):
+    """Test that allowance is restored at the configured rate."""
+    assert backend.take("client", 60, 1, 1, now=100.0) == 0
+    assert backend.take("client", 60, 1, 1, now=100.5) > 0
+    assert backend.take("client", 60, 1, 1, now=102.0) == 0
+
+@pytest.mark.asyncio
+async def test_usage_ledger_accumulates(backend):
+    """Test that usage is summed per client."""
+    limiter = RateLimiter(backend, rate_per_minute=60, burst=10)
+    
+    await limiter.record_usage("key:abc", images=1, tokens=120, audio_seconds=4.5)
+    await limiter.record_usage("key:abc", images=1, tokens=80)
+    usage = await limiter.usage("key:abc")
+    
+    assert (usage.requests, usage.images, usage.tokens) == (2, 2, 200)
+    assert usage.audio_seconds == pytest.approx(4.5)
+    assert (await limiter.usage("key:other")).requests == 0
+
+def test_memory_backend_forgets_idle_and_least_recent_clients():
+    """Test that refilled buckets are dropped and clients beyond the cap are forgotten."""
+    backend = MemoryRateLimitBackend(max_clients=2)
+    
+    backend.take("idle", 60, 1, 1, now=100.0)
+    backend.take("busy", 60, 1, 1, now=101.5)
+    # "idle" refilled at 101.0 and is dropped; "busy" is still refilling
+    assert list(backend._buckets) == ["busy"]
+    backend.take("a", 60, 1, 1, now=101.6)
+    backend.take("b", 60, 1, 1, now=101.7)
+    assert list(backend._buckets) == ["a", "b"]
+    # A forgotten bucket starts full
+    assert backend.take("busy", 60, 1, 1, now=101.8) == 0
+    
+    for client in ("first", "second", "third"):
+        backend.record(client, 1, 0, 0, 0.0, now=100.0)
+    assert backend.usage("first") is None
+    assert [usage.client for usage in backend.all_usage()] == ["second", "third"]
+
+def test_sqlite_state_is_shared_between_connections(tmp_path):
+    """Test that workers using the same database file share limits and usage."""
+    path = str(tmp_path / "limits.db")
+    first, second = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+    
+    assert first.take("client", 60, 1, 1, now=100.0) == 0
+    assert second.take("client", 60, 1, 1, now=100.0) > 0
+    first.record("client", 1, 1, 10, 0.0, now=100.0)
+    assert second.usage("client").tokens == 10
+    first.close()
+    second.close()
+
+def test_client_id_hashes_api_keys():
+    """Test that API keys are never stored verbatim."""
+    assert client_id("secret-key", "1.2.3.4", {"secret-key"}).startswith("key:")
+    assert "secret-key" not in client_id("secret-key", "1.2.3.4", {"secret-key"})
+    assert client_id(None, "1.2.3.4") == "ip:1.2.3.4"
+
+def test_client_id_ignores_unknown_api_keys():
+    """Test that a key not on the accepted list does not get its own allowance."""
+    assert client_id("made-up-key", "1.2.3.4", {"secret-key"}) == "ip:1.2.3.4"
+    assert parse_api_keys(" key-1, ,key-2 ") == {"key-1", "key-2"}
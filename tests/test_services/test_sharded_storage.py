@@ -0,0 +1,53 @@
+import os
+import pytest
+from src.services.sharded_storage import ShardedDirectory
+
+def test_path_is_stable_and_sharded(tmp_path):
+    """Test that a name always maps to the same two-level shard directory."""
+    storage = ShardedDirectory(str(tmp_path))
+    path = storage.path_for("audio_abc.mp3")
+    
+    assert path == storage.path_for("audio_abc.mp3")
+    relative = os.path.relpath(path, tmp_path).split(os.sep)
+    assert len(relative) == 3 and all(len(part) == 2 for part in relative[:2])
+    assert relative[2] == "audio_abc.mp3"
+    assert ShardedDirectory(str(tmp_path), levels=0).path_for("x.mp3") == str(tmp_path / "x.mp3")
+
+@pytest.mark.asyncio
+async def test_locate_prefers_shards_and_falls_back_to_flat(tmp_path):
+    """Test that files are found in their shard or in the old flat layout."""
+    storage = ShardedDirectory(str(tmp_path))
+    (tmp_path / "legacy.mp3").write_bytes(b"old")
+    sharded = await storage.prepare("new.mp3")
+    with open(sharded, "wb") as f:
+        f.write(b"new!")
+    
+    assert (await storage.locate("new.mp3"))[0] == sharded
+    legacy_path, stat_result = await storage.locate("legacy.mp3")
+    assert legacy_path == str(tmp_path / "legacy.mp3")
+    assert stat_result.st_size == 3
+    assert await storage.locate("missing.mp3") is None
+
+@pytest.mark.asyncio
+async def test_prepare_recreates_removed_shard_directory(tmp_path):
+    """Test that a shard directory removed after a write is created again."""
+    storage = ShardedDirectory(str(tmp_path))
+    path = await storage.prepare("audio.mp3")
+    os.rmdir(os.path.dirname(path))
+    
+    assert await storage.prepare("audio.mp3") == path
+    assert os.path.isdir(os.path.dirname(path))
+
+def test_migrate_moves_flat_files(tmp_path):
+    """Test that migration moves every flat file into its shard and can be rerun."""
+    names = [f"file_{i}.jpg" for i in range(20)]
+    for name in names:
+        (tmp_path / name).write_text(name)
+    storage = ShardedDirectory(str(tmp_path))
+    
+    assert storage.migrate() == 20
+    assert storage.migrate() == 0
+    for name in names:
+        with open(storage.path_for(name)) as f:
+            assert f.read() == name
+    assert not any(entry.is_file() for entry in os.scandir(tmp_path))
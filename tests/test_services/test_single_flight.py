@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from src.services.single_flight import SingleFlight, content_key
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test that concurrent calls with the same key run the work once."""
+    single_flight = SingleFlight()
+    calls = 0
+    
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+    
+    results = await asyncio.gather(*(single_flight.do("key", work) for _ in range(5)))
+    
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert single_flight.executions == 1
+    assert single_flight.coalesced == 4
+    assert len(single_flight) == 0
+
+@pytest.mark.asyncio
+async def test_different_keys_run_independently():
+    """Test that distinct keys are not coalesced."""
+    single_flight = SingleFlight()
+    
+    async def work(value):
+        await asyncio.sleep(0.01)
+        return value
+    
+    results = await asyncio.gather(
+        single_flight.do("a", lambda: work(1)),
+        single_flight.do("b", lambda: work(2))
+    )
+    
+    assert results == [1, 2]
+    assert single_flight.executions == 2
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_key_released():
+    """Test that all waiters see the error and the next call runs afresh."""
+    single_flight = SingleFlight()
+    
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+    
+    results = await asyncio.gather(
+        *(single_flight.do("key", failing) for _ in range(3)),
+        return_exceptions=True
+    )
+    
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert single_flight.executions == 1
+    
+    async def succeeding():
+        return "ok"
+    
+    assert await single_flight.do("key", succeeding) == "ok"
+    assert single_flight.executions == 2
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    """Test that a caller going away does not fail the shared work."""
+    single_flight = SingleFlight()
+    
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+    
+    first = asyncio.create_task(single_flight.do("key", work))
+    second = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    
+    assert await second == "done"
+
+def test_content_key_is_stable():
+    """Test that keys depend on content and parameters only."""
+    assert content_key(b"image", 1) == content_key(b"image", 1)
+    assert content_key(b"image", 1) != content_key(b"image", 2)
+    assert content_key("ab", "c") != content_key("a", "bc")
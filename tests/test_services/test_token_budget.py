@@ -0,0 +1,55 @@
+import pytest
+from src.config import settings
+from src.services.token_budget import TokenCounter, max_tokens_for, words_for_duration
+
+@pytest.fixture
+def estimating_counter():
+    """Counter without a tokenizer, as when tiktoken's files are unavailable."""
+    counter = TokenCounter("gpt-4o-mini")
+    counter._encoding, counter._loaded = None, True
+    return counter
+
+@pytest.fixture
+def byte_counter():
+    """Counter with a small BPE encoding (one token per byte, "the " merged), built offline."""
+    tiktoken = pytest.importorskip("tiktoken")
+    ranks = {bytes([i]): i for i in range(256)}
+    ranks[b"th"] = 256
+    ranks[b"the"] = 257
+    encoding = tiktoken.Encoding(
+        name="test_bytes", pat_str=r"\S+|\s+", mergeable_ranks=ranks, special_tokens={}
+    )
+    counter = TokenCounter("test-model")
+    counter._encoding, counter._loaded = encoding, True
+    return counter
+
+def test_estimated_counts(estimating_counter):
+    """Test the length-based estimate used without a tokenizer."""
+    assert not estimating_counter.exact
+    assert estimating_counter.count("a" * 40) == 10
+    assert estimating_counter.truncate("a" * 40, 10) == "a" * 40
+    assert estimating_counter.truncate("a" * 41, 10) == "a" * 37 + "..."
+
+def test_exact_counts_and_truncation(byte_counter):
+    """Test counting and trimming with a BPE encoding."""
+    assert byte_counter.exact
+    assert byte_counter.count("the sea") == 5  # "the", " ", "s", "e", "a"
+    
+    trimmed = byte_counter.truncate("the sea at night", 8)
+    
+    assert trimmed == "the sea..."
+    assert byte_counter.count(trimmed) <= 8
+    assert byte_counter.truncate("the sea", 8) == "the sea"
+
+def test_count_messages_adds_chat_overhead(byte_counter):
+    """Test that chat formatting overhead is included in prompt counts."""
+    messages = [{"role": "system", "content": "the"}, {"role": "user", "content": "sea"}]
+    assert byte_counter.count_messages(messages) == 3 + (3 + 1) + (3 + 3)
+
+def test_max_tokens_for_length_targets():
+    """Test deriving completion budgets from narrative length and narration time."""
+    assert max_tokens_for(None) is None
+    assert max_tokens_for(100) == 156
+    assert max_tokens_for(1) == settings.NARRATIVE_MIN_TOKENS
+    assert max_tokens_for(100_000) == settings.NARRATIVE_MAX_TOKENS_LIMIT
+    assert words_for_duration(30) == 75
@@ -0,0 +1,51 @@
+import math
+import os
+import time
+from contextlib import nullcontext
+from unittest.mock import Mock, patch
+import pytest
+from src.services.tts_service import TTSService
+
+# Simulated round trip of one TTS API request (gTTS sends one per ~100 characters).
+# Set TTS_BENCHMARK_LIVE=1 to measure against the real API instead.
+REQUEST_LATENCY = float(os.getenv("TTS_BENCHMARK_LATENCY", "0.05"))
+LIVE = os.getenv("TTS_BENCHMARK_LIVE") == "1"
+
+NARRATIVE_LENGTHS = (100, 400, 800, 1600)
+
+SENTENCE = "The lighthouse keeper watched the storm roll in, counting the seconds between flashes. "
+
+def _fake_gtts(text, lang):
+    """gTTS stand-in that sleeps once per API request it would make."""
+    requests = math.ceil(len(text) / 100)
+    tts = Mock()
+    tts.save.side_effect = lambda path: (time.sleep(REQUEST_LATENCY * requests), open(path, "wb").close())
+    tts.write_to_fp.side_effect = lambda fp: (time.sleep(REQUEST_LATENCY * requests), fp.write(b"\xff\xfb"))
+    return tts
+
+async def _synthesis_time(output_dir, parallel: bool, text: str) -> float:
+    service = TTSService(output_dir=output_dir, parallel=parallel)
+    started = time.perf_counter()
+    await service.text_to_speech(text, filename=f"bench_{parallel}_{len(text)}.mp3")
+    return time.perf_counter() - started
+
+@pytest.mark.performance
+async def test_parallel_chunks_flatten_latency_curve(tmp_path):
+    """Benchmark TTS latency against narrative length, serial versus parallel chunks."""
+    rows = []
+    with nullcontext() if LIVE else patch("src.services.tts_service.gTTS", side_effect=_fake_gtts):
+        for length in NARRATIVE_LENGTHS:
+            text = (SENTENCE * (length // len(SENTENCE) + 1))[:length].rsplit(" ", 1)[0] + "."
+            serial = await _synthesis_time(str(tmp_path), False, text)
+            parallel = await _synthesis_time(str(tmp_path), True, text)
+            rows.append((length, serial, parallel))
+
+    print(f"\n{'chars':>6} {'serial (s)':>11} {'parallel (s)':>13} {'speedup':>8}")
+    for length, serial, parallel in rows:
+        print(f"{length:>6} {serial:>11.3f} {parallel:>13.3f} {serial / parallel:>7.1f}x")
+
+    if not LIVE:
+        # Serial latency grows with every chunk; parallel stays near one round trip
+        _, serial, parallel = rows[-1]
+        assert parallel < serial / 4
+        assert parallel < REQUEST_LATENCY * 4
@@ -1,9 +1,10 @@
+import asyncio
 import os
 import pytest
 import time
 from pathlib import Path
 from unittest.mock import Mock, patch
-from src.services.tts_service import TTSService, TTSError
+from src.services.tts_service import TTSService, TTSError, split_text
 
 @pytest.fixture
 def tts_service(tmp_path):
@@ -15,6 +16,7 @@ def mock_gtts():
     """Mock gTTS instance."""
     with patch('src.services.tts_service.gTTS') as mock:
         mock_instance = Mock()
+        mock_instance.save.side_effect = lambda path: Path(path).write_bytes(b"mp3")
         mock.return_value = mock_instance
         yield mock_instance
 
@@ -29,7 +31,8 @@ async def test_text_to_speech(tts_service, mock_gtts):
     # Verify gTTS was called correctly
     mock_gtts.save.assert_called_once()
     assert file_path.endswith(".mp3")
-    assert os.path.dirname(file_path) == tts_service.output_dir
+    assert file_path.startswith(tts_service.output_dir)
+    assert file_path == tts_service.storage.path_for(os.path.basename(file_path))
 
 @pytest.mark.asyncio
 async def test_empty_text(tts_service):
@@ -90,4 +93,112 @@ def test_cleanup_old_files(tts_service, tmp_path):
     
     # Verify old file was deleted but new file remains
     assert not old_file.exists()
-    assert new_file.exists() 
\ No newline at end of file
+    assert new_file.exists()
+
+
+@pytest.mark.asyncio
+async def test_content_addressed_filename(tts_service, mock_gtts):
+    """Test that generated filenames are derived from the text and language."""
+    first = await tts_service.text_to_speech("Same text", language="en")
+    second = await tts_service.text_to_speech("Same text", language="en")
+    other_language = await tts_service.text_to_speech("Same text", language="fr")
+    
+    assert first == second
+    assert first != other_language
+    assert os.path.basename(first) == TTSService.audio_filename("Same text", "en")
+    # The existing file is served again, not re-synthesized
+    assert mock_gtts.save.call_count == 2
+
+@pytest.mark.asyncio
+async def test_reused_audio_is_not_swept(tts_service, mock_gtts):
+    """Test that handing out an old content-addressed file again restarts its retention."""
+    from src.services.janitor_service import StorageJanitor
+    janitor = StorageJanitor(max_ages={tts_service.output_dir: 3600}, disk_budget_bytes=0)
+    janitor.scan()
+    file_path = await tts_service.text_to_speech("Old narrative")
+    old = time.time() - 2 * 3600
+    os.utime(file_path, (old, old))
+    
+    assert await tts_service.text_to_speech("Old narrative") == file_path
+    janitor.track(file_path)
+    
+    assert janitor.sweep().files_removed == 0
+    assert os.path.exists(file_path)
+    mock_gtts.save.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_synthesis_is_coalesced(tts_service, mock_gtts):
+    """Test that the same text requested concurrently is synthesized once."""
+    def slow_save(path):
+        time.sleep(0.05)
+        Path(path).write_bytes(b"mp3")
+    mock_gtts.save.side_effect = slow_save
+    
+    paths = await asyncio.gather(
+        *(tts_service.text_to_speech("Same narrative") for _ in range(3))
+    )
+    
+    assert len(set(paths)) == 1
+    mock_gtts.save.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_audio_published_to_backend(tmp_path, mock_gtts):
+    """Test that synthesized audio is also stored in a shared backend."""
+    from unittest.mock import AsyncMock
+    backend = Mock()
+    backend.put_file = AsyncMock()
+    service = TTSService(output_dir=str(tmp_path), backend=backend)
+    
+    file_path = await service.text_to_speech("Shared story")
+    
+    backend.put_file.assert_awaited_once_with(os.path.basename(file_path), file_path, "audio/mpeg")
+
+@pytest.mark.asyncio
+async def test_failed_synthesis_leaves_no_file(tts_service, mock_gtts):
+    """Test that audio is written under its final name only once complete."""
+    def failing_save(path):
+        Path(path).write_bytes(b"partial")
+        raise Exception("connection reset")
+    mock_gtts.save.side_effect = failing_save
+    
+    with pytest.raises(TTSError):
+        await tts_service.text_to_speech("Broken story")
+    
+    assert not any(Path(tts_service.output_dir).rglob("*.mp3*"))
+
+def test_split_text_at_sentence_and_clause_boundaries():
+    """Test that chunks respect the size limit and break at natural pauses."""
+    text = (
+        "The sun rose over the quiet valley. Birds began to sing, the river shimmered, "
+        "and the old miller, who had seen a thousand such mornings, smiled at the light! "
+        "Nothing else happened."
+    )
+    
+    chunks = split_text(text, max_chars=60)
+    
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+    assert chunks[0].startswith("The sun rose over the quiet valley.")
+    assert all(chunk[-1] in ".,!" for chunk in chunks)
+    assert split_text("Short.", max_chars=60) == ["Short."]
+    assert split_text("... !", max_chars=60) == []
+
+@pytest.mark.asyncio
+async def test_long_text_synthesized_as_parallel_chunks(tmp_path):
+    """Test that chunks are synthesized separately and joined in order."""
+    def fake_gtts(text, lang):
+        tts = Mock()
+        # Each response carries an ID3 tag that must not be repeated mid-stream
+        tts.write_to_fp.side_effect = lambda fp: fp.write(
+            b"ID3\x04\x00\x00\x00\x00\x00\x02ab" + text.encode()
+        )
+        return tts
+    
+    service = TTSService(output_dir=str(tmp_path), max_chunk_chars=20)
+    text = "First sentence here. Second one follows. Third closes it."
+    with patch("src.services.tts_service.gTTS", side_effect=fake_gtts):
+        file_path = await service.text_to_speech(text)
+    
+    with open(file_path, "rb") as f:
+        audio = f.read()
+    assert audio == b"ID3\x04\x00\x00\x00\x00\x00\x02ab" + "".join(split_text(text, 20)).encode()
@@ -0,0 +1,269 @@
+import asyncio
+import pytest
+import httpx
+from src.services.narrative_service import NarrativeService, NarrativeGenerationError
+from src.services.upstream_client import (
+    CircuitBreaker, CircuitOpenError, LatencyTracker, RetryPolicy, TokenBucket, UpstreamClient,
+    rate_limits_for
+)
+from tests.fake_upstream import FakeUpstream
+
+def _completion(content="Mock narrative"):
+    """Build a minimal chat completion payload."""
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content}
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    }
+
+class MockUpstream:
+    """In-process mock of the OpenAI API that replays scripted status codes."""
+    
+    def __init__(self, statuses, delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def handler(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            status = self.statuses.pop(0) if self.statuses else 200
+            if status != 200:
+                return httpx.Response(status, json={"error": {"message": f"status {status}"}})
+            return httpx.Response(200, json=_completion())
+        finally:
+            self.in_flight -= 1
+
+def _service(upstream_server, **kwargs):
+    """Create a narrative service talking to the mock upstream."""
+    upstream = UpstreamClient(
+        base_url="http://mock-openai.local/v1",
+        transport=httpx.MockTransport(upstream_server.handler),
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01),
+        **kwargs
+    )
+    return NarrativeService(api_key="test_key", upstream=upstream)
+
+@pytest.mark.asyncio
+async def test_retries_rate_limited_requests():
+    """Test that 429 and 5xx responses are retried until the upstream succeeds."""
+    server = MockUpstream([429, 503])
+    service = _service(server)
+    
+    narrative = await service.generate_narrative("a quiet harbor")
+    
+    assert narrative == "Mock narrative"
+    assert server.requests == 3
+
+@pytest.mark.asyncio
+async def test_retry_budget_exhausted():
+    """Test that generation fails once the retry budget is spent."""
+    server = MockUpstream([500, 500, 500, 500])
+    service = _service(server)
+    
+    with pytest.raises(NarrativeGenerationError):
+        await service.generate_narrative("a quiet harbor")
+    assert server.requests == 3
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    """Test that 4xx errors other than 408/409/429 fail immediately."""
+    server = MockUpstream([400])
+    service = _service(server)
+    
+    with pytest.raises(NarrativeGenerationError):
+        await service.generate_narrative("a quiet harbor")
+    assert server.requests == 1
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    """Test that in-flight requests never exceed the per-host limit."""
+    server = MockUpstream([], delay=0.02)
+    service = _service(server, max_concurrency=2)
+    
+    await asyncio.gather(*(service.generate_narrative(f"scene {i}") for i in range(6)))
+    
+    assert server.requests == 6
+    assert server.max_in_flight == 2
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast():
+    """Test that an open circuit rejects calls without reaching the upstream."""
+    server = MockUpstream([503] * 10)
+    upstream = UpstreamClient(
+        base_url="http://mock-openai.local/v1",
+        transport=httpx.MockTransport(server.handler),
+        retry_policy=RetryPolicy(max_attempts=2, base_delay=0.001),
+        circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    )
+    
+    async def request():
+        response = await upstream.http_client.post("/chat/completions", json={})
+        response.raise_for_status()
+    
+    with pytest.raises(httpx.HTTPStatusError):
+        await upstream.call(request)
+    assert upstream.circuit_breaker.state == "open"
+    
+    with pytest.raises(CircuitOpenError):
+        await upstream.call(request)
+    assert server.requests == 2
+    await upstream.aclose()
+
+def test_circuit_breaker_half_open_trial():
+    """Test that a successful trial call after the timeout closes the circuit."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one trial call at a time
+    
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_cancelled_while_rate_limited_releases_trial():
+    """Test that a half-open trial cancelled while waiting for a rate limit token is released."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    upstream = UpstreamClient(base_url="http://mock-openai.local/v1", circuit_breaker=breaker)
+    upstream.request_bucket = TokenBucket(rate_per_minute=1, capacity=1)
+    upstream.request_bucket.try_acquire()
+    
+    async def request():
+        return "ok"
+    
+    call = asyncio.create_task(upstream.call(request))
+    await asyncio.sleep(0.01)
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    
+    # Another trial may go through
+    breaker.before_call()
+    await upstream.aclose()
+
+def test_token_bucket():
+    """Test that the bucket allows a burst up to capacity, then asks callers to wait."""
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 1.0
+
+def test_retry_delay_is_jittered_and_bounded():
+    """Test that backoff grows exponentially, stays within bounds and honours Retry-After."""
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    
+    assert all(0 <= policy.delay(1) <= 1.0 for _ in range(20))
+    assert all(0 <= policy.delay(5) <= 4.0 for _ in range(20))
+    assert policy.delay(1, retry_after=3.0) >= 3.0
+
+def test_rate_limits_follow_model():
+    """Test that RPM/TPM limits are resolved from the model family."""
+    assert rate_limits_for("gpt-4o-mini-2024-07-18") == rate_limits_for("gpt-4o-mini")
+    assert rate_limits_for("gpt-4o-mini") != rate_limits_for("gpt-4o")
+
+def _hedging_service(fake, **kwargs):
+    """Narrative service on a fake upstream, hedging after 50 ms until latencies are known."""
+    upstream = UpstreamClient(
+        base_url="http://fake-openai.local/v1",
+        transport=fake.transport(),
+        retry_policy=RetryPolicy(max_attempts=1),
+        hedging=True,
+        hedge_initial_delay=0.05,
+        hedge_min_delay=0.0,
+        **kwargs
+    )
+    return NarrativeService(api_key="test_key", upstream=upstream)
+
+def test_latency_tracker_percentile():
+    """Test that hedge thresholds come from recent latencies once there are enough."""
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for latency in range(1, 10):
+        tracker.observe(latency / 100)
+    assert tracker.percentile(95) is None
+    
+    tracker.observe(0.10)
+    assert tracker.percentile(50) == 0.05
+    assert tracker.percentile(95) == 0.10
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged():
+    """Test that a request slower than the threshold is hedged and the hedge answers."""
+    from src.services.upstream_client import hedge_wins_total
+    fake = FakeUpstream(latencies=[1.0, 0.01])
+    service = _hedging_service(fake, hedge_max_fraction=1.0)
+    wins = hedge_wins_total.value(winner="hedge")
+    
+    started = asyncio.get_running_loop().time()
+    narrative = await service.generate_narrative("a quiet harbor")
+    
+    assert narrative == "Fake narrative"
+    assert asyncio.get_running_loop().time() - started < 0.5
+    assert fake.requests == 2
+    assert service.upstream.hedged_requests == 1
+    assert hedge_wins_total.value(winner="hedge") == wins + 1
+    await asyncio.sleep(0)
+    assert fake.cancelled == 1  # The slow primary is abandoned
+
+@pytest.mark.asyncio
+async def test_fast_requests_are_not_hedged():
+    """Test that requests within the threshold, or over the hedge budget, are sent once."""
+    fake = FakeUpstream(latencies=[0.0, 0.1, 0.1, 0.1])
+    service = _hedging_service(fake, hedge_max_fraction=0.3)
+    
+    await service.generate_narrative("scene 1")  # fast
+    await service.generate_narrative("scene 2")  # slow, hedged
+    await service.generate_narrative("scene 3")  # slow, but a second hedge would exceed 30%
+    
+    assert service.upstream.hedgeable_requests == 3
+    assert service.upstream.hedged_requests == 1
+    assert fake.requests == 4
+
+@pytest.mark.asyncio
+async def test_deadline_falls_back_to_local_narrative(monkeypatch):
+    """Test that a missed deadline serves a local narrative instead of waiting."""
+    from src.config import settings
+    monkeypatch.setattr(settings, "NARRATIVE_FALLBACK", "local")
+    fake = FakeUpstream(latency=1.0)
+    service = _hedging_service(fake, hedge_max_fraction=0.0)
+    
+    started = asyncio.get_running_loop().time()
+    completion = await service.complete("a lighthouse on a cliff", deadline=0.05)
+    
+    assert asyncio.get_running_loop().time() - started < 0.5
+    assert completion.source == "local"
+    assert "a lighthouse on a cliff" in completion.narratives[0]
+    assert completion.narratives == NarrativeService.local_narratives("a lighthouse on a cliff")
+
+@pytest.mark.asyncio
+async def test_deadline_prefers_cached_narrative_or_fails(monkeypatch):
+    """Test the cached narrative fallback, and a timeout error without any fallback."""
+    from src.config import settings
+    from src.services.narrative_service import NarrativeTimeoutError
+    fake = FakeUpstream(latency=1.0)
+    service = _hedging_service(fake, hedge_max_fraction=0.0)
+    
+    completion = await service.complete("a foggy pier", deadline=0.02, cached_narrative="An old story.")
+    assert completion.source == "cache"
+    assert completion.narratives == ["An old story."]
+    
+    monkeypatch.setattr(settings, "NARRATIVE_FALLBACK", "none")
+    with pytest.raises(NarrativeTimeoutError):
+        await service.complete("a foggy pier", deadline=0.02)
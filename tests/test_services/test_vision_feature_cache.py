@@ -0,0 +1,56 @@
+import torch
+from src.services.vision_feature_cache import VisionFeatureCache
+
+def test_lru_eviction_by_memory_budget():
+    """Test that least recently used embeddings are evicted to stay within budget."""
+    entry = torch.zeros(4, 8)  # 128 bytes
+    cache = VisionFeatureCache(max_bytes=256)
+    
+    cache.put("a", entry)
+    cache.put("b", entry)
+    cache.get("a")
+    cache.put("c", entry)
+    
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.size_bytes == 256
+
+def test_disk_tier_stores_fp16(tmp_path):
+    """Test that evicted embeddings come back from disk as half precision copies."""
+    embeds = torch.randn(4, 8)
+    cache = VisionFeatureCache(max_bytes=128, disk_dir=str(tmp_path))
+    
+    cache.put("a", embeds)
+    cache.put("b", torch.zeros(4, 8))
+    restored = cache.get("a", dtype=torch.float32)
+    
+    assert torch.load(tmp_path / "a.pt", weights_only=True).dtype == torch.float16
+    assert restored.dtype == torch.float32
+    assert torch.allclose(restored, embeds, atol=1e-2)
+
+def test_entries_do_not_keep_the_batch_alive():
+    """Test that a cached row of a batch is stored as its own copy."""
+    batch = torch.zeros(8, 4, 8)
+    cache = VisionFeatureCache(max_bytes=1024)
+    
+    cache.put("a", batch[0])
+    
+    stored = cache.get("a")
+    assert stored.untyped_storage().nbytes() == cache.size_bytes == 128
+    assert stored.untyped_storage().data_ptr() != batch.untyped_storage().data_ptr()
+
+def test_disk_tier_is_bounded(tmp_path):
+    """Test that the least recently used files are deleted beyond the disk budget."""
+    cache = VisionFeatureCache(max_bytes=0, disk_dir=str(tmp_path))
+    cache.put("a", torch.zeros(4, 8))
+    file_size = cache.disk_bytes
+    cache = VisionFeatureCache(max_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=2 * file_size)
+    
+    cache.put("b", torch.zeros(4, 8))
+    cache.get("a")
+    cache.put("c", torch.zeros(4, 8))
+    
+    assert sorted(path.name for path in tmp_path.glob("*.pt")) == ["a.pt", "c.pt"]
+    assert cache.disk_bytes == 2 * file_size
+    assert cache.get("b") is None